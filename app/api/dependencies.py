@@ -1,10 +1,19 @@
 
 import logging
 from functools import lru_cache
+from typing import TYPE_CHECKING
 from app.core.database import db
 from app.core.config import Config
+from app.core.admission import AdmissionController
 from app.repositories.chat import ChatRepository
 from app.repositories.business import BusinessRepository
+from app.repositories.batch import BatchRepository
+from app.repositories.usage import UsageRepository
+from app.repositories.changes import ChangeRepository
+from app.services.tokenizer import TokenizerService
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
 @lru_cache()
 def get_config() -> Config:
@@ -20,4 +29,31 @@ def get_chat_repository() -> ChatRepository:
 
 @lru_cache()
 def get_business_repository() -> BusinessRepository:
-    return BusinessRepository(db.prisma)
\ No newline at end of file
+    return BusinessRepository(db.prisma)
+
+@lru_cache()
+def get_batch_repository() -> BatchRepository:
+    return BatchRepository(db.prisma)
+
+@lru_cache()
+def get_usage_repository() -> UsageRepository:
+    return UsageRepository(db.prisma)
+
+@lru_cache()
+def get_change_repository() -> ChangeRepository:
+    return ChangeRepository(db.prisma)
+
+@lru_cache()
+def get_ai_client(base_url: str, api_key: str) -> "AsyncOpenAI":
+    # openai takes ~0.5s to import; defer it until the first completion
+    from openai import AsyncOpenAI
+
+    return AsyncOpenAI(base_url=base_url, api_key=api_key)
+
+@lru_cache()
+def get_admission_controller() -> AdmissionController:
+    return AdmissionController(get_config())
+
+@lru_cache()
+def get_tokenizer_service() -> TokenizerService:
+    return TokenizerService(get_config())
\ No newline at end of file
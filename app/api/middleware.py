@@ -0,0 +1,119 @@
+import re
+import json
+from app.utils import generate_cuid
+from app.core.logging import request_id_var
+from app.core.rate_limit import rate_limiter
+
+
+class RequestIdMiddleware:
+    """Bind a correlation id to every log record emitted while serving a request"""
+
+    header = b"x-request-id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or generate_cuid()
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((self.header, request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
+
+
+class RateLimitMiddleware:
+    """
+    Token-bucket limits on chat requests, checked from the raw ASGI scope
+    before routing, so a throttled request costs no DB or LLM work.
+    """
+
+    path = re.compile(r"^/api/v1/bots/([^/]+)/chat(?:/|$)")
+    session_cookie = "headless.session.id"
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not rate_limiter.enabled:
+            return await self.app(scope, receive, send)
+        match = self.path.match(scope["path"])
+        if not match:
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope.get("headers", []))
+        decision = rate_limiter.check(
+            {
+                "session": self._session_id(headers.get(b"cookie")),
+                "ip": self._client_ip(scope, headers),
+                "bot": match.group(1),
+            }
+        )
+        if decision.allowed:
+            return await self.app(scope, receive, send)
+
+        body = json.dumps(
+            {"error": "rate_limited", "scope": decision.scope, "retry_after": decision.retry_after}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(int(decision.retry_after)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def _session_id(self, cookie: bytes):
+        if not cookie:
+            return None
+        for part in cookie.decode("latin-1").split(";"):
+            name, _, value = part.strip().partition("=")
+            if name == self.session_cookie:
+                return value[:64] or None
+        return None
+
+    def _client_ip(self, scope, headers):
+        """
+        The socket peer, unless it is a trusted proxy: then Cloudflare's
+        connecting IP, else the right-most X-Forwarded-For hop that is not
+        a trusted proxy (hops to its left are client-supplied), else
+        X-Real-IP.
+        """
+        client = scope.get("client")
+        peer = client[0] if client else None
+        if not rate_limiter.is_trusted_proxy(peer):
+            return peer
+        connecting = headers.get(b"cf-connecting-ip")
+        if connecting:
+            return connecting.decode("latin-1").strip()[:64]
+        forwarded = headers.get(b"x-forwarded-for")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",") if hop.strip()]
+            for hop in reversed(hops):
+                if not rate_limiter.is_trusted_proxy(hop):
+                    return hop[:64]
+            if hops:
+                return hops[0][:64]
+        real_ip = headers.get(b"x-real-ip")
+        if real_ip:
+            return real_ip.decode("latin-1").strip()[:64]
+        return peer
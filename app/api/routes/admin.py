@@ -0,0 +1,60 @@
+import os
+import hmac
+import asyncio
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.api.dependencies import get_config
+from app.core.cache import cache_manager
+from app.core.loop_monitor import loop_monitor
+
+router = APIRouter()
+_profile_lock = asyncio.Lock()
+
+
+async def verify_admin(x_admin_token: str = Header(None)):
+    token = get_config().ADMIN_TOKEN
+    if not token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode(), token.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+@router.get("/loop", operation_id="loop_health", dependencies=[Depends(verify_admin)])
+async def loop_health():
+    return {"pid": os.getpid(), **loop_monitor.snapshot()}
+
+
+@router.get(
+    "/loop/stalls",
+    operation_id="loop_stalls",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(verify_admin)],
+)
+async def loop_stalls():
+    return PlainTextResponse(loop_monitor.stall_dump(), headers={"X-Worker-Pid": str(os.getpid())})
+
+
+@router.post(
+    "/profile",
+    operation_id="profile",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(verify_admin)],
+)
+async def profile(
+    seconds: float = Query(10, gt=0, le=60),
+    interval: float = Query(0.005, ge=0.001, le=1),
+):
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    async with _profile_lock:
+        folded = await loop_monitor.profile(seconds, interval)
+    return PlainTextResponse(folded, headers={"X-Worker-Pid": str(os.getpid())})
+
+
+@router.post("/cache/{name}/invalidate", operation_id="invalidate_cache", dependencies=[Depends(verify_admin)])
+async def invalidate_cache(name: str, key: str = Query(None)):
+    cache = cache_manager.get(name)
+    if cache is None:
+        raise HTTPException(status_code=404, detail=f"Unknown cache {name}")
+    cache.invalidate(key)
+    return {"cache": name, "key": key, "shared": cache_manager.shared is not None}
@@ -0,0 +1,38 @@
+from fastapi import APIRouter, Body, Depends, HTTPException
+from fastapi.responses import JSONResponse
+from app.api.dependencies import get_batch_repository, get_config
+from app.api.routes.admin import verify_admin
+from app.domain.requests import BatchChatRequest
+from app.services.batch import get_batch_chat_service
+
+router = APIRouter(dependencies=[Depends(verify_admin)])
+
+
+@router.post("", operation_id="create_chat_batch")
+async def create_batch(batch_request: BatchChatRequest = Body(...)):
+    if not batch_request.items:
+        raise HTTPException(status_code=400, detail="Batch has no items")
+    limit = get_config().BATCH_MAX_ITEMS
+    if len(batch_request.items) > limit:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {limit} items")
+    batch = await get_batch_chat_service().submit(batch_request.items)
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": batch.id, "status": batch.status, "total": batch.total},
+    )
+
+
+@router.get("/{job_id}", operation_id="get_chat_batch")
+async def get_batch(job_id: str):
+    batch = await get_batch_repository().get_batch(job_id)
+    if not batch:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {
+        "job_id": batch.id,
+        "status": batch.status,
+        "total": batch.total,
+        "completed": batch.completed,
+        "failed": batch.failed,
+        "results": batch.results,
+        "finished_at": batch.finishedAt.isoformat() if batch.finishedAt else None,
+    }
@@ -0,0 +1,26 @@
+import hmac
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from app.api.dependencies import get_config
+from app.core.metrics import registry
+
+router = APIRouter()
+
+
+async def verify_metrics(authorization: str = Header(None)):
+    """Prometheus' `authorization` / bearer_token settings send METRICS_TOKEN this way"""
+    token = get_config().METRICS_TOKEN
+    if token and not hmac.compare_digest((authorization or "").encode(), f"Bearer {token}".encode()):
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+
+@router.get(
+    "/metrics",
+    operation_id="metrics",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(verify_metrics)],
+)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta, timezone
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Query
+from app.api.dependencies import get_usage_repository
+from app.api.routes.admin import verify_admin
+
+router = APIRouter(dependencies=[Depends(verify_admin)])
+
+
+@router.get("", operation_id="usage")
+async def usage(
+    group_by: Literal["business", "workspace", "model", "bucket"] = Query("business"),
+    since: Optional[datetime] = Query(None, description="Defaults to 24 hours ago"),
+    until: Optional[datetime] = Query(None, description="Defaults to now"),
+    business_id: Optional[str] = Query(None),
+    workspace_id: Optional[str] = Query(None),
+    limit: int = Query(50, ge=1, le=1000),
+):
+    """
+    Usage totals from usage_rollups, biggest token spenders first (or in
+    time order for group_by=bucket). Rollups lag by up to
+    USAGE_FLUSH_INTERVAL.
+    """
+    until = until or datetime.now(timezone.utc)
+    since = since or until - timedelta(days=1)
+    rows = await get_usage_repository().aggregate(group_by, since, until, business_id, workspace_id, limit)
+    return {
+        "group_by": group_by,
+        "since": since.isoformat(),
+        "until": until.isoformat(),
+        "rows": rows,
+    }
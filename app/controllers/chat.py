@@ -1,15 +1,23 @@
+import json
+import asyncio
 import logging
+from typing import AsyncIterator
 from fastapi import Request, Response
 from app.services.chat import ChatService
 from app.domain.requests import ChatRequest
 from fastapi.exceptions import HTTPException
-from app.api.dependencies import get_chat_repository, logger
-from app.domain.errors import ClientDisconnectError, PrismaExecutionError
+from app.api.dependencies import get_admission_controller, get_chat_repository, logger
+from app.core.tracing import activate_turn, span, start_turn
+from app.core.streams import StreamBuffer, parse_event_id, stream_store
+from app.domain.errors import AdmissionRejectedError, PrismaExecutionError
+
+COMPLETE_EVENT_PREFIX = 'data: {"complete"'
 
 class ChatController:
     def __init__(self):
         self.chat_service = ChatService()
         self.chat_repo = get_chat_repository()
+        self.admission = get_admission_controller()
 
     async def handle_prompt(
         self,
@@ -19,51 +27,116 @@ class ChatController:
         request: Request,
         response: Response,
     ):
+        turn = start_turn()
+        # Once the producer runs it finishes the turn; every other return finishes it here
+        producing = False
         try:
-            bot = await self.chat_repo.get_bot(bot_id=bot_id)
+            with span("get_bot"):
+                bot = await self.chat_repo.get_bot(bot_id=bot_id)
             if not bot:
-                logger().warning(f"Bot not found: {bot_id}")
+                logger().warning("Bot not found: %s", bot_id)
                 raise HTTPException(404, "Bot not found")
 
-            conversation = await self.chat_repo.get_or_create_conversation(
-                bot_id=bot_id,
-                conversation_id=conversation_id,
-                chat_request=chat_request,
-                request=request,
-                response=response,
-            )
+            resume = parse_event_id(request.headers.get("last-event-id"))
+            if resume:
+                stream_id, after = resume
+                events = stream_store.replay(stream_id, conversation_id, after)
+                if events is None:
+                    return self._expired_stream()
+                return self._follow(events, request)
+
+            provider_name = bot.model.aiProvider.name if bot.model and bot.model.aiProvider else ""
+            if self.admission.is_saturated(provider_name, bot_id):
+                logger().warning("Shedding request for bot %s: provider or bot saturated", bot_id)
+                return self._busy_stream(self.admission.queue_timeout)
+
+            with span("get_or_create_conversation"):
+                conversation = await self.chat_repo.get_or_create_conversation(
+                    bot_id=bot_id,
+                    conversation_id=conversation_id,
+                    chat_request=chat_request,
+                    request=request,
+                    response=response,
+                )
             if not conversation:
                 logger().error("Failed to create or retrieve conversation")
                 raise HTTPException(500, "Creating and Retrieving Conversation failed")
 
-            async def stream_with_error_handling():
+            completed = False
+
+            async def produce(buffer: StreamBuffer):
+                # Runs detached from the response so a dropped client does not stop it
+                nonlocal completed
+                activate_turn(turn)
                 try:
-                    async for chunk in self.chat_service.handle_chat(
-                        bot=bot,
-                        prompt=chat_request.prompt,
-                        conversation_id=conversation.id,
-                        chat_request=chat_request,
-                    ):
-                        if await request.is_disconnected():
-                            logger().info(f"Client disconnected from conversation {conversation.id}")
-                            raise ClientDisconnectError("Client disconnected")
-                        yield chunk
-                except ClientDisconnectError:
-                    logger().info("Client disconnected, stopping stream")
-                    await self.chat_repo.delete_latest_message(conversationId=conversation.id, role="user")
+                    # Provider slots are taken per attempt by the router
+                    async with self.admission.admit_bot(bot_id):
+                        async for chunk in self.chat_service.handle_chat(
+                            bot=bot,
+                            prompt=chat_request.prompt,
+                            conversation_id=conversation.id,
+                            chat_request=chat_request,
+                            conversation=conversation,
+                        ):
+                            buffer.append(chunk)
+                            if chunk.startswith(COMPLETE_EVENT_PREFIX):
+                                completed = True
+                except AdmissionRejectedError as e:
+                    logger().warning("Admission rejected for bot %s: %s", bot_id, e)
+                    buffer.append(self._busy_event(e.retry_after))
+                except asyncio.CancelledError:
+                    logger().info("Stream %s abandoned by the client", buffer.stream_id)
+                    if not completed:
+                        await self.chat_repo.delete_latest_message(conversationId=conversation.id, role="user")
+                    raise
                 except Exception as e:
-                    logger().error(f"Error in stream: {str(e)}", exc_info=True)
-                    yield self.chat_service._stream_data({"error": str(e)})
+                    logger().error("Error in stream: %s", e, exc_info=True)
+                    buffer.append(self.chat_service._stream_data({"error": str(e)}))
+                finally:
+                    turn.finish()
 
-            return stream_with_error_handling()
+            try:
+                buffer = stream_store.create(turn.trace_id, conversation.id, produce)
+            except AdmissionRejectedError as e:
+                logger().warning("Shedding request for bot %s: %s", bot_id, e)
+                return self._busy_stream(e.retry_after)
+            producing = True
+            return self._follow(stream_store.follow(buffer), request)
 
         except Exception as e:
             if isinstance(e, PrismaExecutionError):
-                logger().error(f"Prisma Execution error {str(e)}", exc_info=True)
+                logger().error("Prisma Execution error %s", e, exc_info=True)
                 raise HTTPException(500, "Internal Server Error")
             if isinstance(e, HTTPException):
-                logger().warning(f"HTTP Exception: {str(e)}")
+                logger().warning("HTTP Exception: %s", e)
                 raise e
             
-            logger().error(f"Error handling prompt: {str(e)}", exc_info=True)
+            logger().error("Error handling prompt: %s", e, exc_info=True)
             raise HTTPException(status_code=500, detail=str(e))
+        finally:
+            if not producing:
+                turn.finish()
+
+    async def _follow(self, events: AsyncIterator[str], request: Request):
+        """Relay buffered events until the stream ends or the client goes away"""
+        try:
+            async for event in events:
+                if await request.is_disconnected():
+                    logger().info("Client disconnected, generation continues for resume")
+                    return
+                yield event
+        except LookupError as e:
+            logger().warning("Cannot resume stream: %s", e)
+            yield self.chat_service._stream_data({"error": "stream_expired"})
+        finally:
+            await events.aclose()
+
+    async def _expired_stream(self):
+        yield self.chat_service._stream_data({"error": "stream_expired"})
+
+    def _busy_event(self, retry_after: float) -> str:
+        """Format the load-shedding SSE event"""
+        return f"data: {json.dumps({'error': 'busy', 'retry_after': retry_after})}\n\n"
+
+    async def _busy_stream(self, retry_after: float):
+        yield self._busy_event(retry_after)
@@ -0,0 +1,146 @@
+import math
+import time
+import asyncio
+from typing import Dict, Optional
+from contextlib import asynccontextmanager
+from app.core.config import Config
+from app.core.metrics import registry
+from app.domain.errors import AdmissionRejectedError
+
+# Per provider name; bots are summed into provider="" so series stay bounded
+ADMISSION_IN_FLIGHT = registry.gauge(
+    "admission_in_flight",
+    "Completions currently holding an admission slot",
+    ["scope", "provider"],
+)
+ADMISSION_WAITING = registry.gauge(
+    "admission_waiting",
+    "Completions waiting in the admission queue",
+    ["scope", "provider"],
+)
+ADMISSION_QUEUE_WAIT = registry.histogram(
+    "admission_queue_wait_seconds",
+    "Time spent waiting for an admission slot",
+    ["scope"],
+    buckets=(0.001, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ADMISSION_REJECTED = registry.counter(
+    "admission_rejected_total",
+    "Completions shed by admission control",
+    ["scope", "reason"],
+)
+
+
+class _Limiter:
+    """Semaphore with a bounded number of waiters"""
+
+    def __init__(self, scope: str, key: str, limit: int, max_queue: int):
+        self.scope = scope
+        self.key = key
+        self.limit = limit
+        self.max_queue = max_queue
+        self.label = key if scope == "provider" else ""
+        self.waiting = 0
+        self.in_flight = 0
+        self._semaphore = asyncio.Semaphore(limit)
+
+    def is_saturated(self) -> bool:
+        return self.in_flight >= self.limit and self.waiting >= self.max_queue
+
+    async def acquire(self, timeout: float) -> None:
+        if timeout <= 0:
+            # Only a free slot will do; never queue
+            if self._semaphore.locked():
+                ADMISSION_REJECTED.inc(scope=self.scope, reason="busy")
+                raise AdmissionRejectedError(f"{self.scope} {self.key} has no free slot", retry_after=timeout)
+            await self._semaphore.acquire()
+            self.in_flight += 1
+            ADMISSION_IN_FLIGHT.inc(scope=self.scope, provider=self.label)
+            return
+        if self.is_saturated():
+            ADMISSION_REJECTED.inc(scope=self.scope, reason="queue_full")
+            raise AdmissionRejectedError(f"{self.scope} {self.key} is at capacity", retry_after=timeout)
+
+        started = time.perf_counter()
+        self.waiting += 1
+        ADMISSION_WAITING.inc(scope=self.scope, provider=self.label)
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            ADMISSION_REJECTED.inc(scope=self.scope, reason="timeout")
+            raise AdmissionRejectedError(f"Timed out waiting for {self.scope} {self.key}", retry_after=timeout)
+        finally:
+            self.waiting -= 1
+            ADMISSION_WAITING.dec(scope=self.scope, provider=self.label)
+            ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - started, scope=self.scope)
+
+        self.in_flight += 1
+        ADMISSION_IN_FLIGHT.inc(scope=self.scope, provider=self.label)
+
+    def release(self) -> None:
+        self.in_flight -= 1
+        ADMISSION_IN_FLIGHT.dec(scope=self.scope, provider=self.label)
+        self._semaphore.release()
+
+
+class AdmissionController:
+    """
+    Limits concurrent completions per provider (AiProvider.name) and per bot.
+
+    Configured limits apply to the whole deployment and are split evenly
+    across the uvicorn workers, so each worker enforces its own share
+    without any cross-process coordination.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        workers = max(1, config.WEB_CONCURRENCY)
+        self.provider_limit = self._split(config.PROVIDER_MAX_CONCURRENCY, workers)
+        self.bot_limit = self._split(config.BOT_MAX_CONCURRENCY, workers)
+        self.max_queue = self._split(config.ADMISSION_MAX_QUEUE, workers)
+        self.queue_timeout = config.ADMISSION_QUEUE_TIMEOUT
+        self._limiters: Dict[tuple[str, str], _Limiter] = {}
+
+    @staticmethod
+    def _split(limit: int, workers: int) -> int:
+        return max(1, math.ceil(limit / workers))
+
+    def _limiter(self, scope: str, key: str) -> _Limiter:
+        limiter = self._limiters.get((scope, key))
+        if limiter is None:
+            limit = self.provider_limit if scope == "provider" else self.bot_limit
+            limiter = _Limiter(scope, key, limit, self.max_queue)
+            self._limiters[(scope, key)] = limiter
+        return limiter
+
+    def is_saturated(self, provider_name: str, bot_id: str) -> bool:
+        """Cheap pre-check used to shed load before doing any request work"""
+        return (
+            self._limiter("bot", bot_id).is_saturated()
+            or self._limiter("provider", provider_name).is_saturated()
+        )
+
+    @asynccontextmanager
+    async def admit_bot(self, bot_id: str):
+        """Hold a bot slot for the duration of a turn"""
+        limiter = self._limiter("bot", bot_id)
+        await limiter.acquire(self.queue_timeout)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    @asynccontextmanager
+    async def admit_provider(self, provider_name: str, wait: bool = True):
+        """
+        Hold a provider endpoint slot for one completion request. The
+        router takes one per attempt, so failovers and hedges are counted
+        against the endpoint they actually hit; `wait=False` (hedges)
+        only takes a slot that is free right now.
+        """
+        limiter = self._limiter("provider", provider_name)
+        await limiter.acquire(self.queue_timeout if wait else 0)
+        try:
+            yield
+        finally:
+            limiter.release()
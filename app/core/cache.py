@@ -0,0 +1,298 @@
+import time
+import zlib
+import pickle
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from app.core.config import Config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CACHE_REQUESTS = registry.counter(
+    "cache_requests_total",
+    "Two-level cache lookups by cache, level (local, shared) and result (hit, miss)",
+    ["cache", "level", "result"],
+)
+CACHE_INVALIDATIONS = registry.counter(
+    "cache_invalidations_total",
+    "Local evictions by cache and origin (local, fanout)",
+    ["cache", "origin"],
+)
+CACHE_ENTRIES = registry.gauge(
+    "cache_local_entries", "Entries held in this worker's local tier", ["cache"]
+)
+
+COMPRESS_MIN_BYTES = 512
+
+
+def dumps(value: Any) -> bytes:
+    """Pickle a value, zlib-compressing it when that is worth it; the first byte tags the format"""
+    data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+    if len(data) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(data, 6)
+    return b"p" + data
+
+
+def loads(blob: bytes) -> Any:
+    data = blob[1:]
+    if blob[:1] == b"z":
+        data = zlib.decompress(data)
+    return pickle.loads(data)
+
+
+class SharedCacheStore:
+    """
+    Cache tier shared by the workers of one host: a SQLite file on tmpfs
+    (e.g. /dev/shm). Invalidations are appended to a log that every worker
+    tails to drop its local copies. Only this application writes the file,
+    which is what makes pickled values acceptable here.
+    """
+
+    def __init__(self, path: str, busy_timeout: float = 0.05):
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache_entries ("
+            "namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, expires REAL NOT NULL, "
+            "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS cache_invalidations ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, namespace TEXT NOT NULL, key TEXT, at REAL NOT NULL)"
+        )
+
+    def get(self, namespace: str, key: str) -> Optional[bytes]:
+        row = self._db.execute(
+            "SELECT value FROM cache_entries WHERE namespace = ? AND key = ? AND expires > ?",
+            (namespace, key, time.time()),
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, namespace: str, key: str, value: bytes, ttl: float) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?)", (namespace, key, value, time.time() + ttl)
+        )
+
+    def invalidate(self, namespace: str, key: Optional[str]) -> None:
+        """Delete an entry (or a whole namespace when key is None) and log it for the other workers"""
+        if key is None:
+            self._db.execute("DELETE FROM cache_entries WHERE namespace = ?", (namespace,))
+        else:
+            self._db.execute("DELETE FROM cache_entries WHERE namespace = ? AND key = ?", (namespace, key))
+        self._db.execute(
+            "INSERT INTO cache_invalidations (namespace, key, at) VALUES (?, ?, ?)", (namespace, key, time.time())
+        )
+
+    def last_seq(self) -> int:
+        return self._db.execute("SELECT coalesce(max(seq), 0) FROM cache_invalidations").fetchone()[0]
+
+    def invalidations_after(self, seq: int) -> List[Tuple[int, str, Optional[str]]]:
+        return self._db.execute(
+            "SELECT seq, namespace, key FROM cache_invalidations WHERE seq > ? ORDER BY seq", (seq,)
+        ).fetchall()
+
+    def prune(self, keep_log: float = 3600) -> None:
+        now = time.time()
+        self._db.execute("DELETE FROM cache_entries WHERE expires <= ?", (now,))
+        self._db.execute("DELETE FROM cache_invalidations WHERE at < ?", (now - keep_log,))
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class TwoLevelCache:
+    """
+    In-process LRU in front of the host-wide shared tier.
+
+    Lookups try the local LRU, then the shared store, then the loader;
+    concurrent misses for one key share a single load. Entries expire
+    after `ttl` in both tiers. `None` results are not cached, nor are
+    results of loads that an invalidation overtook.
+    """
+
+    def __init__(self, manager: "CacheManager", name: str, max_entries: int, ttl: float):
+        self.manager = manager
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._loading: Dict[Hashable, asyncio.Future] = {}
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._local.move_to_end(key)
+            CACHE_REQUESTS.inc(cache=self.name, level="local", result="hit")
+            return entry[1]
+        if entry is not None:
+            del self._local[key]
+        CACHE_REQUESTS.inc(cache=self.name, level="local", result="miss")
+
+        shared = self.manager.shared
+        if shared is None:
+            return None
+        try:
+            blob = shared.get(self.name, str(key))
+        except sqlite3.Error as e:
+            logger.debug("Shared cache read failed for %s: %s", self.name, e)
+            blob = None
+        CACHE_REQUESTS.inc(cache=self.name, level="shared", result="hit" if blob is not None else "miss")
+        if blob is None:
+            return None
+        value = loads(blob)
+        self._store_local(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if value is None:
+            return
+        self._store_local(key, value)
+        shared = self.manager.shared
+        if shared is not None:
+            try:
+                shared.set(self.name, str(key), dumps(value), self.ttl)
+            except sqlite3.Error as e:
+                logger.debug("Shared cache write failed for %s: %s", self.name, e)
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.get(key)
+        if value is not None:
+            return value
+        pending = self._loading.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only our own cancellation propagates; a cancelled leader means load again
+                if not pending.cancelled():
+                    raise
+            return await self.get_or_load(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark retrieved so a load nobody else awaited does not log a warning
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            # An invalidation during the load detached it; its value may predate the change
+            if self._loading.get(key) is future:
+                self.set(key, value)
+            return value
+        finally:
+            if self._loading.get(key) is future:
+                del self._loading[key]
+
+    def invalidate(self, key: Optional[Hashable] = None) -> None:
+        """Drop a key (or everything) here, in the shared tier and, via the log, in every worker"""
+        self.drop_local(key, origin="local")
+        shared = self.manager.shared
+        if shared is not None:
+            try:
+                shared.invalidate(self.name, None if key is None else str(key))
+            except sqlite3.Error as e:
+                logger.warning("Shared cache invalidation failed for %s: %s", self.name, e)
+
+    def drop_local(self, key: Optional[Hashable], origin: str) -> None:
+        if key is None:
+            self._local.clear()
+            self._loading.clear()
+        else:
+            # Keys arrive as strings from the shared log
+            for local_key in [k for k in self._local if k == key or str(k) == key]:
+                del self._local[local_key]
+            # Loads already running read the old data: later callers load again
+            for loading_key in [k for k in self._loading if k == key or str(k) == key]:
+                del self._loading[loading_key]
+        CACHE_INVALIDATIONS.inc(cache=self.name, origin=origin)
+        CACHE_ENTRIES.set(len(self._local), cache=self.name)
+
+    def _store_local(self, key: Hashable, value: Any) -> None:
+        self._local[key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(key)
+        if len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+        CACHE_ENTRIES.set(len(self._local), cache=self.name)
+
+
+class CacheManager:
+    """
+    Owns the shared tier and the invalidation tail for every TwoLevelCache.
+
+    Caches can be declared at import time; until `start()` opens
+    CACHE_SHARED_PATH (or when it is unset) they work as local LRUs.
+    """
+
+    PRUNE_EVERY = 120
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.shared_path = config.CACHE_SHARED_PATH
+        self.poll_interval = config.CACHE_INVALIDATION_POLL
+        self.default_ttl = config.CACHE_TTL
+        self.default_max_entries = config.CACHE_MAX_ENTRIES
+        self.shared: Optional[SharedCacheStore] = None
+        self._caches: Dict[str, TwoLevelCache] = {}
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def cache(self, name: str, max_entries: Optional[int] = None, ttl: Optional[float] = None) -> TwoLevelCache:
+        if name not in self._caches:
+            self._caches[name] = TwoLevelCache(
+                self, name, max_entries or self.default_max_entries, ttl or self.default_ttl
+            )
+        return self._caches[name]
+
+    def get(self, name: str) -> Optional[TwoLevelCache]:
+        return self._caches.get(name)
+
+    def start(self) -> None:
+        if not self.shared_path or self.shared is not None:
+            return
+        try:
+            self.shared = SharedCacheStore(self.shared_path)
+            self._seq = self.shared.last_seq()
+        except sqlite3.Error as e:
+            logger.warning("Shared cache at %s unavailable, using local caches only: %s", self.shared_path, e)
+            self.shared = None
+            return
+        self._task = asyncio.create_task(self._tail_invalidations(), name="cache-invalidations")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+    async def _tail_invalidations(self):
+        polls = 0
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                for seq, namespace, key in self.shared.invalidations_after(self._seq):
+                    self._seq = seq
+                    cache = self._caches.get(namespace)
+                    if cache is not None:
+                        cache.drop_local(key, origin="fanout")
+                polls += 1
+                if polls % self.PRUNE_EVERY == 0:
+                    self.shared.prune()
+            except sqlite3.Error as e:
+                logger.debug("Reading cache invalidations failed: %s", e)
+
+
+cache_manager = CacheManager()
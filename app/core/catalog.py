@@ -0,0 +1,467 @@
+import os
+import re
+import mmap
+import time
+import fcntl
+import struct
+import asyncio
+import logging
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import Config
+from app.core.metrics import registry
+from app.core.change_feed import change_feed
+
+logger = logging.getLogger(__name__)
+
+CATALOG_LOADS = registry.counter(
+    "catalog_snapshot_loads_total",
+    "Catalog snapshots mapped by origin (warm, export, compaction, reload)",
+    ["origin"],
+)
+CATALOG_DELTA_ROWS = registry.counter(
+    "catalog_delta_rows_total", "Changed product rows applied on top of catalog snapshots"
+)
+CATALOG_REFRESH_ERRORS = registry.counter(
+    "catalog_refresh_errors_total", "Catalog exports or delta reads that failed"
+)
+CATALOG_BUSINESSES = registry.gauge(
+    "catalog_businesses", "Business catalogs held by this worker"
+)
+
+# Host-local format: native byte order and item sizes
+MAGIC = b"CGCS"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("=4sHHIqq")  # magic, format, columns, rows, watermark ms, exported at ms
+COLUMN = struct.Struct("=16scxxxxxxxQQ")  # name, typecode, offset, length
+ALIGN = 8
+
+# Rows are sorted by id; "" reads back as None in the nullable columns
+STRING_COLUMNS = ("id", "name", "description", "category", "stock", "images")
+NUMBER_COLUMNS = (("price", "d"), ("updatedMs", "q"))
+COLUMNS = STRING_COLUMNS + tuple(column for column, _ in NUMBER_COLUMNS)
+IMAGE_SEPARATOR = "\x1f"
+SAFE_NAME = re.compile(r"[^\w-]")
+
+
+def _encode(column: str, value: Any) -> bytes:
+    if value is None:
+        return b""
+    if column == "images":
+        value = IMAGE_SEPARATOR.join(value)
+    return str(value).encode()
+
+
+def write_snapshot(path: str, business_id: str, rows: List[Dict[str, Any]], watermark: int) -> None:
+    """Write rows as a columnar snapshot; the file is replaced atomically"""
+    rows = sorted(rows, key=lambda row: row["id"])
+    sections: List[Tuple[str, str, bytes]] = []
+    for column in STRING_COLUMNS:
+        offsets = array("I", [0])
+        blob = bytearray()
+        for row in rows:
+            blob += _encode(column, row.get(column))
+            offsets.append(len(blob))
+        sections.append((column, "s", offsets.tobytes() + bytes(blob)))
+    for column, typecode in NUMBER_COLUMNS:
+        sections.append((column, typecode, array(typecode, (row.get(column) or 0 for row in rows)).tobytes()))
+
+    owner = business_id.encode()
+    offset = HEADER.size + 2 + len(owner) + COLUMN.size * len(sections)
+    directory = []
+    for column, typecode, data in sections:
+        offset += -offset % ALIGN
+        directory.append(COLUMN.pack(column.encode(), typecode.encode(), offset, len(data)))
+        offset += len(data)
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections), len(rows), watermark, int(time.time() * 1000)))
+        f.write(struct.pack("=H", len(owner)) + owner)
+        f.write(b"".join(directory))
+        for _, _, data in sections:
+            f.write(b"\0" * (-f.tell() % ALIGN))
+            f.write(data)
+    os.replace(tmp, path)
+
+
+class CatalogSnapshot:
+    """
+    Read-only view of a snapshot file. Columns are memoryviews over one
+    shared mmap, so opening costs a header parse whatever the catalog
+    size, and every worker reads the same page-cache copy. Strings are
+    decoded only when a row is read.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        self._views = [view]
+        magic, version, columns, self.rows, self.watermark, self.exported_at = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a catalog snapshot (format {FORMAT_VERSION})")
+        (owner_length,) = struct.unpack_from("=H", view, HEADER.size)
+        directory = HEADER.size + 2 + owner_length
+        self.business_id = bytes(view[HEADER.size + 2 : directory]).decode()
+        self._strings: Dict[str, Tuple[memoryview, memoryview]] = {}
+        self._numbers: Dict[str, memoryview] = {}
+        for index in range(columns):
+            name, typecode, offset, length = COLUMN.unpack_from(view, directory + index * COLUMN.size)
+            name, typecode = name.rstrip(b"\0").decode(), typecode.decode()
+            section = view[offset : offset + length]
+            if typecode == "s":
+                split = 4 * (self.rows + 1)
+                column = (section[:split].cast("I"), section[split:])
+                self._strings[name] = column
+                self._views.extend((section, *column))
+            else:
+                self._numbers[name] = section.cast(typecode)
+                self._views.extend((section, self._numbers[name]))
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def string(self, column: str, index: int) -> Optional[str]:
+        offsets, data = self._strings[column]
+        start, end = offsets[index], offsets[index + 1]
+        return str(data[start:end], "utf-8") if end > start else None
+
+    def value(self, column: str, index: int) -> Any:
+        numbers = self._numbers.get(column)
+        if numbers is not None:
+            return numbers[index]
+        value = self.string(column, index)
+        if column == "images":
+            return value.split(IMAGE_SEPARATOR) if value else []
+        return value
+
+    def row(self, index: int) -> Dict[str, Any]:
+        return {column: self.value(column, index) for column in COLUMNS}
+
+    def find(self, product_id: str) -> int:
+        """Row index of `product_id`, or -1; binary search over the sorted id column"""
+        offsets, data = self._strings["id"]
+        key = product_id.encode()
+        low, high = 0, self.rows
+        while low < high:
+            middle = (low + high) // 2
+            if data[offsets[middle] : offsets[middle + 1]].tobytes() < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.rows and data[offsets[low] : offsets[low + 1]].tobytes() == key:
+            return low
+        return -1
+
+    def close(self) -> None:
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A slice is still referenced somewhere; the mapping goes with it
+            pass
+
+
+class Catalog:
+    """A business's active products: a snapshot plus the rows changed since its watermark"""
+
+    def __init__(self, business_id: str, snapshot: Optional[CatalogSnapshot] = None):
+        self.business_id = business_id
+        self.snapshot = snapshot
+        self.watermark = snapshot.watermark if snapshot else 0
+        # id -> (updatedMs, row, or None once deactivated or deleted)
+        self.changes: Dict[str, Tuple[int, Optional[Dict[str, Any]]]] = {}
+        self.refreshed_at = 0.0
+
+    def __len__(self) -> int:
+        size = len(self.snapshot) if self.snapshot else 0
+        for product_id, (_, row) in self.changes.items():
+            size += (row is not None) - (self._base_index(product_id) >= 0)
+        return size
+
+    def get(self, product_id: str) -> Optional[Dict[str, Any]]:
+        change = self.changes.get(product_id)
+        if change is not None:
+            return change[1]
+        index = self._base_index(product_id)
+        return self.snapshot.row(index) if index >= 0 else None
+
+    def products(self) -> Iterator[Dict[str, Any]]:
+        if self.snapshot:
+            for index in self._base_rows():
+                yield self.snapshot.row(index)
+        for _, row in self.changes.values():
+            if row is not None:
+                yield row
+
+    def values(self, column: str) -> Iterator[Any]:
+        """One column of every product, without decoding the others"""
+        if self.snapshot:
+            for index in self._base_rows():
+                yield self.snapshot.value(column, index)
+        for _, row in self.changes.values():
+            if row is not None:
+                yield row.get(column)
+
+    def apply(self, rows: List[Dict[str, Any]]) -> None:
+        """Overlay changed rows; inactive ones hide the snapshot's copy"""
+        for row in rows:
+            self.changes[row["id"]] = (row["updatedMs"], row if row.get("isActive", True) else None)
+            self.watermark = max(self.watermark, row["updatedMs"])
+        CATALOG_DELTA_ROWS.inc(len(rows))
+
+    def rebase(self, snapshot: CatalogSnapshot) -> None:
+        """Swap in a newer snapshot, keeping only the changes it does not contain yet"""
+        previous, self.snapshot = self.snapshot, snapshot
+        # Changes in the watermark's own millisecond may be missing from the file, so they stay
+        self.changes = {
+            product_id: change for product_id, change in self.changes.items() if change[0] >= snapshot.watermark
+        }
+        self.watermark = max(self.watermark, snapshot.watermark)
+        if previous is not None:
+            previous.close()
+
+    def reset(self, snapshot: CatalogSnapshot) -> None:
+        """Swap in a fresh export and drop all changes"""
+        previous, self.snapshot = self.snapshot, snapshot
+        self.changes = {}
+        self.watermark = snapshot.watermark
+        if previous is not None and previous is not snapshot:
+            previous.close()
+
+    def _base_rows(self) -> Iterator[int]:
+        """Snapshot rows not superseded by a change"""
+        if not self.changes:
+            yield from range(len(self.snapshot))
+            return
+        for index in range(len(self.snapshot)):
+            if self.snapshot.string("id", index) not in self.changes:
+                yield index
+
+    def _base_index(self, product_id: str) -> int:
+        return self.snapshot.find(product_id) if self.snapshot else -1
+
+
+class CatalogStore:
+    """
+    Product catalogs per business for in-process lookups.
+
+    Snapshots are files in CATALOG_SNAPSHOT_DIR, one per business, written
+    atomically and mmap'd read-only: all workers of a host share one copy
+    and a restart or deploy starts warm instead of re-reading Postgres.
+    A catalog older than CATALOG_REFRESH_INTERVAL schedules a background
+    read of the rows changed since its watermark (the latest product or
+    category updatedAt it holds). Once CATALOG_MAX_CHANGES rows pile up,
+    the catalog is written back as a new snapshot that other workers
+    pick up. Hard deletes do not move updatedAt, so a product count that
+    disagrees with the database triggers a full re-export.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.enabled = config.CATALOG_ENABLED
+        self.directory = config.CATALOG_SNAPSHOT_DIR
+        self.refresh_interval = config.CATALOG_REFRESH_INTERVAL
+        self.max_changes = config.CATALOG_MAX_CHANGES
+        self._catalogs: Dict[str, Catalog] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._started = False
+
+    def start(self) -> None:
+        if not self.enabled or self._started:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".snap"):
+                continue
+            snapshot = self._open(os.path.join(self.directory, name))
+            if snapshot is not None:
+                self._catalogs[snapshot.business_id] = Catalog(snapshot.business_id, snapshot)
+                CATALOG_LOADS.inc(origin="warm")
+        CATALOG_BUSINESSES.set(len(self._catalogs))
+        self._started = True
+        logger.info("Mapped %s catalog snapshots from %s", len(self._catalogs), self.directory)
+
+    async def stop(self) -> None:
+        tasks = [*self._loading.values(), *self._refreshing.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for catalog in self._catalogs.values():
+            if catalog.snapshot is not None:
+                catalog.snapshot.close()
+        self._catalogs.clear()
+        self._started = False
+
+    async def get(self, business_id: str) -> Optional[Catalog]:
+        """The business's catalog, exporting it on first use; None when disabled or unavailable"""
+        if not self._started:
+            return None
+        catalog = self._catalogs.get(business_id)
+        if catalog is None:
+            task = self._loading.get(business_id)
+            if task is None:
+                task = asyncio.create_task(self._load(business_id))
+                self._loading[business_id] = task
+                task.add_done_callback(lambda _: self._loading.pop(business_id, None))
+            try:
+                catalog = await asyncio.shield(task)
+            except Exception as e:
+                CATALOG_REFRESH_ERRORS.inc()
+                logger.warning("Catalog for business %s unavailable: %s", business_id, e)
+                return None
+        elif time.monotonic() - catalog.refreshed_at > self.refresh_interval:
+            self._schedule_refresh(catalog)
+        return catalog
+
+    def peek(self, business_id: str) -> Optional[Catalog]:
+        """The catalog if this worker already holds it; never loads"""
+        return self._catalogs.get(business_id) if self._started else None
+
+    def invalidate(self, business_id: str) -> None:
+        """Products of a business changed: refresh its catalog now rather than on the next interval"""
+        catalog = self._catalogs.get(business_id)
+        if self._started and catalog is not None:
+            self._schedule_refresh(catalog)
+
+    async def _load(self, business_id: str) -> Catalog:
+        snapshot = await self._export(business_id)
+        catalog = Catalog(business_id, snapshot)
+        catalog.refreshed_at = time.monotonic()
+        self._catalogs[business_id] = catalog
+        CATALOG_BUSINESSES.set(len(self._catalogs))
+        return catalog
+
+    def _schedule_refresh(self, catalog: Catalog) -> None:
+        business_id = catalog.business_id
+        if business_id in self._refreshing:
+            return
+        task = asyncio.create_task(self.refresh(catalog))
+        self._refreshing[business_id] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(business_id, None))
+
+    async def refresh(self, catalog: Catalog) -> None:
+        """Bring a catalog up to date: newer snapshot file, changed rows, then a count check"""
+        from app.api.dependencies import get_business_repository
+
+        repository = get_business_repository()
+        catalog.refreshed_at = time.monotonic()
+        try:
+            path = self._path(catalog.business_id)
+            if catalog.snapshot is None or self._inode(path) not in (None, catalog.snapshot.inode):
+                snapshot = self._open(path)
+                if snapshot is not None:
+                    catalog.rebase(snapshot)
+                    CATALOG_LOADS.inc(origin="reload")
+
+            if await self._read_changes(catalog) and (
+                await repository.count_active_products(catalog.business_id) == len(catalog)
+            ):
+                # Changes in the watermark's millisecond stay after a compaction; only older ones count
+                if sum(updated < catalog.watermark for updated, _ in catalog.changes.values()) > self.max_changes:
+                    await self._compact(catalog)
+                return
+            # Too far behind, or something was hard-deleted
+            stale = catalog.snapshot.inode if catalog.snapshot else None
+            catalog.reset(await self._export(catalog.business_id, stale))
+        except Exception as e:
+            CATALOG_REFRESH_ERRORS.inc()
+            logger.warning("Catalog refresh for business %s failed: %s", catalog.business_id, e)
+
+    async def _read_changes(self, catalog: Catalog) -> bool:
+        """
+        Apply the rows changed at or after the watermark, a page at a time;
+        False once more than CATALOG_MAX_CHANGES of them are newer than it.
+        The watermark's own millisecond is re-read every time (a row in it
+        may have committed after the last read), so its rows never count
+        toward the limit however many a bulk update put there.
+        """
+        from app.api.dependencies import get_business_repository
+
+        since = catalog.watermark
+        after_ms, after_id = since, ""
+        newer = 0
+        while True:
+            page = await get_business_repository().catalog_changes(
+                catalog.business_id, after_ms, after_id, self.max_changes + 1
+            )
+            catalog.apply(page)
+            newer += sum(row["updatedMs"] > since for row in page)
+            if newer > self.max_changes:
+                return False
+            if len(page) <= self.max_changes:
+                return True
+            after_ms, after_id = page[-1]["updatedMs"], page[-1]["id"]
+
+    async def _export(self, business_id: str, stale_inode: Optional[int] = None) -> CatalogSnapshot:
+        """Write a snapshot from the database, unless another worker wrote a newer one meanwhile"""
+        from app.api.dependencies import get_business_repository
+
+        path = self._path(business_id)
+        lock = await asyncio.to_thread(self._lock, path, True)
+        try:
+            if self._inode(path) not in (None, stale_inode):
+                snapshot = self._open(path)
+                if snapshot is not None:
+                    CATALOG_LOADS.inc(origin="reload")
+                    return snapshot
+            rows = await get_business_repository().export_catalog(business_id)
+            watermark = max((row["updatedMs"] for row in rows), default=0)
+            await asyncio.to_thread(write_snapshot, path, business_id, rows, watermark)
+        finally:
+            lock.close()
+        CATALOG_LOADS.inc(origin="export")
+        return CatalogSnapshot(path)
+
+    async def _compact(self, catalog: Catalog) -> None:
+        """Write the catalog with its changes folded in; skipped while another worker writes"""
+        path = self._path(catalog.business_id)
+        lock = self._lock(path, False)
+        if lock is None:
+            return
+        try:
+            rows = list(catalog.products())
+            await asyncio.to_thread(write_snapshot, path, catalog.business_id, rows, catalog.watermark)
+        finally:
+            lock.close()
+        catalog.rebase(CatalogSnapshot(path))
+        CATALOG_LOADS.inc(origin="compaction")
+
+    def _path(self, business_id: str) -> str:
+        return os.path.join(self.directory, SAFE_NAME.sub("_", business_id) + ".snap")
+
+    @staticmethod
+    def _inode(path: str) -> Optional[int]:
+        try:
+            return os.stat(path).st_ino
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _open(path: str) -> Optional[CatalogSnapshot]:
+        try:
+            return CatalogSnapshot(path)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning("Ignoring catalog snapshot %s: %s", path, e)
+            return None
+
+    @staticmethod
+    def _lock(path: str, blocking: bool):
+        """Exclusive lock on the snapshot's lock file; None when not blocking and already held"""
+        lock = open(f"{path}.lock", "a")
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock.close()
+            return None
+        return lock
+
+
+catalog_store = CatalogStore()
+change_feed.subscribe("catalog", catalog_store.invalidate)
@@ -0,0 +1,197 @@
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from app.core.config import Config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_EVENTS = registry.counter(
+    "change_feed_events_total",
+    "Changed entities applied by source (tail, sweep)",
+    ["entity", "source"],
+)
+CHANGE_FEED_ERRORS = registry.counter(
+    "change_feed_errors_total", "Change feed reads or LISTEN connections that failed", ["stage"]
+)
+CHANGE_FEED_LISTENING = registry.gauge(
+    "change_feed_listening", "1 while this worker holds its LISTEN connection"
+)
+
+CHANNEL = "cognova_changes"
+# Query parameters Prisma understands that libpq/asyncpg would reject
+PRISMA_URL_PARAMS = {"schema", "connection_limit", "pool_timeout", "pgbouncer", "statement_cache_size", "socket_timeout"}
+
+Handler = Callable[[str], None]
+
+
+def listen_dsn(url: str) -> str:
+    parts = urlsplit(url)
+    query = [(name, value) for name, value in parse_qsl(parts.query) if name not in PRISMA_URL_PARAMS]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+class ChangeFeed:
+    """
+    Turns changes to business data into cache evictions.
+
+    Triggers from prisma/sql/003_change_feed.sql bump a version per
+    (entity, key) in change_versions and NOTIFY once per statement. Each
+    worker LISTENs on one dedicated asyncpg connection when asyncpg is
+    installed, paging through the rows after the last (version, entity,
+    key) it read on every notification, and otherwise polls every CHANGE_FEED_POLL_INTERVAL.
+    Versions come from a sequence, so a transaction can commit after a
+    later version was read; the reconciliation sweep every
+    CHANGE_FEED_RECONCILE_INTERVAL compares every key's version with the
+    last one applied and catches those.
+
+    Modules owning a cache register handlers with `subscribe(entity, fn)`;
+    `fn(key)` must be cheap and must not raise.
+    """
+
+    BATCH = 1000
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.enabled = config.CHANGE_FEED_ENABLED
+        self.database_url = config.CHANGE_FEED_DATABASE_URL or config.DB_URL
+        self.poll_interval = config.CHANGE_FEED_POLL_INTERVAL
+        self.reconcile_interval = config.CHANGE_FEED_RECONCILE_INTERVAL
+        self._handlers: Dict[str, List[Handler]] = defaultdict(list)
+        self._applied: Dict[Tuple[str, str], int] = {}
+        # (version, entity, key) of the last row read; one statement gives all its keys the same version
+        self._cursor: Tuple[int, str, str] = (0, "", "")
+        self._baseline = 0
+        self._wake = asyncio.Event()
+        self._listening = False
+        self._tasks: List[asyncio.Task] = []
+
+    def subscribe(self, entity: str, handler: Handler) -> None:
+        """Call `handler(key)` whenever a row behind `entity` (business, catalog, bot) changes"""
+        self._handlers[entity].append(handler)
+
+    def start(self) -> None:
+        if not self.enabled or self._tasks:
+            return
+        self._wake = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._run(), name="change-feed"))
+        if self.database_url:
+            self._tasks.append(asyncio.create_task(self._listen(), name="change-feed-listen"))
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        from app.api.dependencies import get_change_repository
+
+        repository = get_change_repository()
+        while True:
+            try:
+                # Only what changes from now on; caches start empty
+                self._baseline = await repository.latest_version()
+                self._cursor = (self._baseline, "", "")
+                break
+            except Exception as e:
+                CHANGE_FEED_ERRORS.inc(stage="baseline")
+                logger.warning("Change feed unavailable (is prisma/sql/003_change_feed.sql applied?): %s", e)
+                await asyncio.sleep(self.reconcile_interval)
+
+        next_sweep = time.monotonic() + self.reconcile_interval
+        while True:
+            interval = self.reconcile_interval if self._listening else self.poll_interval
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(0.0, min(interval, next_sweep - time.monotonic())))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + self.reconcile_interval
+                    await self.reconcile()
+                else:
+                    await self.poll()
+            except Exception as e:
+                CHANGE_FEED_ERRORS.inc(stage="read")
+                logger.warning("Reading the change feed failed: %s", e)
+
+    async def poll(self) -> int:
+        """Apply every change after the last version read; returns the number applied"""
+        from app.api.dependencies import get_change_repository
+
+        applied = 0
+        while True:
+            rows = await get_change_repository().changes_after(*self._cursor, self.BATCH)
+            for row in rows:
+                applied += self._apply(row["entity"], row["key"], int(row["version"]), "tail")
+            if rows:
+                last = rows[-1]
+                self._cursor = max(self._cursor, (int(last["version"]), last["entity"], last["key"]))
+            if len(rows) < self.BATCH:
+                return applied
+
+    async def reconcile(self) -> int:
+        """Apply versions the tail skipped because their transaction committed late"""
+        from app.api.dependencies import get_change_repository
+
+        applied = 0
+        latest = self._cursor[0]
+        for row in await get_change_repository().all_versions():
+            version = int(row["version"])
+            applied += self._apply(row["entity"], row["key"], version, "sweep")
+            latest = max(latest, version)
+        # The tail resumes at the newest version; rows re-read there are already applied
+        self._cursor = max(self._cursor, (latest, "", ""))
+        return applied
+
+    def _apply(self, entity: str, key: str, version: int, source: str) -> int:
+        if version <= self._applied.get((entity, key), self._baseline):
+            return 0
+        self._applied[(entity, key)] = version
+        for handler in self._handlers.get(entity, ()):
+            try:
+                handler(key)
+            except Exception as e:
+                logger.warning("Change handler for %s %s failed: %s", entity, key, e)
+        CHANGE_FEED_EVENTS.inc(entity=entity, source=source)
+        return 1
+
+    async def _listen(self):
+        try:
+            import asyncpg
+        except ImportError:
+            logger.info("asyncpg is not installed; polling the change feed every %ss", self.poll_interval)
+            return
+
+        delay = 1.0
+        while True:
+            connection = None
+            closed = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(listen_dsn(self.database_url))
+                connection.add_termination_listener(lambda _: closed.set())
+                await connection.add_listener(CHANNEL, lambda *_: self._wake.set())
+                self._listening = True
+                CHANGE_FEED_LISTENING.set(1)
+                delay = 1.0
+                # Catch up on whatever changed while not listening
+                self._wake.set()
+                await closed.wait()
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, asyncpg.InterfaceError) as e:
+                CHANGE_FEED_ERRORS.inc(stage="listen")
+                logger.warning("Change feed LISTEN connection failed, polling meanwhile: %s", e)
+            finally:
+                self._listening = False
+                CHANGE_FEED_LISTENING.set(0)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.reconcile_interval)
+
+
+change_feed = ChangeFeed()
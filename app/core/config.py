@@ -18,3 +18,119 @@ class Config:
         self.EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL")
         self.EMBEDDING_API_KEY = os.environ.get("EMBEDDING_API_KEY")
         self.EMBEDDING_BASE_URL = os.environ.get("EMBEDDING_BASE_URL")
+
+        # LLM settings
+        self.LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 60 * 2))
+
+        # Admission control (limits are per deployment, split across workers)
+        self.WEB_CONCURRENCY = int(os.environ.get("WEB_CONCURRENCY", 4))
+        self.PROVIDER_MAX_CONCURRENCY = int(os.environ.get("PROVIDER_MAX_CONCURRENCY", 32))
+        self.BOT_MAX_CONCURRENCY = int(os.environ.get("BOT_MAX_CONCURRENCY", 8))
+        self.ADMISSION_MAX_QUEUE = int(os.environ.get("ADMISSION_MAX_QUEUE", 16))
+        self.ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", 5))
+
+        # Provider routing
+        self.PROVIDER_HEDGING = os.environ.get("PROVIDER_HEDGING", "false").lower() == "true"
+        self.HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", 20))
+        self.HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", 0.5))
+        self.BREAKER_WINDOW = int(os.environ.get("BREAKER_WINDOW", 50))
+        self.BREAKER_MIN_REQUESTS = int(os.environ.get("BREAKER_MIN_REQUESTS", 10))
+        self.BREAKER_FAILURE_RATE = float(os.environ.get("BREAKER_FAILURE_RATE", 0.5))
+        self.BREAKER_SLOW_TTFT = float(os.environ.get("BREAKER_SLOW_TTFT", 20))
+        self.BREAKER_COOLDOWN = float(os.environ.get("BREAKER_COOLDOWN", 30))
+
+        # Tracing export (OTLP/HTTP JSON collector)
+        self.OTEL_EXPORTER_OTLP_ENDPOINT = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+        self.OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "cognova-backend")
+        self.OTEL_EXPORT_INTERVAL = float(os.environ.get("OTEL_EXPORT_INTERVAL", 5))
+        self.OTEL_MAX_BUFFER = int(os.environ.get("OTEL_MAX_BUFFER", 10000))
+
+        # Logging
+        self.LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+        self.LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")
+        self.LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 1.0))
+
+        # Event loop health
+        self.LOOP_MONITOR_ENABLED = os.environ.get("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+        self.LOOP_MONITOR_INTERVAL = float(os.environ.get("LOOP_MONITOR_INTERVAL", 0.25))
+        self.LOOP_STALL_THRESHOLD = float(os.environ.get("LOOP_STALL_THRESHOLD", 0.1))
+        self.LOOP_MAX_STACKS = int(os.environ.get("LOOP_MAX_STACKS", 500))
+
+        # Admin endpoints are disabled unless a token is configured
+        self.ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
+        # Bearer token required by /metrics when set; without it /metrics must stay on the internal network
+        self.METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+        # Follow-up question suggestions
+        self.SUGGESTIONS_BASE_URL = os.environ.get("SUGGESTIONS_BASE_URL", "https://generative.ai.cognova.io")
+        self.SUGGESTIONS_API_KEY = os.environ.get("SUGGESTIONS_API_KEY", "sk-no-key-requireda")
+        self.SUGGESTIONS_MODEL = os.environ.get("SUGGESTIONS_MODEL", "@hf/nousresearch/hermes-2-pro-mistral-7b")
+
+        # Token counting and context budgeting
+        self.TOKENIZER_DIR = os.environ.get("TOKENIZER_DIR", "data/tokenizers")
+        self.TOKENIZER_MAP = os.environ.get("TOKENIZER_MAP", "{}")
+        self.CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", 6000))
+        self.HISTORY_FETCH_LIMIT = int(os.environ.get("HISTORY_FETCH_LIMIT", 100))
+
+        # Archival of cold conversations out of the chats table
+        self.CHAT_ARCHIVE_AFTER_DAYS = int(os.environ.get("CHAT_ARCHIVE_AFTER_DAYS", 30))
+        self.CHAT_ARCHIVE_BATCH_SIZE = int(os.environ.get("CHAT_ARCHIVE_BATCH_SIZE", 200))
+
+        # Summary compaction of long WhatsApp conversations
+        self.COMPACTION_ENABLED = os.environ.get("COMPACTION_ENABLED", "true").lower() == "true"
+        self.COMPACTION_TRIGGER_TOKENS = int(os.environ.get("COMPACTION_TRIGGER_TOKENS", 3000))
+        self.COMPACTION_KEEP_TOKENS = int(os.environ.get("COMPACTION_KEEP_TOKENS", 1500))
+        self.COMPACTION_WORKERS = int(os.environ.get("COMPACTION_WORKERS", 2))
+        self.COMPACTION_QUEUE_SIZE = int(os.environ.get("COMPACTION_QUEUE_SIZE", 1000))
+        self.COMPACTION_MODEL = os.environ.get("COMPACTION_MODEL", self.SUGGESTIONS_MODEL)
+
+        # Send a per-business cache key so providers can reuse the prompt prefix
+        self.PROMPT_CACHE_HINTS = os.environ.get("PROMPT_CACHE_HINTS", "true").lower() == "true"
+
+        # Tool calls per turn unless the bot sets maxToolDepth
+        self.TOOL_MAX_DEPTH = int(os.environ.get("TOOL_MAX_DEPTH", 2))
+
+        # Batch chat jobs
+        self.BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 1000))
+        self.BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 16))
+        self.BATCH_FLUSH_SIZE = int(os.environ.get("BATCH_FLUSH_SIZE", 100))
+
+        # Resumable SSE streams
+        self.STREAM_BUFFER_EVENTS = int(os.environ.get("STREAM_BUFFER_EVENTS", 2000))
+        self.STREAM_MAX_ACTIVE = int(os.environ.get("STREAM_MAX_ACTIVE", 1000))
+        self.STREAM_DETACH_GRACE = float(os.environ.get("STREAM_DETACH_GRACE", 30))
+        self.STREAM_RESUME_TTL = float(os.environ.get("STREAM_RESUME_TTL", 120))
+        self.STREAM_SHARED_PATH = os.environ.get("STREAM_SHARED_PATH")
+        self.STREAM_SHARED_POLL = float(os.environ.get("STREAM_SHARED_POLL", 0.1))
+
+        # Two-level cache: per-worker LRU in front of a host-wide SQLite file
+        self.CACHE_SHARED_PATH = os.environ.get("CACHE_SHARED_PATH")
+        self.CACHE_TTL = float(os.environ.get("CACHE_TTL", 60))
+        self.CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+        self.CACHE_INVALIDATION_POLL = float(os.environ.get("CACHE_INVALIDATION_POLL", 0.5))
+
+        # Usage metering: in-memory rollups flushed to usage_rollups
+        self.USAGE_METERING_ENABLED = os.environ.get("USAGE_METERING_ENABLED", "true").lower() == "true"
+        self.USAGE_ROLLUP_SECONDS = int(os.environ.get("USAGE_ROLLUP_SECONDS", 3600))
+        self.USAGE_FLUSH_INTERVAL = float(os.environ.get("USAGE_FLUSH_INTERVAL", 60))
+        self.USAGE_MAX_KEYS = int(os.environ.get("USAGE_MAX_KEYS", 50000))
+
+        # Token-bucket rate limits per session, client IP and bot, by plan
+        self.RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+        self.RATE_LIMIT_SHARED_PATH = os.environ.get("RATE_LIMIT_SHARED_PATH")
+        self.RATE_LIMIT_PLANS = os.environ.get("RATE_LIMIT_PLANS", "{}")
+        self.RATE_LIMIT_PLAN_TTL = float(os.environ.get("RATE_LIMIT_PLAN_TTL", 300))
+        # Peers whose CF-Connecting-IP / X-Forwarded-For / X-Real-IP headers are believed (IPs or CIDRs)
+        self.RATE_LIMIT_TRUSTED_PROXIES = os.environ.get("RATE_LIMIT_TRUSTED_PROXIES", "127.0.0.1,::1")
+
+        # Columnar product catalog snapshots, mmap'd by every worker
+        self.CATALOG_ENABLED = os.environ.get("CATALOG_ENABLED", "true").lower() == "true"
+        self.CATALOG_SNAPSHOT_DIR = os.environ.get("CATALOG_SNAPSHOT_DIR", "data/catalog")
+        self.CATALOG_REFRESH_INTERVAL = float(os.environ.get("CATALOG_REFRESH_INTERVAL", 30))
+        self.CATALOG_MAX_CHANGES = int(os.environ.get("CATALOG_MAX_CHANGES", 500))
+
+        # Change feed (prisma/sql/003_change_feed.sql) evicting cached business data
+        self.CHANGE_FEED_ENABLED = os.environ.get("CHANGE_FEED_ENABLED", "true").lower() == "true"
+        self.CHANGE_FEED_DATABASE_URL = os.environ.get("CHANGE_FEED_DATABASE_URL")
+        self.CHANGE_FEED_POLL_INTERVAL = float(os.environ.get("CHANGE_FEED_POLL_INTERVAL", 5))
+        self.CHANGE_FEED_RECONCILE_INTERVAL = float(os.environ.get("CHANGE_FEED_RECONCILE_INTERVAL", 60))
@@ -17,7 +17,7 @@ class Database:
                 self._is_connected = True
                 logger.info("Successfully connected to database")
         except Exception as e:
-            logger.error(f"Failed to connect to database: {str(e)}")
+            logger.error("Failed to connect to database: %s", e)
             raise
 
     async def disconnect(self) -> None:
@@ -27,7 +27,7 @@ class Database:
                 self._is_connected = False
                 logger.info("Successfully disconnected from database")
         except Exception as e:
-            logger.error(f"Error disconnecting from database: {str(e)}")
+            logger.error("Error disconnecting from database: %s", e)
             raise
 
     @property
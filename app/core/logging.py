@@ -1,31 +1,146 @@
+import os
 import sys
+import json
+import queue
+import atexit
+import random
 import logging
 from pathlib import Path
-from logging.handlers import RotatingFileHandler
+from contextvars import ContextVar
+from typing import Optional
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from app.core.config import Config
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Pass as `extra=SAMPLED` on high-volume records so they are kept at LOG_SAMPLE_RATE
+SAMPLED = {"sampled": True}
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Render a record as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "pid": record.process,
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            payload["request_id"] = request_id
+        if record.exc_info:
+            payload["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            payload["exc"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        if not hasattr(record, "request_id"):
+            record.request_id = "-"
+        return super().format(record)
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id; runs on the calling thread where the context is visible"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records flagged as sampled; warnings and above always pass"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not getattr(record, "sampled", False):
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Enqueue records without formatting them.
+
+    The stock QueueHandler renders the message and traceback on the
+    calling thread so records can be pickled; ours stays in-process, so
+    all formatting is left to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
 
 
 def setup_logging():
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    config = Config()
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
 
     # Configure logging
-    logging_format = logging.Formatter(
-        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-    )
-
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
+    logging_format = JsonFormatter() if config.LOG_FORMAT == "json" else TextFormatter()
 
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(logging_format)
-    root_logger.addHandler(console_handler)
 
     file_handler = RotatingFileHandler(
         "logs/app.log", maxBytes=10485760, backupCount=5, encoding="utf-8"  # 10MB
     )
     file_handler.setFormatter(logging_format)
-    root_logger.addHandler(file_handler)
+
+    # Handlers doing I/O run on the listener thread, never on the event loop
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = DeferredQueueHandler(log_queue)
+    _queue_handler.addFilter(SamplingFilter(config.LOG_SAMPLE_RATE))
+    _queue_handler.addFilter(RequestContextFilter())
+
+    root_logger = logging.getLogger()
+    root_logger.setLevel(config.LOG_LEVEL)
+    root_logger.addHandler(_queue_handler)
+
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
 
     logging.getLogger("uvicorn.access").setLevel(logging.WARNING)
     logging.getLogger("fastapi").setLevel(logging.INFO)
     logging.getLogger("httpx").disabled = True
+
+
+def _restart_listener_after_fork():
+    # The listener thread does not survive fork; give the child its own queue and thread
+    global _listener
+    if _listener is not None:
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        _queue_handler.queue = log_queue
+        _listener = QueueListener(log_queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
+
+def stop_logging():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,147 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from types import FrameType
+from typing import Dict, Optional
+from app.core.config import Config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = registry.histogram(
+    "event_loop_lag_seconds",
+    "Delay between when a loop tick was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+LOOP_STALLS = registry.counter(
+    "event_loop_stalls_total",
+    "Times the event loop was blocked longer than LOOP_STALL_THRESHOLD",
+)
+LOOP_STALL_SAMPLES = registry.counter(
+    "event_loop_stall_samples_total",
+    "Stack samples captured while the event loop was blocked",
+)
+
+
+def fold_stack(frame: Optional[FrameType]) -> str:
+    """Render a frame chain root-first in the folded format used by flamegraph tools"""
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+def render_folded(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag and captures stacks of blocking callbacks.
+
+    A coroutine ticks every LOOP_MONITOR_INTERVAL and records how late
+    each tick ran. A watchdog thread watches the tick heartbeat; when the
+    loop has not ticked for LOOP_STALL_THRESHOLD it samples the loop
+    thread's stack, which points at the callback that is blocking it.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.interval = config.LOOP_MONITOR_INTERVAL
+        self.stall_threshold = config.LOOP_STALL_THRESHOLD
+        self.max_stacks = config.LOOP_MAX_STACKS
+        self.stall_stacks: Counter = Counter()
+        self.max_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._in_stall = False
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _tick(self) -> None:
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._heartbeat = now
+            self.max_lag = max(self.max_lag, lag)
+            LOOP_LAG.observe(lag)
+
+    def _watch(self) -> None:
+        poll = max(self.stall_threshold / 4, 0.005)
+        while not self._stop.wait(poll):
+            blocked_for = time.monotonic() - self._heartbeat - self.interval
+            if blocked_for < self.stall_threshold:
+                self._in_stall = False
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = fold_stack(frame)
+            if stack in self.stall_stacks or len(self.stall_stacks) < self.max_stacks:
+                self.stall_stacks[stack] += 1
+            LOOP_STALL_SAMPLES.inc()
+            if not self._in_stall:
+                self._in_stall = True
+                LOOP_STALLS.inc()
+                logger.warning("Event loop blocked for %.3fs at %s", blocked_for, stack.rsplit(";", 3)[-3:])
+
+    def snapshot(self) -> Dict[str, float]:
+        return {
+            "max_lag_seconds": self.max_lag,
+            "stalls": LOOP_STALLS.value(),
+            "stall_samples": LOOP_STALL_SAMPLES.value(),
+            "distinct_stall_stacks": len(self.stall_stacks),
+        }
+
+    def stall_dump(self) -> str:
+        """Stall stacks in folded format (flamegraph.pl, speedscope, inferno)"""
+        return render_folded(self.stall_stacks)
+
+    async def profile(self, seconds: float, interval: float) -> str:
+        """Sample the loop thread for a while and return the folded stacks"""
+        stacks: Counter = Counter()
+        done = threading.Event()
+        thread_id = self._loop_thread_id or threading.get_ident()
+
+        def sample() -> None:
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline and not done.is_set():
+                frame = sys._current_frames().get(thread_id)
+                if frame is not None:
+                    stacks[fold_stack(frame)] += 1
+                time.sleep(interval)
+
+        sampler = threading.Thread(target=sample, name="loop-profiler", daemon=True)
+        sampler.start()
+        try:
+            while sampler.is_alive():
+                await asyncio.sleep(0.05)
+        finally:
+            done.set()
+        return render_folded(stacks)
+
+
+loop_monitor = LoopMonitor()
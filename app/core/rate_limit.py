@@ -0,0 +1,277 @@
+import json
+import math
+import time
+import asyncio
+import logging
+import sqlite3
+import ipaddress
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Union
+from app.core.config import Config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMITED = registry.counter(
+    "rate_limited_total", "Requests rejected by the token-bucket limiter", ["scope", "plan"]
+)
+RATE_LIMIT_ERRORS = registry.counter(
+    "rate_limit_store_errors_total", "Shared bucket store failures (requests are let through)"
+)
+
+# Checked in this order; a request spends a token from every bucket or from none
+SCOPES = ("bot", "session", "ip")
+
+DEFAULT_PLANS = {
+    # requests per minute, burst
+    "default": {"session": [20, 10], "ip": [60, 30], "bot": [600, 100]},
+}
+
+
+@dataclass(frozen=True)
+class Quota:
+    rate: float  # tokens per second
+    burst: float
+
+
+@dataclass(frozen=True)
+class Decision:
+    allowed: bool
+    scope: Optional[str] = None
+    retry_after: float = 0.0
+
+
+def parse_plans(raw: Optional[str]) -> Dict[str, Dict[str, Quota]]:
+    """RATE_LIMIT_PLANS: {"plan": {"session": [per_minute, burst], ...}}; missing entries fall back to "default\""""
+    plans = {name: dict(quotas) for name, quotas in DEFAULT_PLANS.items()}
+    for name, quotas in json.loads(raw or "{}").items():
+        plans.setdefault(name, {}).update(quotas)
+    default = plans["default"]
+    return {
+        name: {
+            scope: Quota(rate=per_minute / 60, burst=burst)
+            for scope, (per_minute, burst) in {**default, **quotas}.items()
+        }
+        for name, quotas in plans.items()
+    }
+
+
+def parse_networks(raw: Optional[str]) -> List[Union[ipaddress.IPv4Network, ipaddress.IPv6Network]]:
+    """Comma-separated addresses or CIDR ranges"""
+    networks = []
+    for item in (raw or "").split(","):
+        if item.strip():
+            try:
+                networks.append(ipaddress.ip_network(item.strip(), strict=False))
+            except ValueError:
+                logger.warning("Ignoring invalid trusted proxy %r", item)
+    return networks
+
+
+Buckets = List[Tuple[str, Quota]]
+
+
+class LocalBuckets:
+    """Per-worker buckets, used when no shared store is configured"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, buckets: Buckets, now: float) -> Tuple[Optional[int], float]:
+        """
+        Take one token from every bucket, or from none: returns the index of
+        the first empty bucket and its tokens, or (None, 0) when all had one.
+        """
+        refilled = []
+        for index, (key, quota) in enumerate(buckets):
+            tokens, updated = self._buckets.get(key, (quota.burst, now))
+            tokens = min(quota.burst, tokens + (now - updated) * quota.rate)
+            if tokens < 1:
+                if key in self._buckets:
+                    # Keep a throttled key recent so eviction cannot refill it
+                    self._buckets.move_to_end(key)
+                return index, tokens
+            refilled.append(tokens)
+        for (key, _), tokens in zip(buckets, refilled):
+            if key in self._buckets:
+                self._buckets.move_to_end(key)
+            elif len(self._buckets) >= self.max_keys:
+                # Least recently used first; an evicted bucket simply starts full again
+                self._buckets.popitem(last=False)
+            self._buckets[key] = (tokens - 1, now)
+        return None, 0.0
+
+
+class SharedBuckets:
+    """
+    Buckets in a SQLite file on tmpfs shared by the workers of a host.
+    Refill, check and take happen in one UPSERT per bucket, all in one
+    transaction that is rolled back if any bucket is empty, so concurrent
+    workers cannot both spend the last token.
+    """
+
+    TAKE_SQL = (
+        "INSERT INTO rate_buckets (key, tokens, updated, allowed) VALUES (:key, :burst - 1, :now, 1) "
+        "ON CONFLICT(key) DO UPDATE SET "
+        "allowed = min(:burst, tokens + (:now - updated) * :rate) >= 1, "
+        "tokens = min(:burst, tokens + (:now - updated) * :rate) "
+        "- (min(:burst, tokens + (:now - updated) * :rate) >= 1), "
+        "updated = :now "
+        "RETURNING allowed, tokens"
+    )
+
+    def __init__(self, path: str, busy_timeout: float = 0.05):
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rate_buckets ("
+            "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, allowed INTEGER NOT NULL"
+            ") WITHOUT ROWID"
+        )
+
+    def take(self, buckets: Buckets, now: float) -> Tuple[Optional[int], float]:
+        """Same contract as LocalBuckets.take"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            for index, (key, quota) in enumerate(buckets):
+                allowed, tokens = self._db.execute(
+                    self.TAKE_SQL, {"key": key, "burst": quota.burst, "rate": quota.rate, "now": now}
+                ).fetchone()
+                if not allowed:
+                    self._db.execute("ROLLBACK")
+                    return index, tokens
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return None, 0.0
+
+    def prune(self, idle: float) -> None:
+        # A bucket idle this long has refilled completely
+        self._db.execute("DELETE FROM rate_buckets WHERE updated < ?", (time.time() - idle,))
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class RateLimiter:
+    """
+    Token buckets per session, client IP and bot, sized by the bot's plan.
+
+    Buckets live in RATE_LIMIT_SHARED_PATH when set, so the quota holds
+    across uvicorn workers; otherwise each worker enforces its share of
+    it. Bot plans are resolved off the request path: an unknown bot uses
+    the "default" plan while its plan is looked up in the background.
+    """
+
+    PRUNE_INTERVAL = 300
+    MAX_BOT_PLANS = 10_000
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.enabled = config.RATE_LIMIT_ENABLED
+        self.shared_path = config.RATE_LIMIT_SHARED_PATH
+        self.plans = parse_plans(config.RATE_LIMIT_PLANS)
+        self.workers = max(1, config.WEB_CONCURRENCY)
+        self.plan_ttl = config.RATE_LIMIT_PLAN_TTL
+        self.trusted_proxies = parse_networks(config.RATE_LIMIT_TRUSTED_PROXIES)
+        self.local = LocalBuckets()
+        self.shared: Optional[SharedBuckets] = None
+        self._bot_plans: Dict[str, Tuple[float, str]] = {}
+        self._resolving: Dict[str, asyncio.Task] = {}
+        self._pruned_at = time.monotonic()
+
+    def start(self) -> None:
+        if self.enabled and self.shared_path and self.shared is None:
+            try:
+                self.shared = SharedBuckets(self.shared_path)
+            except sqlite3.Error as e:
+                logger.warning("Shared rate limit store at %s unavailable: %s", self.shared_path, e)
+
+    async def stop(self) -> None:
+        for task in list(self._resolving.values()):
+            task.cancel()
+        await asyncio.gather(*self._resolving.values(), return_exceptions=True)
+        if self.shared is not None:
+            self.shared.close()
+            self.shared = None
+
+    def is_trusted_proxy(self, address: Optional[str]) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_proxies)
+
+    def check(self, keys: Dict[str, Optional[str]]) -> Decision:
+        """
+        Take one token from every bucket in `keys` (scope -> key), or none
+        if any of them is empty; no I/O beyond the local store.
+        """
+        bot_id = keys.get("bot")
+        cached = self._bot_plans.get(bot_id) if bot_id else None
+        plan = cached[1] if cached else "default"
+        quotas = self.plans.get(plan) or self.plans["default"]
+        scopes = [scope for scope in SCOPES if keys.get(scope) and quotas.get(scope) is not None]
+        refused, tokens = self._take([(f"{scope}:{keys[scope]}", quotas[scope]) for scope in scopes], time.time())
+        if refused is not None:
+            scope, quota = scopes[refused], quotas[scopes[refused]]
+            RATE_LIMITED.inc(scope=scope, plan=plan)
+            rate = quota.rate if self.shared is not None else quota.rate / self.workers
+            return Decision(False, scope, math.ceil((1 - tokens) / rate) if rate > 0 else 60)
+        if bot_id and (cached is None or cached[0] <= time.monotonic()):
+            self._schedule_resolve(bot_id)
+        self._maybe_prune()
+        return Decision(True)
+
+    def _take(self, buckets: Buckets, now: float) -> Tuple[Optional[int], float]:
+        if self.shared is not None:
+            try:
+                return self.shared.take(buckets, now)
+            except sqlite3.Error as e:
+                RATE_LIMIT_ERRORS.inc()
+                logger.debug("Rate limit store failed, allowing request: %s", e)
+                return None, 0.0
+        return self.local.take(
+            [
+                (key, Quota(rate=quota.rate / self.workers, burst=max(1.0, quota.burst / self.workers)))
+                for key, quota in buckets
+            ],
+            now,
+        )
+
+    def _maybe_prune(self) -> None:
+        if self.shared is None or time.monotonic() - self._pruned_at < self.PRUNE_INTERVAL:
+            return
+        self._pruned_at = time.monotonic()
+        longest_refill = max(quota.burst / quota.rate for quotas in self.plans.values() for quota in quotas.values())
+        try:
+            self.shared.prune(longest_refill)
+        except sqlite3.Error as e:
+            logger.debug("Rate limit prune failed: %s", e)
+
+    def _schedule_resolve(self, bot_id: str) -> None:
+        # Only for admitted requests, so rejected floods never cause lookups
+        if bot_id in self._resolving:
+            return
+        task = asyncio.get_running_loop().create_task(self._resolve_plan(bot_id))
+        self._resolving[bot_id] = task
+        task.add_done_callback(lambda _: self._resolving.pop(bot_id, None))
+
+    async def _resolve_plan(self, bot_id: str) -> None:
+        from app.api.dependencies import get_chat_repository
+
+        try:
+            plan = await get_chat_repository().get_bot_plan(bot_id) or "default"
+        except Exception as e:
+            logger.debug("Plan lookup for bot %s failed: %s", bot_id, e)
+            plan = "default"
+        if bot_id not in self._bot_plans and len(self._bot_plans) >= self.MAX_BOT_PLANS:
+            self._bot_plans.pop(next(iter(self._bot_plans)))
+        self._bot_plans[bot_id] = (time.monotonic() + self.plan_ttl, plan)
+
+
+rate_limiter = RateLimiter()
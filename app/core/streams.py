@@ -0,0 +1,388 @@
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import OrderedDict, deque
+from typing import AsyncIterator, Awaitable, Callable, Deque, List, Optional, Set, Tuple
+from app.core.config import Config
+from app.core.metrics import registry
+from app.domain.errors import AdmissionRejectedError
+
+logger = logging.getLogger(__name__)
+
+STREAM_RESUMES = registry.counter(
+    "sse_stream_resumes_total",
+    "Reconnects carrying Last-Event-ID by outcome (local, shared, expired)",
+    ["result"],
+)
+STREAMS_ABANDONED = registry.counter(
+    "sse_streams_abandoned_total",
+    "Generations cancelled because no client reattached within STREAM_DETACH_GRACE",
+)
+STREAMS_ACTIVE = registry.gauge(
+    "sse_streams_active", "Streams held in this worker's replay store"
+)
+STREAMS_SHED = registry.counter(
+    "sse_streams_shed_total", "New streams refused because STREAM_MAX_ACTIVE streams were still generating"
+)
+
+
+def event_id(stream_id: str, seq: int) -> str:
+    return f"{stream_id}-{seq}"
+
+
+def parse_event_id(value: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Split a Last-Event-ID header into (stream_id, seq)"""
+    if not value:
+        return None
+    stream_id, _, seq = value.strip().rpartition("-")
+    if not stream_id or not seq.isdigit():
+        return None
+    return stream_id, int(seq)
+
+
+def format_event(stream_id: str, seq: int, data: str) -> str:
+    """Prefix an already formatted `data:` event with its SSE id"""
+    return f"id: {event_id(stream_id, seq)}\n{data}"
+
+
+class StreamBuffer:
+    """
+    Ring buffer of the events of one generation.
+
+    The producer appends events and closes the buffer when generation
+    ends; any number of readers follow it from a sequence number. When
+    the last reader detaches before the end, the producer is cancelled
+    unless a reader reattaches, or one on another worker reports in
+    through `remote_reader`, within the grace period.
+    """
+
+    def __init__(self, stream_id: str, conversation_id: str, max_events: int, grace: float):
+        self.stream_id = stream_id
+        self.conversation_id = conversation_id
+        self.grace = grace
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=max_events)
+        self.next_seq = 1
+        self.done = False
+        self.closed_at: Optional[float] = None
+        self.producer: Optional[asyncio.Task] = None
+        self.on_append: Optional[Callable[[int, str], None]] = None
+        # Wall-clock time a reader on another worker last polled the shared log
+        self.remote_reader: Optional[Callable[[], Optional[float]]] = None
+        self._readers = 0
+        self._abandon: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+
+    def append(self, data: str) -> int:
+        seq = self.next_seq
+        self.next_seq += 1
+        self.events.append((seq, data))
+        if self.on_append:
+            self.on_append(seq, data)
+        self._notify()
+        return seq
+
+    def close(self) -> None:
+        self.done = True
+        self.closed_at = time.monotonic()
+        self._cancel_abandon()
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def events_after(self, seq: int) -> Optional[List[Tuple[int, str]]]:
+        """Events newer than `seq`, or None if some of them were already dropped"""
+        if self.events and self.events[0][0] > seq + 1:
+            return None
+        return [event for event in self.events if event[0] > seq]
+
+    async def follow(self, after: int = 0) -> AsyncIterator[Tuple[int, str]]:
+        self.attach()
+        try:
+            while True:
+                changed = self._changed
+                events = self.events_after(after)
+                if events is None:
+                    raise LookupError(f"Stream {self.stream_id} no longer holds event {after + 1}")
+                for seq, data in events:
+                    after = seq
+                    yield seq, data
+                if self.done and after >= self.next_seq - 1:
+                    return
+                await changed.wait()
+        finally:
+            self.detach()
+
+    def attach(self) -> None:
+        self._readers += 1
+        self._cancel_abandon()
+
+    def detach(self) -> None:
+        self._readers -= 1
+        if self._readers == 0 and not self.done and self.producer is not None:
+            self._abandon = asyncio.get_running_loop().call_later(self.grace, self._abandon_producer)
+
+    def _cancel_abandon(self) -> None:
+        if self._abandon is not None:
+            self._abandon.cancel()
+            self._abandon = None
+
+    def _abandon_producer(self) -> None:
+        self._abandon = None
+        if self._readers == 0 and not self.done and self.producer is not None:
+            seen = self.remote_reader() if self.remote_reader else None
+            if seen is not None and time.time() - seen < self.grace:
+                self._abandon = asyncio.get_running_loop().call_later(self.grace, self._abandon_producer)
+                return
+            logger.info("No client reattached to stream %s, cancelling generation", self.stream_id)
+            STREAMS_ABANDONED.inc()
+            self.producer.cancel()
+
+
+class SharedStreamLog:
+    """
+    SQLite copy of stream events so another worker on the same host can
+    replay them; point STREAM_SHARED_PATH at tmpfs (e.g. /dev/shm).
+    """
+
+    def __init__(self, path: str, max_events: int, busy_timeout: float = 0.05):
+        self.max_events = max_events
+        # Writes run on the event loop: wait briefly for the lock, then give up
+        self._db = sqlite3.connect(path, timeout=busy_timeout, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS streams ("
+            "stream_id TEXT PRIMARY KEY, conversation_id TEXT NOT NULL, done INTEGER NOT NULL DEFAULT 0, "
+            "expires REAL, reader_seen REAL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(streams)")}
+        if "reader_seen" not in columns:
+            # File created before reader heartbeats existed
+            self._db.execute("ALTER TABLE streams ADD COLUMN reader_seen REAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stream_events ("
+            "stream_id TEXT NOT NULL, seq INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (stream_id, seq))"
+        )
+
+    def open(self, stream_id: str, conversation_id: str) -> None:
+        self._db.execute(
+            "INSERT OR REPLACE INTO streams (stream_id, conversation_id, done) VALUES (?, ?, 0)",
+            (stream_id, conversation_id),
+        )
+
+    def append(self, stream_id: str, seq: int, data: str) -> None:
+        self._db.execute("INSERT OR REPLACE INTO stream_events VALUES (?, ?, ?)", (stream_id, seq, data))
+        if seq % 256 == 0:
+            self._db.execute(
+                "DELETE FROM stream_events WHERE stream_id = ? AND seq <= ?", (stream_id, seq - self.max_events)
+            )
+
+    def close(self, stream_id: str, ttl: float) -> None:
+        now = time.time()
+        self._db.execute("UPDATE streams SET done = 1, expires = ? WHERE stream_id = ?", (now + ttl, stream_id))
+        expired = [row[0] for row in self._db.execute("SELECT stream_id FROM streams WHERE expires < ?", (now,))]
+        if expired:
+            marks = ",".join("?" * len(expired))
+            self._db.execute(f"DELETE FROM stream_events WHERE stream_id IN ({marks})", expired)
+            self._db.execute(f"DELETE FROM streams WHERE stream_id IN ({marks})", expired)
+
+    def touch(self, stream_id: str) -> None:
+        """Record that a reader on this worker is following the stream"""
+        self._db.execute("UPDATE streams SET reader_seen = ? WHERE stream_id = ?", (time.time(), stream_id))
+
+    def reader_seen(self, stream_id: str) -> Optional[float]:
+        row = self._db.execute("SELECT reader_seen FROM streams WHERE stream_id = ?", (stream_id,)).fetchone()
+        return row[0] if row else None
+
+    def get(self, stream_id: str) -> Optional[Tuple[str, bool]]:
+        row = self._db.execute(
+            "SELECT conversation_id, done FROM streams WHERE stream_id = ?", (stream_id,)
+        ).fetchone()
+        return (row[0], bool(row[1])) if row else None
+
+    def read(self, stream_id: str, after: int) -> List[Tuple[int, str]]:
+        return self._db.execute(
+            "SELECT seq, data FROM stream_events WHERE stream_id = ? AND seq > ? ORDER BY seq",
+            (stream_id, after),
+        ).fetchall()
+
+    def first_seq(self, stream_id: str) -> Optional[int]:
+        return self._db.execute("SELECT min(seq) FROM stream_events WHERE stream_id = ?", (stream_id,)).fetchone()[0]
+
+    def close_db(self) -> None:
+        self._db.close()
+
+
+class StreamStore:
+    """
+    Bounded per-worker registry of replayable generations.
+
+    Generation runs in its own task writing to a StreamBuffer, and the
+    HTTP response only follows the buffer, so a dropped client no longer
+    stops (or wastes) the completion. Finished streams stay replayable
+    for STREAM_RESUME_TTL; at most STREAM_MAX_ACTIVE are kept, finished
+    ones evicted oldest first. Generating streams are never evicted: when
+    all of them are still running, new streams are refused. With STREAM_SHARED_PATH set, events are mirrored to a
+    SQLite file so a reconnect routed to another local worker can resume.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.max_events = config.STREAM_BUFFER_EVENTS
+        self.max_streams = config.STREAM_MAX_ACTIVE
+        self.grace = config.STREAM_DETACH_GRACE
+        self.ttl = config.STREAM_RESUME_TTL
+        self.shared_path = config.STREAM_SHARED_PATH
+        self.poll_interval = config.STREAM_SHARED_POLL
+        self.shared: Optional[SharedStreamLog] = None
+        self._streams: "OrderedDict[str, StreamBuffer]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def start(self) -> None:
+        if self.shared_path and self.shared is None:
+            try:
+                self.shared = SharedStreamLog(self.shared_path, self.max_events)
+            except sqlite3.Error as e:
+                logger.warning("Shared stream log at %s unavailable: %s", self.shared_path, e)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self.shared is not None:
+            self.shared.close_db()
+            self.shared = None
+
+    def create(
+        self,
+        stream_id: str,
+        conversation_id: str,
+        produce: Callable[[StreamBuffer], Awaitable[None]],
+    ) -> StreamBuffer:
+        """
+        Register a buffer and start `produce(buffer)` as its producer task;
+        raises AdmissionRejectedError when every slot is still generating.
+        """
+        self._evict()
+        if len(self._streams) >= self.max_streams:
+            STREAMS_SHED.inc()
+            raise AdmissionRejectedError(f"{len(self._streams)} streams are still generating")
+        buffer = StreamBuffer(stream_id, conversation_id, self.max_events, self.grace)
+        mirrored = self._mirror(buffer)
+        self._streams[stream_id] = buffer
+        STREAMS_ACTIVE.set(len(self._streams))
+
+        async def run():
+            try:
+                await produce(buffer)
+            finally:
+                buffer.close()
+                if mirrored and self.shared is not None:
+                    try:
+                        self.shared.close(stream_id, self.ttl)
+                    except sqlite3.Error as e:
+                        logger.warning("Closing shared stream %s failed: %s", stream_id, e)
+
+        buffer.producer = asyncio.create_task(run(), name=f"stream-{stream_id}")
+        self._tasks.add(buffer.producer)
+        buffer.producer.add_done_callback(self._tasks.discard)
+        return buffer
+
+    def _mirror(self, buffer: StreamBuffer) -> bool:
+        """Copy the buffer's events to the shared log; a failed write stops the copy, never the generation"""
+        shared = self.shared
+        if shared is None:
+            return False
+        try:
+            shared.open(buffer.stream_id, buffer.conversation_id)
+        except sqlite3.Error as e:
+            logger.warning("Shared stream log unavailable for %s: %s", buffer.stream_id, e)
+            return False
+
+        def on_append(seq: int, data: str) -> None:
+            try:
+                shared.append(buffer.stream_id, seq, data)
+            except sqlite3.Error as e:
+                logger.warning("Stopped mirroring stream %s: %s", buffer.stream_id, e)
+                buffer.on_append = None
+
+        def remote_reader() -> Optional[float]:
+            try:
+                return shared.reader_seen(buffer.stream_id)
+            except sqlite3.Error as e:
+                logger.warning("Reading reader heartbeat of stream %s failed: %s", buffer.stream_id, e)
+                return None
+
+        buffer.on_append = on_append
+        buffer.remote_reader = remote_reader
+        return True
+
+    def get(self, stream_id: str) -> Optional[StreamBuffer]:
+        self._evict()
+        return self._streams.get(stream_id)
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for stream_id in [
+            stream_id for stream_id, buffer in self._streams.items()
+            if buffer.closed_at is not None and now - buffer.closed_at > self.ttl
+        ]:
+            del self._streams[stream_id]
+        excess = len(self._streams) - self.max_streams + 1
+        if excess > 0:
+            # Make room from finished streams only; dropping a live one would expire its reconnects
+            for stream_id in [stream_id for stream_id, buffer in self._streams.items() if buffer.done][:excess]:
+                del self._streams[stream_id]
+        STREAMS_ACTIVE.set(len(self._streams))
+
+    def replay(self, stream_id: str, conversation_id: str, after: int) -> Optional[AsyncIterator[str]]:
+        """
+        Formatted events after `after` for a reconnecting client, following
+        the stream live if it is still generating; None if it is unknown.
+        """
+        buffer = self.get(stream_id)
+        if buffer is not None and buffer.conversation_id == conversation_id:
+            STREAM_RESUMES.inc(result="local")
+            return self.follow(buffer, after)
+        if self.shared is not None:
+            found = self.shared.get(stream_id)
+            if found and found[0] == conversation_id:
+                STREAM_RESUMES.inc(result="shared")
+                return self._follow_shared(stream_id, after)
+        STREAM_RESUMES.inc(result="expired")
+        return None
+
+    async def follow(self, buffer: StreamBuffer, after: int = 0) -> AsyncIterator[str]:
+        async for seq, data in buffer.follow(after):
+            yield format_event(buffer.stream_id, seq, data)
+
+    async def _follow_shared(self, stream_id: str, after: int) -> AsyncIterator[str]:
+        # The producer lives in another worker: poll its SQLite mirror until it
+        # closes, leaving a heartbeat so the producer does not count us as gone
+        first = self.shared.first_seq(stream_id)
+        if first is not None and first > after + 1:
+            raise LookupError(f"Stream {stream_id} no longer holds event {after + 1}")
+        idle_since = time.monotonic()
+        while True:
+            try:
+                self.shared.touch(stream_id)
+            except sqlite3.Error as e:
+                logger.warning("Reader heartbeat for stream %s failed: %s", stream_id, e)
+            found = self.shared.get(stream_id)
+            rows = self.shared.read(stream_id, after)
+            for seq, data in rows:
+                after = seq
+                yield format_event(stream_id, seq, data)
+            if found is None or (found[1] and not rows):
+                return
+            if rows:
+                idle_since = time.monotonic()
+            elif time.monotonic() - idle_since > self.grace:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+
+stream_store = StreamStore()
@@ -0,0 +1,253 @@
+import os
+import time
+import asyncio
+import logging
+import functools
+import httpx
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+from app.core.config import Config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+STAGE_SECONDS = registry.histogram(
+    "chat_stage_seconds",
+    "Duration of each chat pipeline stage",
+    ["stage"],
+)
+TURN_SECONDS = registry.histogram(
+    "chat_turn_seconds",
+    "Full reply latency of a chat turn",
+)
+TTFT_SECONDS = registry.histogram(
+    "chat_ttft_seconds",
+    "Time from receiving a prompt to streaming the first token",
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 60.0),
+)
+TOKENS_PER_SECOND = registry.histogram(
+    "chat_tokens_per_second",
+    "Streamed token rate of each LLM call after its first token",
+    buckets=(1, 5, 10, 20, 30, 50, 75, 100, 150, 250),
+)
+TOOL_SECONDS = registry.histogram(
+    "chat_tool_seconds",
+    "Tool execution latency",
+    ["tool"],
+)
+DB_QUERY_SECONDS = registry.histogram(
+    "db_query_seconds",
+    "Latency of repository queries",
+    ["operation"],
+)
+DB_QUERIES_PER_TURN = registry.histogram(
+    "chat_db_queries_per_turn",
+    "Database queries issued while serving one chat turn",
+    buckets=(1, 2, 4, 6, 8, 10, 15, 20, 30, 50),
+)
+RECURSION_DEPTH = registry.histogram(
+    "chat_recursion_depth",
+    "Deepest tool-call recursion reached in a chat turn",
+    buckets=(0, 1, 2, 3, 4, 5, 8),
+)
+
+
+class Turn:
+    """Per-turn counters shared by every stage of one chat request"""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.db_queries = 0
+        self.max_depth = 0
+
+    def mark_first_token(self) -> None:
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            TTFT_SECONDS.observe(self.first_token_at - self.started)
+
+    def record_depth(self, depth: int) -> None:
+        self.max_depth = max(self.max_depth, depth)
+
+    def finish(self) -> None:
+        TURN_SECONDS.observe(time.perf_counter() - self.started)
+        DB_QUERIES_PER_TURN.observe(self.db_queries)
+        RECURSION_DEPTH.observe(self.max_depth)
+
+
+_current_turn: ContextVar[Optional[Turn]] = ContextVar("current_turn", default=None)
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+def start_turn() -> Turn:
+    turn = Turn(os.urandom(16).hex())
+    _current_turn.set(turn)
+    return turn
+
+
+def activate_turn(turn: Turn) -> None:
+    """Re-bind a turn inside a generator that may run in a different context"""
+    _current_turn.set(turn)
+
+
+def current_turn() -> Optional[Turn]:
+    return _current_turn.get()
+
+
+class Span:
+    """Times a pipeline stage and, when an exporter is configured, records it as a trace span"""
+
+    __slots__ = (
+        "name", "attributes", "trace_id", "span_id", "parent_id",
+        "start_ns", "end_ns", "_token", "_started",
+    )
+
+    def __init__(self, name: str, **attributes: Any):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = ""
+        self.span_id = ""
+        self.parent_id = ""
+        self.start_ns = 0
+        self.end_ns = 0
+        self._token = None
+        self._started = 0.0
+
+    def __enter__(self) -> "Span":
+        self._started = time.perf_counter()
+        if exporter.enabled:
+            parent = _current_span.get()
+            turn = _current_turn.get()
+            self.parent_id = parent.span_id if parent else ""
+            self.trace_id = turn.trace_id if turn else (parent.trace_id if parent else os.urandom(16).hex())
+            self.span_id = os.urandom(8).hex()
+            self.start_ns = time.time_ns()
+            self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        STAGE_SECONDS.observe(time.perf_counter() - self._started, stage=self.name)
+        if self._token is not None:
+            _current_span.reset(self._token)
+            self.end_ns = time.time_ns()
+            if exc is not None:
+                self.attributes["error"] = str(exc)
+            exporter.record(self)
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self.__exit__(exc_type, exc, tb)
+
+
+def span(name: str, **attributes: Any) -> Span:
+    return Span(name, **attributes)
+
+
+def traced_query(operation: str):
+    """Count and time a repository query against the current turn"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            turn = _current_turn.get()
+            if turn is not None:
+                turn.db_queries += 1
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                DB_QUERY_SECONDS.observe(time.perf_counter() - started, operation=operation)
+
+        return wrapper
+
+    return decorator
+
+
+class SpanExporter:
+    """
+    Batches finished spans and posts them as OTLP/HTTP JSON.
+
+    Disabled unless OTEL_EXPORTER_OTLP_ENDPOINT is set, in which case spans
+    are buffered in memory and flushed from a background task so the
+    request path never waits on the collector.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.endpoint = config.OTEL_EXPORTER_OTLP_ENDPOINT
+        self.service_name = config.OTEL_SERVICE_NAME
+        self.interval = config.OTEL_EXPORT_INTERVAL
+        self.max_buffer = config.OTEL_MAX_BUFFER
+        self.enabled = bool(self.endpoint)
+        self._buffer: List[Span] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, finished: Span) -> None:
+        if len(self._buffer) < self.max_buffer:
+            self._buffer.append(finished)
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self.flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {"key": "service.name", "value": {"stringValue": self.service_name}},
+                            {"key": "process.pid", "value": {"intValue": os.getpid()}},
+                        ]
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "cognova"},
+                            "spans": [
+                                {
+                                    "traceId": item.trace_id,
+                                    "spanId": item.span_id,
+                                    "parentSpanId": item.parent_id,
+                                    "name": item.name,
+                                    "kind": 1,
+                                    "startTimeUnixNano": str(item.start_ns),
+                                    "endTimeUnixNano": str(item.end_ns),
+                                    "attributes": [
+                                        {"key": key, "value": {"stringValue": str(value)}}
+                                        for key, value in item.attributes.items()
+                                    ],
+                                }
+                                for item in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        spans, self._buffer = self._buffer, []
+        try:
+            async with httpx.AsyncClient(timeout=5) as client:
+                await client.post(f"{self.endpoint.rstrip('/')}/v1/traces", json=self._payload(spans))
+        except Exception as e:
+            logger.warning("Failed to export %s spans: %s", len(spans), e)
+
+
+exporter = SpanExporter()
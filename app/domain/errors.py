@@ -14,4 +14,14 @@ class ToolExecutionError(Exception):
     pass
 class ClientDisconnectError(Exception):
     """Raised when client disconnects during streaming"""
-    pass
\ No newline at end of file
+    pass
+class AdmissionRejectedError(Exception):
+    """Raised when a completion is shed because its provider or bot is saturated"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class UnsupportedProviderError(Exception):
+    """Raised when an AiProvider row names a provider we have no client for"""
+    pass
@@ -0,0 +1,65 @@
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+WIRE_CACHE_SIZE = 8192
+
+
+class HistoryEntry(NamedTuple):
+    """
+    Immutable chat history record used on the completion path instead of
+    the Prisma model: a tuple, so it is built in C, has no per-instance
+    dict and cannot be modified by anything it is shared with.
+    """
+
+    id: str
+    role: str
+    content: str
+    tokens: int
+    createdAt: datetime
+    toolCalls: Optional[Any] = None
+    toolCallId: Optional[str] = None
+
+    @classmethod
+    def from_chat(cls, chat: Any) -> "HistoryEntry":
+        return cls(
+            chat.id,
+            chat.role,
+            chat.content,
+            chat.tokens or 0,
+            chat.createdAt,
+            chat.toolCalls or None,
+            chat.toolCallId,
+        )
+
+
+_wire_cache: Dict[str, Dict[str, Any]] = {}
+
+
+def build_wire_message(message: Any) -> Dict[str, Any]:
+    wire = {"role": message.role, "content": message.content}
+    if message.toolCalls:
+        wire["tool_calls"] = message.toolCalls
+    if message.toolCallId:
+        wire["tool_call_id"] = message.toolCallId
+    return wire
+
+
+def wire_message(message: Any) -> Dict[str, Any]:
+    """
+    Provider wire format of a history message.
+
+    Stored messages never change, so the dict is built once per message id
+    and shared by every turn, tool recursion and worker task that sends it;
+    callers must treat it as read-only. Unsaved messages (no id) are built
+    fresh.
+    """
+    message_id = getattr(message, "id", None)
+    if message_id is None:
+        return build_wire_message(message)
+    wire = _wire_cache.get(message_id)
+    if wire is None:
+        if len(_wire_cache) >= WIRE_CACHE_SIZE:
+            # FIFO eviction: hot conversations re-add their messages on the next turn
+            del _wire_cache[next(iter(_wire_cache))]
+        wire = _wire_cache[message_id] = build_wire_message(message)
+    return wire
@@ -80,13 +80,17 @@ class Message:
     toolCallId: Optional[str] = None
     tokens: Optional[int] = None
     feedback: Optional[str] = ChatFeedback.NONE.value
+    extraMetadata: Optional[Dict[str, Any]] = None
 
     def to_dict(self) -> Dict[str, Any]:
-        return {
+        data = {
             "role": self.role,
             "content": str(self.content),
-            "toolCalls": json.dumps(self.toolCalls if self.toolCalls else []),
+            "toolCalls": json.dumps(self.toolCalls) if self.toolCalls else "[]",
             "toolCallId": self.toolCallId,
             "tokens": self.tokens or len(str(self.content).split()),
             "feedback": self.feedback,
         }
+        if self.extraMetadata is not None:
+            data["extraMetadata"] = Json(self.extraMetadata)
+        return data
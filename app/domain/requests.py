@@ -1,6 +1,16 @@
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from pydantic import BaseModel
 
 class ChatRequest(BaseModel):
     prompt: str
-    chat_mode: Literal["whatsapp", "web"] = "web"
\ No newline at end of file
+    chat_mode: Literal["whatsapp", "web"] = "web"
+
+class BatchChatItem(BaseModel):
+    bot_id: str
+    prompt: str
+    conversation_id: Optional[str] = None
+    chat_mode: Literal["whatsapp", "web"] = "whatsapp"
+
+
+class BatchChatRequest(BaseModel):
+    items: List[BatchChatItem]
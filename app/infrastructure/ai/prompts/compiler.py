@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+from app.core.metrics import registry
+
+PROMPT_FRAGMENT_TOKENS = registry.histogram(
+    "prompt_fragment_tokens",
+    "Tokens contributed by each system prompt fragment per turn",
+    ["fragment", "mode"],
+    buckets=(10, 25, 50, 100, 200, 400, 800, 1600, 3200),
+)
+
+
+@dataclass(frozen=True)
+class PromptFragment:
+    """
+    One section of a system prompt.
+
+    `modes` limits the fragment to some chat modes (None means all);
+    `cached` fragments are rendered once per (mode, version) and reused,
+    while uncached ones render on every compile. Per-request data does not
+    belong in a fragment at all: it would break provider prefix caching.
+    """
+
+    name: str
+    render: Callable[[Any], str]
+    modes: Optional[Tuple[str, ...]] = None
+    cached: bool = True
+
+    def applies_to(self, mode: Optional[str]) -> bool:
+        return self.modes is None or mode in self.modes
+
+
+@dataclass
+class CompiledPrompt:
+    text: str
+    tokens: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.tokens.values())
+
+
+class PromptCompiler:
+    """Compose a prompt from fragments, caching rendered text and token counts"""
+
+    def __init__(self, fragments: List[PromptFragment], max_entries: int = 2048):
+        self.fragments = fragments
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[Hashable, Tuple[str, int]]" = OrderedDict()
+
+    def compile(self, source: Any, mode: Optional[str], version: Hashable) -> CompiledPrompt:
+        """
+        Render the fragments that apply to `mode`.
+
+        `version` must change whenever the data behind the cached fragments
+        changes (e.g. ids and updatedAt of the rows they are built from).
+        """
+        from app.api.dependencies import get_tokenizer_service
+
+        tokenizer = get_tokenizer_service()
+        parts: List[str] = []
+        compiled = CompiledPrompt(text="")
+        for fragment in self.fragments:
+            if not fragment.applies_to(mode):
+                continue
+            key = (fragment.name, mode, version)
+            entry = self._cache.get(key) if fragment.cached else None
+            if entry is None:
+                text = fragment.render(source)
+                entry = (text, tokenizer.estimate(text))
+                if fragment.cached:
+                    self._cache[key] = entry
+                    if len(self._cache) > self.max_entries:
+                        self._cache.popitem(last=False)
+            else:
+                self._cache.move_to_end(key)
+            text, tokens = entry
+            if not text:
+                continue
+            parts.append(text)
+            compiled.tokens[fragment.name] = tokens
+            PROMPT_FRAGMENT_TOKENS.observe(tokens, fragment=fragment.name, mode=mode or "none")
+        compiled.text = "\n".join(parts)
+        return compiled
@@ -1,6 +1,7 @@
 import json
 from datetime import datetime, timezone
 from typing import List, Dict, Optional, Literal
+from app.infrastructure.ai.prompts.compiler import CompiledPrompt, PromptCompiler, PromptFragment
 from prisma.models import (
     Bot,
     Chat,
@@ -124,11 +125,17 @@ class SellerPromptGenerator:
         else:
             return """"""
 
-    def generate_prompt(self) -> str:
-        locations_data = self._format_locations_data()
-        operating_hours_str = self._format_operating_hours()
-        formatting_guide = self._get_formatting_guide()
-        contact_data = self._format_contact_data()
+    def _version(self) -> tuple:
+        """Identifies the rows cached fragments are rendered from"""
+        return (
+            self.business.id,
+            self.business.updatedAt,
+            getattr(self.config, "updatedAt", None),
+            tuple((loc.id, loc.updatedAt) for loc in self.locations),
+            tuple((hour.id, hour.updatedAt) for hour in self.operating_hours),
+        )
+
+    def _core_rules(self) -> str:
         return f"""
 # CORE RULES
 - You are a sales assistant for {self.business.name}, a {self.business.type} chatting {"Via whatsapp business mode" if self.mode == "whatsapp" else "In Website mode"}
@@ -136,10 +143,11 @@ class SellerPromptGenerator:
   1. Call search_products with the name/brand/category/key-term
   2. Show ALL results found
   3. NEVER ask for more specifics first
-  4. To ensure a seamless real-time chat flow during conversations, if a tool responds with "none" or "results not found," you must always invoke the tool again to retrieve results or provide the most relevant information available.
+  4. If a search finds nothing, do not repeat it. When the result lists suggested_queries, search once with the closest one; otherwise tell the customer the item is not available and offer related or latest products.
 - NEVER make multiple tool calls at once
 - For multiple search terms (e.g. "Adidas Yeezy"), combine them into a single query: search_products with query="adidas yeezy"
 - When users ask to see all products, use search_products with query="*LATEST*"
+- search_products returns a table: a header line, then one product per line separated by |; `image` is its first image URL and `images` how many images it has
 - NEVER tell users you can't show products - always attempt to search and display what's available
 - If a search returns many results, show a selection of popular or recent items
 - ALWAYS display prices and availability for each product shown
@@ -147,39 +155,84 @@ class SellerPromptGenerator:
 
 - Keep responses focused on sales and always mention prices when discussing products
 - All prices are in {self.config.currency if self.config and hasattr(self.config, "currency") else "USD"}
-- Format all responses according to the mode-specific rules below
-- When user is ready to purchase and in web mode, provide contact information in markdown format and add Telephone in `tel:<tel>` link and link must have label `Call Now`
-- When user is ready to purchase and in whatsapp mode, provide contact information wrapped in <contacts>contact_data</contacts> tags and after adding tags add section contained `tel:<phone>` (choose main store) to call directly for the format you will be using this format:
-{json.dumps(contact_data, indent=2)}
+- Format all responses according to the mode-specific rules below"""
+
+    def _web_contact_rules(self) -> str:
+        return "- When user is ready to purchase, provide contact information in markdown format and add Telephone in `tel:<tel>` link and link must have label `Call Now`"
+
+    def _whatsapp_contact_rules(self) -> str:
+        # Compact JSON: the indented form cost roughly twice the tokens for the same data
+        return f"""- When user is ready to purchase, provide contact information wrapped in <contacts>contact_data</contacts> tags and after adding tags add section contained `tel:<phone>` (choose main store) to call directly for the format you will be using this format:
+{json.dumps(self._format_contact_data(), ensure_ascii=False)}"""
 
-{formatting_guide}
+    def _common_errors(self) -> str:
+        return f"""
 # COMMON ERRORS TO AVOID
 - Don't refer customers to the website
-- Don't exclude available product images {'(in web mode)' if self.mode != 'whatsapp' else ''}
+- Don't exclude available product images {'(in web mode)' if self.mode != 'whatsapp' else ''}"""
 
+    def _service_configuration(self) -> str:
+        return f"""
 # SERVICE CONFIGURATION
 - Delivery: {'Available' if self.config.hasDelivery else 'Not available'}
 {f'(Minimum order: {self.config.minDeliveryOrderAmount} {self.config.currency}, Fee: {self.config.deliveryFee} {self.config.currency})' if self.config.hasDelivery else ''}
 - Returns: {'Accepted' if self.config.acceptsReturns else 'Not available'}
 {f'(Within {self.config.returnPeriod})' if self.config.acceptsReturns else ''}
 - Warranty: {'Available' if self.config.hasWarranty else 'Not available'}
-{f'({self.config.warrantyPeriod})' if self.config.hasWarranty else ''}
+{f'({self.config.warrantyPeriod})' if self.config.hasWarranty else ''}"""
 
+    def _business_data(self) -> str:
+        return f"""
 # <BUSINESS_DATA>
 DESCRIPTION:
 {self.business.description}
 
 LOCATIONS:
-{chr(10).join(locations_data)}
+{chr(10).join(self._format_locations_data())}
 
 BUSINESS HOURS:
-{operating_hours_str}
-# </BUSINESS_DATA>
+{self._format_operating_hours()}
+# </BUSINESS_DATA>"""
 
+    def _reminders(self) -> str:
+        return """
 # IMPORTANT REMINDERS
 - NEVER reply about product availability without calling search_products first
 - Provide direct contact information instead of website references
+"""
+
+    def volatile_context(self) -> str:
+        """
+        Per-request data, sent as a trailing message rather than in the prompt.
+
+        Keeping it out of the system prompt leaves the business prefix
+        byte-identical across requests, so endpoints can reuse its KV cache.
+        """
+        lines = [f"Current time: {self._get_current_time()}"]
+        if self.extra_context:
+            lines.append(self.extra_context)
+        return "\n".join(lines)
 
-Current time: {self._get_current_time()}
-{self.extra_context if self.extra_context else ""}
-"""
\ No newline at end of file
+    def compile(self) -> CompiledPrompt:
+        """Render the prompt with per-fragment token counts"""
+        return seller_prompt_compiler.compile(self, self.mode, self._version())
+
+    def generate_prompt(self) -> str:
+        return self.compile().text
+
+
+WEB_MODES = ("web", None)
+WHATSAPP_MODES = ("whatsapp",)
+
+seller_prompt_compiler = PromptCompiler(
+    [
+        PromptFragment("core_rules", SellerPromptGenerator._core_rules),
+        PromptFragment("contacts", SellerPromptGenerator._web_contact_rules, modes=WEB_MODES),
+        PromptFragment("contacts", SellerPromptGenerator._whatsapp_contact_rules, modes=WHATSAPP_MODES),
+        PromptFragment("formatting_guide", SellerPromptGenerator._get_formatting_guide, modes=WHATSAPP_MODES),
+        PromptFragment("common_errors", SellerPromptGenerator._common_errors),
+        PromptFragment("service_configuration", SellerPromptGenerator._service_configuration),
+        PromptFragment("business_data", SellerPromptGenerator._business_data),
+        PromptFragment("reminders", SellerPromptGenerator._reminders),
+    ]
+)
@@ -1,7 +1,27 @@
+import json
 from abc import ABC, abstractmethod
 from app.domain.interfaces import Completion
 from typing import AsyncGenerator, List, Dict, Any
 
+# Stream event carrying the token usage an endpoint reported for a completion
+USAGE_EVENT_PREFIX = 'data: {"usage"'
+
+
+def _field(obj: Any, name: str) -> Any:
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def usage_event(usage: Any) -> str:
+    """Format an OpenAI-style usage object, including prefix-cache hits, as a stream event"""
+    details = _field(usage, "prompt_tokens_details")
+    payload = {
+        "prompt_tokens": _field(usage, "prompt_tokens") or 0,
+        "completion_tokens": _field(usage, "completion_tokens") or 0,
+        "cached_tokens": (_field(details, "cached_tokens") if details else 0) or 0,
+    }
+    return f"data: {json.dumps({'usage': payload})}\n\n"
+
+
 class ChatProvider(ABC):
     @abstractmethod
     async def request(
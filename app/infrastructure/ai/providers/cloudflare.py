@@ -1,23 +1,25 @@
 import json
-from openai import OpenAI
 from app.domain.interfaces import (
     StreamResponse,
     StreamResponseType,
     Completion,
 )
-from . import ChatProvider
-from app.api.dependencies import logger
+from . import ChatProvider, usage_event
+from app.api.dependencies import get_config, logger
 from app.domain.interfaces import Message
-from typing import List, Dict, Any, AsyncGenerator
+from typing import TYPE_CHECKING, List, Dict, Any, AsyncGenerator
 from app.domain.errors import StreamProcessingError
 
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
 
 class CloudflareProvider(ChatProvider):
     """
     CloudflareProvider handles chat completions using OpenAI's API through Cloudflare
     """
 
-    def __init__(self, client: OpenAI, model: str):
+    def __init__(self, client: "AsyncOpenAI", model: str):
         self.model = model
         self.client = client
 
@@ -34,11 +36,13 @@ class CloudflareProvider(ChatProvider):
                 "stream": True,
             }
 
+            # No cache-key parameter here; the endpoint reuses byte-identical prefixes on its own
+            kwargs.pop("cache_key", None)
             if kwargs:
                 completion_params.update(kwargs)
 
-            completion = self.client.with_options(
-                max_retries=1, timeout=60 * 2
+            completion = await self.client.with_options(
+                max_retries=1, timeout=get_config().LLM_TIMEOUT
             ).chat.completions.create(**completion_params)
 
             async for response in self.stream(completion):
@@ -54,13 +58,16 @@ class CloudflareProvider(ChatProvider):
         Process the completion stream and handle different response types
         """
         try:
-            for chunk in completion:
+            async for chunk in completion:
                 if chunk.response:
                     content = chunk.response
                     response = StreamResponse(
                         type=StreamResponseType.TOKEN, content=content
                     )
                     yield f"data: {json.dumps({'token': response.content})}\n\n"
+                usage = getattr(chunk, "usage", None)
+                if usage:
+                    yield usage_event(usage)
         except Exception as e:
             error_msg = f"Stream processing failed: {str(e)}"
             yield f"data: {json.dumps({'error': error_msg})}\n\n"
@@ -106,6 +113,32 @@ Only generate questions that can be answered using the provided business context
         ]
         return suggestions
 
+    async def summarize_conversation(
+        self, previous_summary: str, conversation_history: List[Message]
+    ) -> str:
+        """Fold older turns into a running summary of the conversation"""
+        formatted_history = "\n".join(
+            f"{msg.role}: {msg.content[:500]}" for msg in conversation_history if msg.content
+        )
+        prompt = f"""You maintain a running summary of a customer's conversation with a business assistant. Update the summary with the new messages below.
+
+Keep: the customer's name and contact details if given, products they asked about or chose (with names, prices and availability found), quantities, delivery or location details, open questions and anything promised to the customer.
+Drop: greetings, small talk and repeated information.
+Write in the language of the conversation, as short factual notes, at most 200 words. Output only the summary.
+
+Previous summary:
+{previous_summary or "(none)"}
+
+New messages:
+{formatted_history}"""
+
+        summary = ""
+        async for chunk in self.request(messages=[{"role": "system", "content": prompt}]):
+            chunk_data = self._parse_chunk(chunk=chunk)
+            if "token" in chunk_data:
+                summary += chunk_data["token"]
+        return summary.replace("<|im_end|>", "").strip()
+
     def _parse_chunk(self, chunk: str) -> Dict[str, Any]:
         """Parse streaming chunk data"""
         try:
@@ -1,10 +1,13 @@
 import json
-from openai import OpenAI
-from . import ChatProvider
-from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
+from . import ChatProvider, usage_event
 from app.domain.interfaces import StreamResponse, StreamResponseType, Message
-from typing import List, Dict, Any, AsyncGenerator
+from typing import TYPE_CHECKING, List, Dict, Any, AsyncGenerator
 from app.domain.errors import StreamProcessingError
+from app.api.dependencies import get_config
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+    from openai.types.chat.chat_completion_chunk import ChatCompletionChunk
 
 
 class OpenAIProvider(ChatProvider):
@@ -12,7 +15,7 @@ class OpenAIProvider(ChatProvider):
     OpenAIProvider handles chat completions using OpenAI's direct API
     """
 
-    def __init__(self, client: OpenAI, model: str):
+    def __init__(self, client: "AsyncOpenAI", model: str):
         self.model = model
         self.client = client
 
@@ -27,13 +30,20 @@ class OpenAIProvider(ChatProvider):
                 "model": self.model,
                 "messages": messages,
                 "stream": True,
+                # The final chunk then reports usage, including prompt_tokens_details.cached_tokens
+                "stream_options": {"include_usage": True},
             }
 
+            cache_key = kwargs.pop("cache_key", None)
+            if cache_key:
+                # Routes requests sharing a prompt prefix to the same cache; extra_body works on older SDKs too
+                completion_params["extra_body"] = {"prompt_cache_key": cache_key}
+
             if kwargs:
                 completion_params.update(kwargs)
 
-            completion = self.client.with_options(
-                max_retries=1, timeout=60 * 2
+            completion = await self.client.with_options(
+                max_retries=1, timeout=get_config().LLM_TIMEOUT
             ).chat.completions.create(**completion_params)
 
             async for response in self.stream(completion):
@@ -44,7 +54,7 @@ class OpenAIProvider(ChatProvider):
             raise StreamProcessingError(error_msg)
 
     async def stream(
-        self, completion: List[ChatCompletionChunk]
+        self, completion: List["ChatCompletionChunk"]
     ) -> AsyncGenerator[str, None]:
         """
         Process the completion stream and handle different response types
@@ -54,7 +64,12 @@ class OpenAIProvider(ChatProvider):
         function_arguments = ""
         stream_ended = False
         try:
-            for chunk in completion:
+            async for chunk in completion:
+                if not chunk.choices:
+                    # The usage chunk requested through stream_options has no choices
+                    if chunk.usage:
+                        yield usage_event(chunk.usage)
+                    continue
                 if hasattr(chunk.choices[0].delta, "content"):
                     content = chunk.choices[0].delta.content
                     if content:
@@ -0,0 +1,367 @@
+import json
+import time
+import asyncio
+from enum import Enum
+from collections import deque
+from dataclasses import dataclass
+from prisma.models import Model
+from typing import Any, AsyncGenerator, Deque, Dict, List, Optional
+from app.core.config import Config
+from app.core.metrics import registry
+from app.api.dependencies import get_admission_controller, get_ai_client, logger
+from app.domain.errors import AdmissionRejectedError, StreamProcessingError, UnsupportedProviderError
+from . import USAGE_EVENT_PREFIX, ChatProvider
+from .cloudflare import CloudflareProvider
+from .openai import OpenAIProvider
+
+PROVIDER_CLASSES = {
+    "cloudflare": CloudflareProvider,
+    "openai": OpenAIProvider,
+}
+
+PROVIDER_TTFT = registry.histogram(
+    "provider_ttft_seconds",
+    "Time from request to first streamed chunk per provider endpoint",
+    ["provider"],
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 10.0, 20.0, 60.0),
+)
+PROVIDER_REQUESTS = registry.counter(
+    "provider_requests_total",
+    "Completion attempts per provider endpoint and outcome",
+    ["provider", "outcome"],
+)
+PROVIDER_FAILOVERS = registry.counter(
+    "provider_failovers_total",
+    "Completions that moved on to the next provider after a failure",
+)
+PROVIDER_HEDGES = registry.counter(
+    "provider_hedges_total",
+    "Hedged second requests fired after the first token was late",
+)
+BREAKER_STATE = registry.gauge(
+    "provider_circuit_open",
+    "1 while the circuit breaker for an endpoint is open",
+    ["provider"],
+)
+PROMPT_TOKENS = registry.counter(
+    "provider_prompt_tokens_total",
+    "Prompt tokens reported by the endpoint, and how many were served from its prefix cache",
+    ["provider", "kind"],
+)
+PROMPT_CACHE_HIT_RATIO = registry.histogram(
+    "provider_prompt_cache_hit_ratio",
+    "Fraction of each prompt served from the endpoint's prefix cache",
+    ["provider"],
+    buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 1.0),
+)
+
+
+def record_usage(provider: str, chunk: str) -> None:
+    """Export prefix-cache hits from a provider usage event"""
+    try:
+        usage = json.loads(chunk[6:])["usage"]
+    except (ValueError, KeyError):
+        return
+    prompt_tokens = usage.get("prompt_tokens") or 0
+    if not prompt_tokens:
+        return
+    cached = usage.get("cached_tokens") or 0
+    PROMPT_TOKENS.inc(prompt_tokens, provider=provider, kind="total")
+    PROMPT_TOKENS.inc(cached, provider=provider, kind="cached")
+    PROMPT_CACHE_HIT_RATIO.observe(cached / prompt_tokens, provider=provider)
+
+
+def is_error_event(chunk: str) -> bool:
+    """True for an SSE event whose payload carries an `error` key"""
+    if not chunk.startswith("data: "):
+        return False
+    try:
+        payload = json.loads(chunk[6:])
+    except ValueError:
+        return False
+    return isinstance(payload, dict) and "error" in payload
+
+
+@dataclass(frozen=True)
+class ProviderTarget:
+    provider: str
+    endpoint_url: str
+    api_key: str
+    model: str
+    # AiProvider.name: the metric label and admission key; the URL can carry account ids
+    name: str
+
+    @classmethod
+    def from_model(cls, model: Model) -> Optional["ProviderTarget"]:
+        if not model or not model.aiProvider:
+            return None
+        return cls(
+            provider=model.aiProvider.provider,
+            endpoint_url=model.aiProvider.endpointUrl,
+            api_key=model.aiProvider.apiKey,
+            model=model.name,
+            name=model.aiProvider.name,
+        )
+
+
+def create_provider(target: ProviderTarget) -> ChatProvider:
+    """Build the chat provider for a routing target"""
+    provider_class = PROVIDER_CLASSES.get(target.provider)
+    if not provider_class:
+        raise UnsupportedProviderError(f"Unsupported AI provider: {target.provider}")
+    return provider_class(get_ai_client(target.endpoint_url, target.api_key), target.model)
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class EndpointStats:
+    """Rolling TTFT samples and outcomes for one endpoint, plus its circuit breaker"""
+
+    def __init__(self, name: str, config: Config):
+        self.name = name
+        self.config = config
+        self.ttfts: Deque[float] = deque(maxlen=config.BREAKER_WINDOW)
+        self.outcomes: Deque[bool] = deque(maxlen=config.BREAKER_WINDOW)
+        self.state = BreakerState.CLOSED
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def p95_ttft(self) -> Optional[float]:
+        if len(self.ttfts) < self.config.HEDGE_MIN_SAMPLES:
+            return None
+        samples = sorted(self.ttfts)
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+
+    def available(self) -> bool:
+        if self.state == BreakerState.OPEN:
+            if time.monotonic() - self.opened_at < self.config.BREAKER_COOLDOWN:
+                return False
+            self.state = BreakerState.HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == BreakerState.HALF_OPEN:
+            return not self._probe_in_flight
+        return True
+
+    def begin(self) -> None:
+        """Claim the single half-open probe slot when a request is sent"""
+        if self.state == BreakerState.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def abandon(self) -> None:
+        """Release the probe slot of a request cancelled before it finished"""
+        if self.state == BreakerState.HALF_OPEN:
+            self._probe_in_flight = False
+
+    def record_ttft(self, ttft: float) -> None:
+        self.ttfts.append(ttft)
+        PROVIDER_TTFT.observe(ttft, provider=self.name)
+
+    def record(self, success: bool, ttft: Optional[float] = None) -> None:
+        slow = ttft is not None and ttft > self.config.BREAKER_SLOW_TTFT
+        ok = success and not slow
+        self.outcomes.append(ok)
+        PROVIDER_REQUESTS.inc(provider=self.name, outcome="success" if success else "error")
+
+        if self.state == BreakerState.HALF_OPEN:
+            self._probe_in_flight = False
+            if ok:
+                self._close()
+            else:
+                self._open()
+            return
+
+        if self.state == BreakerState.CLOSED and len(self.outcomes) >= self.config.BREAKER_MIN_REQUESTS:
+            failure_rate = self.outcomes.count(False) / len(self.outcomes)
+            if failure_rate >= self.config.BREAKER_FAILURE_RATE:
+                self._open()
+
+    def _open(self) -> None:
+        logger().warning("Circuit opened for provider %s", self.name)
+        self.state = BreakerState.OPEN
+        self.opened_at = time.monotonic()
+        BREAKER_STATE.set(1, provider=self.name)
+
+    def _close(self) -> None:
+        logger().info("Circuit closed for provider %s", self.name)
+        self.state = BreakerState.CLOSED
+        self.outcomes.clear()
+        BREAKER_STATE.set(0, provider=self.name)
+
+
+class _Attempt:
+    """One streaming request whose chunks are pushed onto the router's shared queue"""
+
+    def __init__(self, target: ProviderTarget, stats: EndpointStats, queue: asyncio.Queue, hedge: bool = False):
+        self.target = target
+        self.stats = stats
+        self.queue = queue
+        self.hedge = hedge
+        self.ttft: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> "_Attempt":
+        self.stats.begin()
+        self.task = asyncio.create_task(self._run(messages, params))
+        return self
+
+    async def _run(self, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> None:
+        try:
+            # A hedge only goes out if the endpoint has a slot free right now
+            async with get_admission_controller().admit_provider(self.target.name, wait=not self.hedge):
+                started = time.perf_counter()
+                provider = create_provider(self.target)
+                async for chunk in provider.request(messages, **params):
+                    if self.ttft is None:
+                        if is_error_event(chunk):
+                            # Cloudflare yields its error payload before raising; the raise is the signal
+                            continue
+                        self.ttft = time.perf_counter() - started
+                        self.stats.record_ttft(self.ttft)
+                    await self.queue.put((self, "chunk", chunk))
+        except asyncio.CancelledError:
+            self.stats.abandon()
+            raise
+        except AdmissionRejectedError as e:
+            # The endpoint is busy, not failing; keep it out of the breaker
+            self.stats.abandon()
+            await self.queue.put((self, "error", e))
+            return
+        except Exception as e:
+            self.stats.record(False, self.ttft)
+            await self.queue.put((self, "error", e))
+            return
+        self.stats.record(True, self.ttft)
+        await self.queue.put((self, "done", None))
+
+    def cancel(self) -> None:
+        if self.task and not self.task.done():
+            self.task.cancel()
+
+
+class ProviderRouter:
+    """
+    Streams a completion from an ordered list of provider targets.
+
+    Every attempt holds an admission slot of the endpoint it calls.
+    Targets whose circuit is open are skipped. A target that fails before
+    its first token is abandoned for the next one. With hedging enabled, a
+    second request is fired when the first token is later than the
+    primary endpoint's p95 TTFT, and whichever answers first wins.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self._stats: Dict[str, EndpointStats] = {}
+
+    def stats_for(self, target: ProviderTarget) -> EndpointStats:
+        stats = self._stats.get(target.name)
+        if stats is None:
+            stats = self._stats[target.name] = EndpointStats(target.name, self.config)
+        return stats
+
+    def targets_for(self, model: Model) -> List[ProviderTarget]:
+        """Primary target of a model followed by its fallbacks in priority order"""
+        if not model:
+            return []
+        targets = []
+        primary = ProviderTarget.from_model(model)
+        if primary:
+            targets.append(primary)
+        for fallback in sorted(model.fallbacks or [], key=lambda f: f.priority):
+            target = ProviderTarget.from_model(fallback.fallbackModel)
+            if target and target not in targets:
+                targets.append(target)
+        return targets
+
+    def _hedge_delay(self, attempt: _Attempt) -> Optional[float]:
+        p95 = attempt.stats.p95_ttft()
+        if p95 is None:
+            return None
+        return max(p95, self.config.HEDGE_MIN_DELAY)
+
+    async def request(
+        self, targets: List[ProviderTarget], messages: List[Dict[str, Any]], **params: Any
+    ) -> AsyncGenerator[str, None]:
+        if not targets:
+            raise UnsupportedProviderError("Bot model has no AI provider configured")
+
+        candidates = [target for target in targets if self.stats_for(target).available()]
+        if not candidates:
+            # Every circuit is open; trying the primary beats failing outright
+            candidates = targets[:1]
+
+        queue: asyncio.Queue = asyncio.Queue()
+        attempts: List[_Attempt] = []
+        active: List[_Attempt] = []
+        last_error: Optional[Exception] = None
+
+        def launch(hedge: bool = False) -> _Attempt:
+            target = candidates.pop(0)
+            attempt = _Attempt(target, self.stats_for(target), queue, hedge).start(messages, params)
+            attempts.append(attempt)
+            active.append(attempt)
+            return attempt
+
+        primary = launch()
+        hedged = False
+        winner: Optional[_Attempt] = None
+        try:
+            while winner is None:
+                timeout = None
+                if self.config.PROVIDER_HEDGING and not hedged and candidates and len(active) == 1:
+                    timeout = self._hedge_delay(primary)
+                try:
+                    attempt, kind, payload = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    hedged = True
+                    PROVIDER_HEDGES.inc()
+                    launch(hedge=True)
+                    continue
+
+                if kind == "error":
+                    active.remove(attempt)
+                    last_error = payload
+                    logger().warning(
+                        "Provider %s failed before first token: %s", attempt.target.name, payload
+                    )
+                    if not active:
+                        if not candidates:
+                            if isinstance(last_error, AdmissionRejectedError):
+                                raise last_error
+                            raise StreamProcessingError(f"All providers failed: {str(last_error)}")
+                        PROVIDER_FAILOVERS.inc()
+                        primary = launch()
+                    continue
+
+                winner = attempt
+                for other in attempts:
+                    if other is not winner:
+                        other.cancel()
+                if kind == "done":
+                    return
+                if payload.startswith(USAGE_EVENT_PREFIX):
+                    record_usage(winner.target.name, payload)
+                yield payload
+
+            while True:
+                attempt, kind, payload = await queue.get()
+                if attempt is not winner:
+                    continue
+                if kind == "chunk":
+                    if payload.startswith(USAGE_EVENT_PREFIX):
+                        record_usage(winner.target.name, payload)
+                    yield payload
+                elif kind == "error":
+                    raise StreamProcessingError(str(payload))
+                else:
+                    return
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+
+provider_router = ProviderRouter()
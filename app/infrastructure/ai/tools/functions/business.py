@@ -1,73 +1,118 @@
+import re
+import Levenshtein
+from app.core.cache import cache_manager
+from app.core.catalog import catalog_store
+from app.core.change_feed import change_feed
 from app.core.database import db
+from app.core.tracing import traced_query
 from app.utils import split_camel_case, is_positive_integer
 from typing import List, Dict, Any, Optional
 
+SEARCH_WORDS = re.compile(r"\w+")
+
+PRODUCT_COLUMNS = (
+    'SELECT p."id", p."name", p."description", p."price", p."stock", p."images", c."name" AS category'
+)
+PRODUCT_FROM = 'FROM "business_products" p LEFT JOIN "product_categories" c ON c."id" = p."categoryId"'
+
+# Closest catalog words for a query that matched nothing
+SUGGESTION_MIN_RATIO = 0.7
+MAX_SUGGESTIONS = 3
+VOCABULARY_LIMIT = 5000
+vocabulary_cache = cache_manager.cache("product_vocabulary", ttl=300)
+change_feed.subscribe("catalog", vocabulary_cache.invalidate)
+
 
 class BusinessFunctions:
     def __init__(self, business_id: str):
         self.prisma = db.prisma
         self.business_id = business_id
 
+    @traced_query("search_products")
     async def search_products(
         self,
         query: str,
     ) -> List[Dict[str, Any]]:
         """Search products with filters (name, description, category, brand)."""
-        where = {}
         if query == "*LATEST*":
-            where = {
-                "businessId": self.business_id,
-                "isActive": True,
-            }
+            products = await self.prisma.query_raw(
+                f"{PRODUCT_COLUMNS} {PRODUCT_FROM} "
+                'WHERE p."businessId" = $1 AND p."isActive" ORDER BY p."name" ASC LIMIT 15',
+                self.business_id,
+            )
         else:
-            formatted_query = " | ".join(f"{word}:*" for word in query.lower().split())
-            where = {
-                "OR": [
-                    {"name": {"search": formatted_query}},
-                    {"description": {"search": formatted_query}},
-                    {
-                        "category": {
-                            "name": {
-                                "search": formatted_query,
-                            }
-                        }
-                    },
-                ],
-                "businessId": self.business_id,
-                "isActive": True,
-            }
-        
-        order = [{"name": "asc"}]
-        if query != "*LATEST*":
-            order = [
-                {
-                    "_relevance": {
-                        "fields": ["name"],
-                        "search": formatted_query,
-                        "sort": "desc"
-                    }
-                }
-            ]
-        
-        products = await self.prisma.businessproduct.find_many(
-            where=where,
-            include={"category": True},
-            take=15,
-            order=order
-        )
+            words = SEARCH_WORDS.findall(query.lower())
+            if not words:
+                return []
+            # Prefix match on any word, ranked over the weighted, trigger-maintained vector
+            formatted_query = " | ".join(f"{word}:*" for word in words)
+            products = await self.prisma.query_raw(
+                f'{PRODUCT_COLUMNS}, ts_rank(p."searchVector", q) AS rank {PRODUCT_FROM} '
+                "CROSS JOIN to_tsquery('simple', $2) q "
+                'WHERE p."businessId" = $1 AND p."isActive" AND p."searchVector" @@ q '
+                'ORDER BY rank DESC, p."name" ASC LIMIT 15',
+                self.business_id,
+                formatted_query,
+            )
         return [
             {
-                "id": product.id,
-                "name": product.name,
-                "description": product.description,
-                "price": product.price,
-                "stock": product.stock,
-                "category": product.category.name if product.category else None,
-                "images": product.images,
+                "id": product["id"],
+                "name": product["name"],
+                "description": product["description"],
+                "price": product["price"],
+                "stock": product["stock"],
+                "category": product["category"],
+                "images": product["images"],
             }
             for product in products
         ]
 
+    async def suggest_queries(self, query: str) -> List[str]:
+        """
+        Alternative search queries for one that found nothing: each unknown
+        word is replaced by the closest word (Levenshtein ratio) from the
+        business's product and category names.
+        """
+        words = SEARCH_WORDS.findall(query.lower())
+        if not words:
+            return []
+        vocabulary = await vocabulary_cache.get_or_load(self.business_id, self._load_vocabulary)
+        if not vocabulary:
+            return []
+        candidates = []
+        for word in words:
+            scored = sorted(
+                ((Levenshtein.ratio(word, known), known) for known in vocabulary),
+                reverse=True,
+            )
+            candidates.append([known for ratio, known in scored[:MAX_SUGGESTIONS] if ratio >= SUGGESTION_MIN_RATIO])
+
+        suggestions = []
+        corrected = [options[0] if options else word for word, options in zip(words, candidates)]
+        if corrected != words:
+            suggestions.append(" ".join(corrected))
+        for options in candidates:
+            suggestions.extend(option for option in options[1:] if option not in suggestions)
+        return suggestions[:MAX_SUGGESTIONS]
+
+    async def _load_vocabulary(self) -> List[str]:
+        catalog = await catalog_store.get(self.business_id)
+        if catalog is not None:
+            # The whole catalog, reading only the two columns needed
+            texts = [*catalog.values("name"), *catalog.values("category")]
+        else:
+            rows = await self.prisma.query_raw(
+                f'SELECT p."name", c."name" AS category {PRODUCT_FROM} '
+                f'WHERE p."businessId" = $1 AND p."isActive" LIMIT {VOCABULARY_LIMIT}',
+                self.business_id,
+            )
+            texts = [f"{row['name']} {row['category'] or ''}" for row in rows]
+        words = set()
+        for text in texts:
+            if text:
+                words.update(SEARCH_WORDS.findall(text.lower()))
+        return sorted(word for word in words if len(word) > 2)
+
     async def check_product_availability(
         self, product_id: str, location_id: Optional[str] = None
     ) -> Dict[str, Any]:
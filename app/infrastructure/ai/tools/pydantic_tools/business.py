@@ -1,14 +1,18 @@
+from functools import lru_cache
 from pydantic.v1 import BaseModel, Field
-from langchain.tools import StructuredTool
-from langchain_core.utils.function_calling import convert_to_openai_tool
 from app.infrastructure.ai.tools.functions.business import BusinessFunctions
 
+# LangChain is only needed to build the tool schema once per process, so it
+# is imported on first use instead of on every worker start.
+
 class SearchProducts(BaseModel):
     query: str = Field(
         description="The name/brand/category/description key of the product to search for."
     )
 
-def get_all_business_tools() -> list[StructuredTool]:
+def get_all_business_tools() -> list["StructuredTool"]:
+    from langchain.tools import StructuredTool
+
     business_functions = BusinessFunctions("-")
     search_products = StructuredTool.from_function(description="Search for products with filters.", func=business_functions.search_products, name="search_products", args_schema=SearchProducts)
 
@@ -17,8 +21,11 @@ def get_all_business_tools() -> list[StructuredTool]:
     ]
     return business_tools
 
+@lru_cache()
 def get_all_business_functions():
     """Convert business tools to OpenAI function format."""
+    from langchain_core.utils.function_calling import convert_to_openai_tool
+
     business_tools = get_all_business_tools()
     business_functions = [convert_to_openai_tool(f) for f in business_tools]
     return business_functions
\ No newline at end of file
@@ -0,0 +1,72 @@
+"""
+Move cold conversations out of the chats table.
+
+Conversations whose newest message is older than CHAT_ARCHIVE_AFTER_DAYS
+are compressed into chat_archives and their rows deleted from chats, which
+keeps the hot table and its indexes small. Resuming an archived
+conversation restores its history (ChatRepository.restore_if_archived).
+Meant to run from cron, e.g. nightly:
+
+    python -m app.jobs.archive_chats --older-than-days 30
+"""
+import asyncio
+import logging
+import argparse
+from datetime import datetime, timedelta
+from app.core.database import db
+from app.core.logging import setup_logging
+from app.api.dependencies import get_chat_repository, get_config
+from app.domain.errors import PrismaExecutionError
+
+logger = logging.getLogger(__name__)
+
+
+class ChatArchiver:
+    def __init__(self, older_than_days: int, batch_size: int):
+        self.chat_repo = get_chat_repository()
+        self.older_than_days = older_than_days
+        self.batch_size = batch_size
+
+    async def run(self, max_batches: int = 0) -> dict:
+        """Archive batches until none are left (or `max_batches`); returns totals"""
+        cutoff = datetime.utcnow() - timedelta(days=self.older_than_days)
+        totals = {"conversations": 0, "chats": 0, "failed": 0}
+        batches = 0
+        failed = set()
+        while not max_batches or batches < max_batches:
+            ids = await self.chat_repo.find_archivable_conversations(cutoff, self.batch_size + len(failed))
+            ids = [conversation_id for conversation_id in ids if conversation_id not in failed]
+            if not ids:
+                break
+            for conversation_id in ids:
+                try:
+                    totals["chats"] += await self.chat_repo.archive_conversation(conversation_id)
+                    totals["conversations"] += 1
+                except PrismaExecutionError as e:
+                    # Usually a concurrent write to the conversation; it is picked up on the next run
+                    failed.add(conversation_id)
+                    totals["failed"] += 1
+                    logger.warning("Could not archive conversation %s: %s", conversation_id, e)
+            batches += 1
+            logger.info("Archived %s conversations (%s chats) so far", totals["conversations"], totals["chats"])
+        return totals
+
+
+async def main(args):
+    await db.connect()
+    try:
+        totals = await ChatArchiver(args.older_than_days, args.batch_size).run(args.max_batches)
+        logger.info("Chat archival finished: %s", totals)
+        return totals
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    config = get_config()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--older-than-days", type=int, default=config.CHAT_ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=config.CHAT_ARCHIVE_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=0, help="0 runs until nothing is left")
+    setup_logging()
+    asyncio.run(main(parser.parse_args()))
@@ -2,9 +2,25 @@ import logging
 from app.core.database import db
 from contextlib import asynccontextmanager
 from app.api.routes import chat as chats_router
+from app.api.routes import metrics as metrics_router
+from app.api.routes import admin as admin_router
+from app.api.routes import batch as batch_router
+from app.api.routes import usage as usage_router
 from fastapi.middleware.cors import CORSMiddleware
+from app.api.middleware import RateLimitMiddleware, RequestIdMiddleware
 from fastapi import FastAPI, Depends, HTTPException
 from app.core.logging import setup_logging
+from app.core.tracing import exporter
+from app.api.dependencies import get_config
+from app.core.loop_monitor import loop_monitor
+from app.core.streams import stream_store
+from app.core.cache import cache_manager
+from app.core.rate_limit import rate_limiter
+from app.core.catalog import catalog_store
+from app.core.change_feed import change_feed
+from app.services.compaction import compactor
+from app.services.batch import get_batch_chat_service
+from app.services.usage import usage_aggregator
 
 setup_logging()
 logger = logging.getLogger(__name__)
@@ -17,10 +33,30 @@ async def lifespan(app: FastAPI):
         logger.info("Starting up application...")
         await db.connect()
         logger.info("Database connected successfully")
+        exporter.start()
+        if get_config().LOOP_MONITOR_ENABLED:
+            loop_monitor.start()
+        compactor.start()
+        stream_store.start()
+        cache_manager.start()
+        usage_aggregator.start()
+        rate_limiter.start()
+        catalog_store.start()
+        change_feed.start()
         yield
     finally:
         # Shutdown
         logger.info("Shutting down application...")
+        await exporter.stop()
+        await loop_monitor.stop()
+        await compactor.stop()
+        await get_batch_chat_service().stop()
+        await stream_store.stop()
+        await cache_manager.stop()
+        await usage_aggregator.stop()
+        await rate_limiter.stop()
+        await change_feed.stop()
+        await catalog_store.stop()
         await db.disconnect()
         logger.info("Database disconnected successfully")
 
@@ -32,6 +68,8 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Inside CORS so 429s carry CORS headers
+app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -39,6 +77,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
 
 
 async def verify_db():
@@ -46,7 +85,7 @@ async def verify_db():
         try:
             await db.connect()
         except Exception as e:
-            logger.error(f"Database connection failed: {str(e)}")
+            logger.error("Database connection failed: %s", e)
             raise HTTPException(status_code=503, detail="Database connection error")
     return db.prisma
 
@@ -57,3 +96,20 @@ app.include_router(
     tags=["chat"],
     dependencies=[Depends(verify_db)],
 )
+
+app.include_router(
+    batch_router.router,
+    prefix="/api/v1/batches",
+    tags=["batch"],
+    dependencies=[Depends(verify_db)],
+)
+
+app.include_router(
+    usage_router.router,
+    prefix="/api/v1/usage",
+    tags=["usage"],
+    dependencies=[Depends(verify_db)],
+)
+
+app.include_router(metrics_router.router, tags=["metrics"])
+app.include_router(admin_router.router, prefix="/admin", tags=["admin"])
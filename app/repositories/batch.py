@@ -0,0 +1,54 @@
+from typing import List, Optional
+from prisma import Prisma
+from prisma.fields import Json
+from prisma.models import ChatBatch
+from datetime import datetime, timezone
+from app.core.tracing import traced_query
+from app.domain.errors import PrismaExecutionError
+
+
+class BatchRepository:
+    def __init__(self, db: Prisma):
+        self.db = db
+
+    @traced_query("create_batch")
+    async def create_batch(self, total: int) -> ChatBatch:
+        try:
+            return await self.db.chatbatch.create(data={"total": total})
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to create batch: {str(e)}")
+
+    @traced_query("get_batch")
+    async def get_batch(self, batch_id: str) -> Optional[ChatBatch]:
+        try:
+            return await self.db.chatbatch.find_unique(where={"id": batch_id})
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to get batch: {str(e)}")
+
+    @traced_query("update_batch")
+    async def update_progress(self, batch_id: str, status: str, completed: int, failed: int) -> None:
+        try:
+            await self.db.chatbatch.update(
+                where={"id": batch_id},
+                data={"status": status, "completed": completed, "failed": failed},
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to update batch: {str(e)}")
+
+    @traced_query("finish_batch")
+    async def finish_batch(
+        self, batch_id: str, status: str, completed: int, failed: int, results: List[dict]
+    ) -> None:
+        try:
+            await self.db.chatbatch.update(
+                where={"id": batch_id},
+                data={
+                    "status": status,
+                    "completed": completed,
+                    "failed": failed,
+                    "results": Json(results),
+                    "finishedAt": datetime.now(timezone.utc),
+                },
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to finish batch: {str(e)}")
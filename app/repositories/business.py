@@ -1,6 +1,22 @@
-from typing import Dict, Any
+from typing import Dict, Any, List
 from prisma import Prisma
 from prisma.models import Business
+from app.core.cache import cache_manager
+from app.core.change_feed import change_feed
+from app.core.tracing import traced_query
+from app.domain.errors import PrismaExecutionError
+
+business_cache = cache_manager.cache("business")
+change_feed.subscribe("business", business_cache.invalidate)
+
+# A category rename moves its products too, so the change time is the later of the two
+CATALOG_UPDATED = 'greatest(p."updatedAt", c."updatedAt")'
+CATALOG_UPDATED_MS = f'(extract(epoch FROM {CATALOG_UPDATED}) * 1000)::bigint'
+CATALOG_SELECT = (
+    'SELECT p."id", p."name", p."description", p."price", p."stock", p."images", c."name" AS "category", '
+    f'p."isActive", {CATALOG_UPDATED_MS} AS "updatedMs" '
+    'FROM "business_products" p LEFT JOIN "product_categories" c ON c."id" = p."categoryId"'
+)
 
 
 class BusinessRepository:
@@ -8,9 +24,56 @@ class BusinessRepository:
         self.db = db
 
     async def get_business_data(self, business_id: str)-> (Business | None):
+        """Business data for the prompt, served from the two-level cache when warm."""
+        return await business_cache.get_or_load(business_id, lambda: self._load_business_data(business_id))
+
+    @traced_query("get_business_data")
+    async def _load_business_data(self, business_id: str)-> (Business | None):
         """Fetch all necessary business data from database."""
         business = await self.db.business.find_unique(
             where={"id": business_id},
             include={"configurations": True, "locations": True, "operatingHours": True},
         )
         return business
+
+    @traced_query("export_catalog")
+    async def export_catalog(self, business_id: str) -> List[Dict[str, Any]]:
+        """All active products of a business, as written to its catalog snapshot"""
+        try:
+            return await self.db.query_raw(
+                f'{CATALOG_SELECT} WHERE p."businessId" = $1 AND p."isActive"', business_id
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to export catalog: {str(e)}")
+
+    @traced_query("catalog_changes")
+    async def catalog_changes(
+        self, business_id: str, after_ms: int, after_id: str, limit: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Products (active or not) whose (updatedMs, id) comes after
+        (`after_ms`, `after_id`), oldest change first; page on the last row.
+        """
+        try:
+            return await self.db.query_raw(
+                f'{CATALOG_SELECT} WHERE p."businessId" = $1 '
+                f'AND ({CATALOG_UPDATED_MS}, p."id") > ($2, $3) '
+                'ORDER BY "updatedMs", p."id" LIMIT $4',
+                business_id,
+                after_ms,
+                after_id,
+                limit,
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to read catalog changes: {str(e)}")
+
+    @traced_query("count_active_products")
+    async def count_active_products(self, business_id: str) -> int:
+        try:
+            rows = await self.db.query_raw(
+                'SELECT count(*)::int AS "count" FROM "business_products" WHERE "businessId" = $1 AND "isActive"',
+                business_id,
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to count products: {str(e)}")
+        return rows[0]["count"] if rows else 0
@@ -0,0 +1,47 @@
+from typing import Any, Dict, List
+from prisma import Prisma
+from app.core.tracing import traced_query
+from app.domain.errors import PrismaExecutionError
+
+
+class ChangeRepository:
+    """Reads change_versions, maintained by the triggers in prisma/sql/003_change_feed.sql"""
+
+    def __init__(self, db: Prisma):
+        self.db = db
+
+    @traced_query("latest_change_version")
+    async def latest_version(self) -> int:
+        try:
+            rows = await self.db.query_raw('SELECT coalesce(max("version"), 0) AS "version" FROM "change_versions"')
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to read change versions: {str(e)}")
+        return int(rows[0]["version"]) if rows else 0
+
+    @traced_query("changes_after")
+    async def changes_after(self, version: int, entity: str, key: str, limit: int) -> List[Dict[str, Any]]:
+        """
+        (entity, key, version) rows after the (version, entity, key) cursor,
+        oldest first; keys changed by one statement share a version, so the
+        cursor pages within it too.
+        """
+        try:
+            return await self.db.query_raw(
+                'SELECT "entity", "key", "version" FROM "change_versions" '
+                'WHERE ("version", "entity", "key") > ($1, $2, $3) '
+                'ORDER BY "version", "entity", "key" LIMIT $4',
+                version,
+                entity,
+                key,
+                limit,
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to read changes: {str(e)}")
+
+    @traced_query("all_change_versions")
+    async def all_versions(self) -> List[Dict[str, Any]]:
+        """Every (entity, key, version); one row per business and bot that ever changed"""
+        try:
+            return await self.db.query_raw('SELECT "entity", "key", "version" FROM "change_versions"')
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to read change versions: {str(e)}")
@@ -1,5 +1,10 @@
+import json
+import zlib
+import logging
 import httpagentparser
+from datetime import datetime, timedelta, timezone
 from prisma import Prisma
+from prisma.fields import Base64, Json
 from typing import List, Optional
 from prisma.models import Chat, Bot
 from app.utils import generate_cuid
@@ -8,21 +13,84 @@ from app.domain.requests import ChatRequest
 from fastapi.exceptions import HTTPException
 from app.domain.validators import CuidValidator
 from app.domain.errors import PrismaExecutionError
+from app.domain.history import HistoryEntry
+from app.core.tracing import traced_query
+from app.core.metrics import registry
+from app.core.cache import cache_manager
+from app.core.change_feed import change_feed
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EVENTS = registry.counter(
+    "chat_archive_events_total", "Conversations moved to or restored from chat_archives", ["event"]
+)
+
+# Chat columns kept in an archive payload
+ARCHIVED_FIELDS = (
+    "id", "role", "content", "toolCalls", "toolCallId", "tokens",
+    "feedback", "reaction", "extraMetadata", "createdAt", "updatedAt",
+)
+ARCHIVE_TX_TIMEOUT = timedelta(seconds=30)
+
+bot_cache = cache_manager.cache("bots")
+change_feed.subscribe("bot", bot_cache.invalidate)
+
+
+def pack_chats(chats: List[Chat]) -> bytes:
+    """Serialized, uncompressed archive payload"""
+    rows = [{field: getattr(chat, field) for field in ARCHIVED_FIELDS} for chat in chats]
+    return json.dumps(rows, default=str).encode()
+
+
+def unpack_chats(payload: bytes, conversation_id: str) -> List[dict]:
+    """Archive payload back to `chat.create_many` rows"""
+    rows = json.loads(zlib.decompress(payload))
+    for row in rows:
+        row["conversationId"] = conversation_id
+        row["createdAt"] = datetime.fromisoformat(row["createdAt"])
+        row["updatedAt"] = datetime.fromisoformat(row["updatedAt"])
+        for field in ("toolCalls", "extraMetadata"):
+            if row[field] is None:
+                del row[field]
+            else:
+                row[field] = Json(row[field])
+    return rows
 
 
 class ChatRepository:
     def __init__(self, db: Prisma):
         self.db = db
 
-    async def get_chats(self, conversation_id: str) -> List[Chat]:
+    @traced_query("get_chats")
+    async def get_chats(
+        self,
+        conversation_id: str,
+        limit: Optional[int] = None,
+        after: Optional[datetime] = None,
+    ) -> List[HistoryEntry]:
+        """
+        Chat history in chronological order, as immutable HistoryEntry records.
+
+        With `limit`, only the newest `limit` messages are read, walking
+        the (conversationId, createdAt) index backwards instead of loading
+        the whole conversation. `after` is a keyset bound on createdAt.
+        """
         try:
-            chats = await self.db.chat.find_many(
-                where={"conversationId": conversation_id}, order={"createdAt": "asc"}
-            )
-            return chats
+            where = {"conversationId": conversation_id}
+            if after is not None:
+                where["createdAt"] = {"gt": after}
+            if limit is None:
+                chats = await self.db.chat.find_many(where=where, order={"createdAt": "asc"})
+            else:
+                chats = await self.db.chat.find_many(
+                    where=where, order={"createdAt": "desc"}, take=limit
+                )
+                chats.reverse()
+            return [HistoryEntry.from_chat(chat) for chat in chats]
         except Exception as e:
             raise PrismaExecutionError(f"Failed to get chat history: {str(e)}")
 
+    @traced_query("save_chat_message")
     async def save_chat_message(self, chat: Chat) -> Chat:
         try:
             created_chat = await self.db.chat.create(data=chat)
@@ -30,47 +98,114 @@ class ChatRepository:
         except Exception as e:
             raise PrismaExecutionError(f"Failed to save chat message: {str(e)}")
 
+    @traced_query("save_chat_messages")
+    async def save_chat_messages(self, chats: List[dict]) -> int:
+        """Bulk insert; rows should carry explicit createdAt to keep their order"""
+        try:
+            return await self.db.chat.create_many(data=chats)
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to save chat messages: {str(e)}")
+
     async def get_bot(self, bot_id: str) -> Optional[Bot]:
+        return await bot_cache.get_or_load(bot_id, lambda: self._load_bot(bot_id))
+
+    @traced_query("get_bot")
+    async def _load_bot(self, bot_id: str) -> Optional[Bot]:
         try:
             bot = await self.db.bot.find_unique(
                 where={"id": bot_id},
-                include={"model": {"include": {"aiProvider": True}}},
+                include={
+                    "model": {
+                        "include": {
+                            "aiProvider": True,
+                            "fallbacks": {
+                                "include": {"fallbackModel": {"include": {"aiProvider": True}}}
+                            },
+                        }
+                    }
+                },
             )
             return bot
         except Exception as e:
             raise PrismaExecutionError(f"Failed to get bot: {str(e)}")
 
+    @traced_query("get_bot_plan")
+    async def get_bot_plan(self, bot_id: str) -> Optional[str]:
+        """Name of the plan of the active subscription of the bot's workspace"""
+        try:
+            rows = await self.db.query_raw(
+                'SELECT p."name" FROM "bots" b '
+                'JOIN "subscriptions" s ON s."workspaceId" = b."workspaceId" AND s."status" = \'ACTIVE\' '
+                'JOIN "plans" p ON p."id" = s."planId" WHERE b."id" = $1',
+                bot_id,
+            )
+            return rows[0]["name"] if rows else None
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to get bot plan: {str(e)}")
+
+    @traced_query("delete_chat")
     async def delete_chat(self, chat_id: str):
         try:
             await self.db.chat.delete(where={"id": chat_id})
         except Exception as e:
             raise PrismaExecutionError(f"Failed to delete chat: {str(e)}")
         
+    @traced_query("delete_chats")
+    async def delete_chats(self, chat_ids: List[str]):
+        try:
+            await self.db.chat.delete_many(where={"id": {"in": chat_ids}})
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to delete chats: {str(e)}")
+
+    @traced_query("delete_latest_message")
     async def delete_latest_message(self, conversationId: str, role: str = None):
         try:
-            where = {"conversationId": conversationId}
+            # Single round trip; the subquery is served by the (conversationId, role, createdAt) index
             if role:
-                where["role"] = role
-            latest_message = await self.db.chat.find_first(
-                where=where,
-                order={"createdAt": "desc"}
-            )
-            if latest_message:
-                await self.db.chat.delete(where={"id": latest_message.id})
+                await self.db.execute_raw(
+                    'DELETE FROM "chats" WHERE "id" = (SELECT "id" FROM "chats" '
+                    'WHERE "conversationId" = $1 AND "role" = $2 ORDER BY "createdAt" DESC LIMIT 1)',
+                    conversationId,
+                    role,
+                )
+            else:
+                await self.db.execute_raw(
+                    'DELETE FROM "chats" WHERE "id" = (SELECT "id" FROM "chats" '
+                    'WHERE "conversationId" = $1 ORDER BY "createdAt" DESC LIMIT 1)',
+                    conversationId,
+                )
         except Exception as e:
             raise PrismaExecutionError(f"Failed to delete latest message: {str(e)}")
 
+    @traced_query("get_conversation")
     async def get_conversation(self, conversation_id: str):
         try:
-            conversation = await self.db.conversation.find_first(
-                where={"id": conversation_id}
-            )
+            conversation = None
+            if conversation_id:
+                conversation = await self.db.conversation.find_unique(
+                    where={"id": conversation_id}
+                )
             if not conversation:
-                print("No Conversation for ID", conversation_id)
+                logger.debug("No Conversation for ID %s", conversation_id)
             return conversation
         except Exception as e:
             raise PrismaExecutionError(f"Failed to get conversation: {str(e)}")
 
+    @traced_query("get_conversations")
+    async def get_conversations(self, conversation_ids: List[str]):
+        try:
+            return await self.db.conversation.find_many(where={"id": {"in": conversation_ids}})
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to get conversations: {str(e)}")
+
+    @traced_query("create_conversations")
+    async def create_conversations(self, conversations: List[dict]) -> int:
+        try:
+            return await self.db.conversation.create_many(data=conversations, skip_duplicates=True)
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to create conversations: {str(e)}")
+
+    @traced_query("create_conversation")
     async def create_conversation(
         self,
         bot_id: str,
@@ -110,18 +245,14 @@ class ChatRepository:
     ):
         current_conversation = await self.get_conversation(conversation_id)
         if current_conversation:
-            return current_conversation
+            return await self.restore_if_archived(current_conversation)
 
         session_id = await self.get_or_create_session_id(request, response)
 
-        existing_conversation = await self.db.conversation.find_first(
-            where={"botId": bot_id, "sessionId": session_id},
-            order={"createdAt": "desc"},
-            include={"bot": True},
-        )
+        existing_conversation = await self.get_latest_session_conversation(bot_id, session_id)
 
         if existing_conversation:
-            return existing_conversation
+            return await self.restore_if_archived(existing_conversation)
 
         return await self.create_conversation(
             bot_id=bot_id,
@@ -131,6 +262,14 @@ class ChatRepository:
             conversation_id=conversation_id,
         )
 
+    @traced_query("get_latest_session_conversation")
+    async def get_latest_session_conversation(self, bot_id: str, session_id: str):
+        return await self.db.conversation.find_first(
+            where={"botId": bot_id, "sessionId": session_id},
+            order={"createdAt": "desc"},
+            include={"bot": True},
+        )
+
     async def get_browser_metadata(self, request: Request):
         user_agent = request.headers.get("user-agent", "")
         parsed_agent = httpagentparser.detect(user_agent)
@@ -159,6 +298,7 @@ class ChatRepository:
 
         return session_id
 
+    @traced_query("get_recent_chats")
     async def get_recent_chats(
         self, conversation_id: str, limit: int = 2
     ) -> List[Chat]:
@@ -168,3 +308,99 @@ class ChatRepository:
             order={"createdAt": "desc"},
             take=limit,
         )
+
+    @traced_query("save_conversation_summary")
+    async def save_conversation_summary(
+        self, conversation_id: str, summary: dict, expected_up_to: Optional[str]
+    ) -> bool:
+        """
+        Store `summary` under extraMetadata.summary if nobody compacted meanwhile.
+
+        Compare-and-set on the previous summary's `upTo`, so concurrent
+        compactions of one conversation (other workers, other processes)
+        apply at most once. Returns False when the check failed.
+        """
+        try:
+            updated = await self.db.execute_raw(
+                'UPDATE "conversations" SET "extraMetadata" = '
+                "coalesce(\"extraMetadata\", '{}'::jsonb) || jsonb_build_object('summary', $2::jsonb) "
+                'WHERE "id" = $1 AND ("extraMetadata" -> \'summary\' ->> \'upTo\') IS NOT DISTINCT FROM $3',
+                conversation_id,
+                json.dumps(summary),
+                expected_up_to,
+            )
+            return updated > 0
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to save conversation summary: {str(e)}")
+
+    async def restore_if_archived(self, conversation):
+        """Move archived history back into `chats` when an old conversation is resumed"""
+        if getattr(conversation, "archivedAt", None) is not None:
+            await self.restore_conversation(conversation.id)
+            conversation.archivedAt = None
+        return conversation
+
+    @traced_query("find_archivable_conversations")
+    async def find_archivable_conversations(self, cutoff: datetime, limit: int) -> List[str]:
+        """Ids of unarchived conversations whose newest message is older than `cutoff`"""
+        try:
+            # Both subqueries are served by the (conversationId, createdAt) index
+            rows = await self.db.query_raw(
+                'SELECT c."id" FROM "conversations" c WHERE c."archivedAt" IS NULL '
+                'AND EXISTS (SELECT 1 FROM "chats" h WHERE h."conversationId" = c."id") '
+                'AND NOT EXISTS (SELECT 1 FROM "chats" h WHERE h."conversationId" = c."id" '
+                'AND h."createdAt" >= $1::timestamp) LIMIT $2',
+                cutoff.isoformat(),
+                limit,
+            )
+            return [row["id"] for row in rows]
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to find archivable conversations: {str(e)}")
+
+    @traced_query("archive_conversation")
+    async def archive_conversation(self, conversation_id: str) -> int:
+        """Compress a conversation's chats into chat_archives and delete them; returns rows moved"""
+        try:
+            async with self.db.tx(timeout=ARCHIVE_TX_TIMEOUT) as tx:
+                chats = await tx.chat.find_many(
+                    where={"conversationId": conversation_id}, order={"createdAt": "asc"}
+                )
+                if not chats:
+                    return 0
+                raw = pack_chats(chats)
+                await tx.chatarchive.create(
+                    data={
+                        "conversationId": conversation_id,
+                        "payload": Base64.encode(zlib.compress(raw, 6)),
+                        "messageCount": len(chats),
+                        "rawBytes": len(raw),
+                        "firstChatAt": chats[0].createdAt,
+                        "lastChatAt": chats[-1].createdAt,
+                    }
+                )
+                # Only the rows archived; a message written meanwhile stays and is merged on restore
+                await tx.chat.delete_many(where={"id": {"in": [chat.id for chat in chats]}})
+                await tx.conversation.update(
+                    where={"id": conversation_id}, data={"archivedAt": datetime.now(timezone.utc)}
+                )
+            ARCHIVE_EVENTS.inc(event="archived")
+            return len(chats)
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to archive conversation: {str(e)}")
+
+    @traced_query("restore_conversation")
+    async def restore_conversation(self, conversation_id: str) -> int:
+        """Rehydrate archived chats into `chats` and drop the archive; returns rows restored"""
+        try:
+            async with self.db.tx(timeout=ARCHIVE_TX_TIMEOUT) as tx:
+                archive = await tx.chatarchive.find_unique(where={"conversationId": conversation_id})
+                restored = 0
+                if archive is not None:
+                    rows = unpack_chats(archive.payload.decode(), conversation_id)
+                    restored = await tx.chat.create_many(data=rows, skip_duplicates=True)
+                    await tx.chatarchive.delete(where={"conversationId": conversation_id})
+                await tx.conversation.update(where={"id": conversation_id}, data={"archivedAt": None})
+            ARCHIVE_EVENTS.inc(event="restored")
+            return restored
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to restore archived conversation: {str(e)}")
@@ -0,0 +1,86 @@
+import json
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from prisma import Prisma
+from app.core.tracing import traced_query
+from app.domain.errors import PrismaExecutionError
+
+COUNTERS = (
+    "turns",
+    "completions",
+    "toolCalls",
+    "errors",
+    "promptTokens",
+    "completionTokens",
+    "cachedTokens",
+    "latencyMs",
+)
+
+GROUP_COLUMNS = {
+    "business": '"businessId"',
+    "workspace": '"workspaceId"',
+    "model": '"modelName"',
+    "bucket": '"bucket"',
+}
+
+UPSERT_SQL = (
+    'INSERT INTO "usage_rollups" ("id", "bucket", "businessId", "workspaceId", "modelName", '
+    + ", ".join(f'"{name}"' for name in COUNTERS)
+    + ', "updatedAt") SELECT r."id", r."bucket", r."businessId", r."workspaceId", r."modelName", '
+    + ", ".join(f'r."{name}"' for name in COUNTERS)
+    + ', now() FROM jsonb_to_recordset($1::jsonb) AS r("id" text, "bucket" timestamp(3), "businessId" text, '
+    '"workspaceId" text, "modelName" text, '
+    + ", ".join(f'"{name}" bigint' for name in COUNTERS)
+    + ') ON CONFLICT ("bucket", "businessId", "workspaceId", "modelName") DO UPDATE SET '
+    + ", ".join(f'"{name}" = "usage_rollups"."{name}" + EXCLUDED."{name}"' for name in COUNTERS)
+    + ', "updatedAt" = now()'
+)
+
+
+def _utc(value: datetime) -> str:
+    # Prisma stores DateTime as UTC timestamp without time zone
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
+
+
+class UsageRepository:
+    def __init__(self, db: Prisma):
+        self.db = db
+
+    @traced_query("upsert_usage_rollups")
+    async def upsert_rollups(self, rows: List[Dict[str, Any]]) -> int:
+        """Add `rows` to their (bucket, business, workspace, model) rollups in one statement"""
+        try:
+            return await self.db.execute_raw(UPSERT_SQL, json.dumps(rows, default=str))
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to save usage rollups: {str(e)}")
+
+    @traced_query("aggregate_usage")
+    async def aggregate(
+        self,
+        group_by: str,
+        since: datetime,
+        until: datetime,
+        business_id: Optional[str] = None,
+        workspace_id: Optional[str] = None,
+        limit: int = 50,
+    ) -> List[Dict[str, Any]]:
+        """Usage totals between `since` and `until` grouped by `group_by`, biggest token spenders first"""
+        column = GROUP_COLUMNS[group_by]
+        order = "1" if group_by == "bucket" else 'sum("promptTokens") + sum("completionTokens") DESC'
+        try:
+            return await self.db.query_raw(
+                f'SELECT {column} AS "key", '
+                + ", ".join(f'sum("{name}")::bigint AS "{name}"' for name in COUNTERS)
+                + ' FROM "usage_rollups" WHERE "bucket" >= $1::timestamp AND "bucket" < $2::timestamp '
+                'AND ($3::text IS NULL OR "businessId" = $3) AND ($4::text IS NULL OR "workspaceId" = $4) '
+                f"GROUP BY 1 ORDER BY {order} LIMIT $5",
+                _utc(since),
+                _utc(until),
+                business_id,
+                workspace_id,
+                limit,
+            )
+        except Exception as e:
+            raise PrismaExecutionError(f"Failed to aggregate usage: {str(e)}")
@@ -0,0 +1,106 @@
+"""
+Preload-then-fork launcher.
+
+Imports the application once in a parent process, freezes the heap and
+forks the workers, so code objects and other read-only pages are shared
+copy-on-write instead of being loaded by every worker:
+
+    WEB_CONCURRENCY=4 python -m app.server --host 0.0.0.0 --port 8090
+"""
+import gc
+import os
+import sys
+import signal
+import socket
+import logging
+import argparse
+import uvicorn
+from app.core.config import Config
+from app.core.logging import stop_logging
+
+logger = logging.getLogger(__name__)
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve(app, sock: socket.socket, args) -> None:
+    config = uvicorn.Config(app, log_level=args.log_level, proxy_headers=True, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--workers", type=int, default=Config().WEB_CONCURRENCY)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    sock = _bind(args.host, args.port)
+
+    # Preload: modules that workers import lazily are loaded once here and shared
+    import openai  # noqa: F401
+    from app.main import app
+    from app.infrastructure.ai.tools.pydantic_tools.business import get_all_business_functions
+
+    get_all_business_functions()
+
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            try:
+                _serve(app, sock, args)
+            finally:
+                stop_logging()
+                os._exit(0)
+        children[pid] = True
+
+    def shutdown(signum, frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
+    for _ in range(max(1, args.workers)):
+        spawn()
+    logger.info("Started %s preforked workers on %s:%s", len(children), args.host, args.port)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.pop(pid, None)
+        if not stopping:
+            logger.warning("Worker %s exited with status %s, restarting", pid, status)
+            spawn()
+
+    sock.close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()
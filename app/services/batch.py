@@ -0,0 +1,269 @@
+import json
+import time
+import asyncio
+import logging
+from itertools import count
+from functools import lru_cache
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from datetime import datetime, timedelta, timezone
+from prisma.models import Bot
+from app.api.dependencies import get_batch_repository, get_chat_repository, get_config
+from app.core.metrics import registry
+from app.domain.errors import PrismaExecutionError, StreamProcessingError
+from app.domain.interfaces import Message, MessageRole, ToolCall
+from app.domain.requests import BatchChatItem, ChatRequest
+from app.domain.validators import CuidValidator
+from app.infrastructure.ai.providers.router import provider_router
+from app.services.chat import ChatService
+from app.services.compaction import conversation_summary, summary_cutoff
+from app.services.tool_loop import ToolLoop, max_tool_depth
+from app.services.tool_results import encode_tool_result
+from app.utils import generate_cuid
+
+logger = logging.getLogger(__name__)
+
+BATCH_ITEMS = registry.counter(
+    "chat_batch_items_total", "Batch chat items processed by result", ["result"]
+)
+
+
+class BatchChatService:
+    """
+    Answers many (bot, conversation, prompt) items as one background job.
+
+    Bots are loaded once per job and conversations in bulk; items run on
+    a pool bounded by BATCH_CONCURRENCY (shared by all jobs in the
+    worker), with items of the same conversation answered in order. New
+    messages are written with one create_many per BATCH_FLUSH_SIZE
+    answered items, and the job row in chat_batches carries progress and
+    the final results for polling from any worker.
+    """
+
+    def __init__(self):
+        self.chat_repo = get_chat_repository()
+        self.batch_repo = get_batch_repository()
+        self.config = get_config()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._jobs: Set[asyncio.Task] = set()
+
+    async def submit(self, items: List[BatchChatItem]):
+        batch = await self.batch_repo.create_batch(len(items))
+        task = asyncio.create_task(self.run(batch.id, items), name=f"batch-{batch.id}")
+        self._jobs.add(task)
+        task.add_done_callback(self._jobs.discard)
+        return batch
+
+    async def stop(self):
+        for task in self._jobs:
+            task.cancel()
+        await asyncio.gather(*self._jobs, return_exceptions=True)
+
+    async def run(self, batch_id: str, items: List[BatchChatItem]) -> None:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.config.BATCH_CONCURRENCY)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(items)
+        pending_rows: List[dict] = []
+        flush_lock = asyncio.Lock()
+        state = {"completed": 0, "failed": 0, "unflushed": 0}
+
+        def fail(index: int, error: str, conversation_id: Optional[str] = None):
+            item = items[index]
+            results[index] = {
+                "index": index,
+                "bot_id": item.bot_id,
+                "conversation_id": conversation_id or item.conversation_id,
+                "status": "failed",
+                "error": error,
+            }
+            state["failed"] += 1
+            BATCH_ITEMS.inc(result="failed")
+
+        async def flush(force: bool = False):
+            if not force and state["unflushed"] < self.config.BATCH_FLUSH_SIZE:
+                return
+            async with flush_lock:
+                rows = pending_rows[:]
+                pending_rows.clear()
+                state["unflushed"] = 0
+                try:
+                    if rows:
+                        await self.chat_repo.save_chat_messages(rows)
+                    await self.batch_repo.update_progress(batch_id, "running", state["completed"], state["failed"])
+                except PrismaExecutionError as e:
+                    # Keep the rows for the next flush; the final one raises instead
+                    pending_rows[:0] = rows
+                    if force:
+                        raise
+                    logger.warning("Batch %s flush failed, retrying later: %s", batch_id, e)
+
+        async def answer_group(bot: Bot, conversation: Any, indexes: List[int]):
+            # Items of one conversation run in order, each seeing the previous answers
+            earlier: List[Message] = []
+            for index in indexes:
+                try:
+                    async with self._semaphore:
+                        new, reply = await self.answer(bot, conversation, items[index], earlier)
+                except Exception as e:
+                    logger.warning("Batch %s item %s failed: %s", batch_id, index, e)
+                    fail(index, str(e), conversation.id)
+                    continue
+                earlier.extend(new)
+                pending_rows.extend(self._rows(conversation.id, new))
+                results[index] = {
+                    "index": index,
+                    "bot_id": items[index].bot_id,
+                    "conversation_id": conversation.id,
+                    "status": "completed",
+                    "reply": reply,
+                }
+                state["completed"] += 1
+                state["unflushed"] += 1
+                BATCH_ITEMS.inc(result="completed")
+                await flush()
+
+        try:
+            await self.batch_repo.update_progress(batch_id, "running", 0, 0)
+            bots = await self._load_bots(items)
+            groups = await self._load_conversations(items, bots, fail)
+            await asyncio.gather(
+                *(answer_group(bots[conversation.botId], conversation, indexes) for conversation, indexes in groups)
+            )
+            await flush(force=True)
+            status = "failed" if state["failed"] == len(items) else "completed"
+        except asyncio.CancelledError:
+            await self.batch_repo.finish_batch(
+                batch_id, "cancelled", state["completed"], state["failed"], [r for r in results if r]
+            )
+            raise
+        except Exception as e:
+            logger.error("Batch %s failed: %s", batch_id, e, exc_info=True)
+            status = "failed"
+        await self.batch_repo.finish_batch(
+            batch_id, status, state["completed"], state["failed"], [r for r in results if r]
+        )
+
+    async def answer(
+        self, bot: Bot, conversation: Any, item: BatchChatItem, earlier: List[Message]
+    ) -> Tuple[List[Message], str]:
+        """Generate one reply without streaming; returns the new messages and the reply text"""
+        started = time.perf_counter()
+        service = ChatService()
+        service.chat_request = ChatRequest(prompt=item.prompt, chat_mode=item.chat_mode)
+        service.model_name = bot.model.name if bot.model else None
+        service.summary = conversation_summary(conversation) if item.chat_mode == "whatsapp" else None
+        service.tool_loop = ToolLoop(max_tool_depth(bot, self.config.TOOL_MAX_DEPTH))
+        history = await self.chat_repo.get_chats(
+            conversation.id,
+            limit=self.config.HISTORY_FETCH_LIMIT,
+            after=summary_cutoff(service.summary),
+        )
+        params = service.chat_params(bot)
+        targets = provider_router.targets_for(bot.model)
+
+        new = [self._message(service, MessageRole.USER.value, item.prompt)]
+        while True:
+            messages = await service.prepare_chat_context(bot, [*history, *earlier, *new])
+            reply = await self._complete(service, bot, targets, messages, params)
+            if "<tool_call>" not in reply:
+                break
+            if not service.tool_loop.can_descend():
+                raise StreamProcessingError("Maximum tool call recursion depth reached")
+            tool_call = ToolCall.from_dict(service._accumulate_tool_call(reply))
+            service.tool_loop.depth += 1
+            service.meter(bot, toolCalls=1)
+            result = await service.execute_tool(tool_call)
+            for message in service.tool_messages(tool_call, result):
+                new.append(self._message(service, message.role, message.content, message))
+        new.append(self._message(service, MessageRole.ASSISTANT.value, reply))
+        service.meter(bot, turns=1, latencyMs=(time.perf_counter() - started) * 1000)
+        return new, reply
+
+    async def _complete(
+        self, service: ChatService, bot: Bot, targets, messages: List[Dict[str, Any]], params: Dict[str, Any]
+    ) -> str:
+        reply = ""
+        usage: Dict[str, int] = {}
+        async for chunk in provider_router.request(targets, messages, **params):
+            chunk_data = service._parse_chunk(chunk)
+            if "usage" in chunk_data:
+                usage = chunk_data["usage"]
+            elif "error" in chunk_data:
+                raise StreamProcessingError(chunk_data["error"])
+            elif "token" in chunk_data:
+                reply += chunk_data["token"].replace("<|im_end|>", "")
+        prompt_tokens = usage.get("prompt_tokens") or service.prompt_tokens
+        completion_tokens = usage.get("completion_tokens") or service.tokenizer.count(reply, service.model_name)
+        service.tokenizer.record_usage(bot.businessId, prompt_tokens, completion_tokens)
+        service.meter(
+            bot,
+            completions=1,
+            promptTokens=prompt_tokens,
+            completionTokens=completion_tokens,
+            cachedTokens=usage.get("cached_tokens", 0),
+        )
+        return reply.strip()
+
+    def _message(self, service: ChatService, role: str, content: str, message: Optional[Message] = None) -> Message:
+        message = message or Message(role=role, content=content)
+        if not isinstance(message.content, str):
+            # Raw tool results go to the provider and the chats table as text
+            message.content = encode_tool_result(message.content)
+        stored = message.content
+        if message.toolCalls:
+            stored = f"{stored}{json.dumps(message.toolCalls)}"
+        message.tokens = service.tokenizer.count(stored, service.model_name)
+        return message
+
+    def _rows(self, conversation_id: str, messages: List[Message]) -> List[dict]:
+        # create_many stamps every row with the same now(); explicit times keep the order
+        base = datetime.now(timezone.utc)
+        return [
+            {"conversationId": conversation_id, **message.to_dict(), "createdAt": base + timedelta(milliseconds=offset)}
+            for offset, message in zip(count(), messages)
+        ]
+
+    async def _load_bots(self, items: List[BatchChatItem]) -> Dict[str, Bot]:
+        bot_ids = list(dict.fromkeys(item.bot_id for item in items))
+        bots = await asyncio.gather(*(self.chat_repo.get_bot(bot_id) for bot_id in bot_ids))
+        return {bot.id: bot for bot in bots if bot}
+
+    async def _load_conversations(self, items: List[BatchChatItem], bots: Dict[str, Bot], fail):
+        """Group item indexes by conversation, creating missing conversations in bulk"""
+        requested = [item.conversation_id for item in items if item.conversation_id]
+        existing = {c.id: c for c in await self.chat_repo.get_conversations(requested)} if requested else {}
+        to_create: Dict[str, dict] = {}
+        groups: Dict[str, List[int]] = defaultdict(list)
+        for index, item in enumerate(items):
+            if item.bot_id not in bots:
+                fail(index, "Bot not found")
+                continue
+            conversation_id = item.conversation_id
+            if conversation_id is None:
+                conversation_id = generate_cuid()
+            elif not CuidValidator.validate_cuid(conversation_id):
+                fail(index, "Invalid conversation ID format. Must be a valid CUID.")
+                continue
+            conversation = existing.get(conversation_id)
+            if conversation is not None and conversation.botId != item.bot_id:
+                fail(index, "Conversation belongs to another bot")
+                continue
+            if conversation is None:
+                created = to_create.setdefault(conversation_id, {"id": conversation_id, "botId": item.bot_id})
+                if created["botId"] != item.bot_id:
+                    fail(index, "Conversation belongs to another bot")
+                    continue
+            groups[conversation_id].append(index)
+
+        if to_create:
+            await self.chat_repo.create_conversations(list(to_create.values()))
+            for conversation in await self.chat_repo.get_conversations(list(to_create)):
+                existing[conversation.id] = conversation
+        for conversation in existing.values():
+            await self.chat_repo.restore_if_archived(conversation)
+        return [(existing[conversation_id], indexes) for conversation_id, indexes in groups.items()]
+
+
+@lru_cache()
+def get_batch_chat_service() -> BatchChatService:
+    return BatchChatService()
@@ -1,6 +1,6 @@
 import re
 import json
-from openai import OpenAI
+import time
 from prisma.models import Bot, Chat
 from app.domain.requests import ChatRequest
 from typing import Dict, List, Any, AsyncGenerator, Literal, Optional
@@ -10,69 +10,117 @@ from app.infrastructure.ai.tools.pydantic_tools.business import (
     get_all_business_functions,
 )
 from app.api.dependencies import (
+    get_ai_client,
+    get_config,
+    get_tokenizer_service,
     get_chat_repository,
     get_business_repository,
     logger,
 )
 from app.infrastructure.ai.providers.cloudflare import CloudflareProvider
-from app.infrastructure.ai.providers.openai import OpenAIProvider
-from app.domain.errors import ToolExecutionError
+from app.infrastructure.ai.providers.router import provider_router
+from app.domain.errors import AdmissionRejectedError, ToolExecutionError
+from app.core.logging import SAMPLED
+from app.core.catalog import catalog_store
+from app.core.tracing import TOKENS_PER_SECOND, TOOL_SECONDS, current_turn, span
 from app.domain.interfaces import MessageRole, ToolCall, Message
+from app.domain.history import HistoryEntry, wire_message
 from app.utils import generate_cuid
+from app.services.tokenizer import MESSAGE_OVERHEAD, window_history
+from app.services.compaction import compactor, conversation_summary, summary_cutoff
+from app.services.usage import usage_aggregator
+from app.services.tool_loop import EMPTY_RESULTS, ToolLoop, max_tool_depth
+from app.services.reply_tags import ReplyTagParser
+from app.services.tool_results import encode_tool_result, is_product_list, record_savings
 
 
 class ChatService:
-    MAX_RECURSION_DEPTH = 2  # Limit recursive function calls
-
     def __init__(self):
         self.chat_repo = get_chat_repository()
         self.business_repo = get_business_repository()
-        self.client = None
-        self._recursion_count = 0
+        self.provider_router = provider_router
+        self.tool_loop = ToolLoop(get_config().TOOL_MAX_DEPTH)
         self.chat_request: ChatRequest = None
         self.business_functions: BusinessFunctions = None
         self.business_system_prompt = ""
+        self.tokenizer = get_tokenizer_service()
+        self.model_name: Optional[str] = None
+        self.prompt_tokens = 0
+        self.summary: Optional[dict] = None
+        self.volatile_context = ""
+        self.workspace_id: Optional[str] = None
+        self.reply_tags: Optional[ReplyTagParser] = None
+        self.turn_chat_ids: List[str] = []
+        self.answered = False
 
     async def _get_prompt_generator(self, bot: Bot) -> tuple[str, Any]:
         """Get appropriate prompt generator based on bot type"""
         if bot.businessId:
-            business_data = await self.business_repo.get_business_data(bot.businessId)
-            generator = SellerPromptGenerator(
-                business=business_data,
-                config=business_data.configurations,
-                locations=business_data.locations,
-                operating_hours=business_data.operatingHours,
-                mode=self.chat_request.chat_mode,
-            )
-            self.business_system_prompt = generator.generate_prompt()
+            with span("get_business_data"):
+                business_data = await self.business_repo.get_business_data(bot.businessId)
+            self.workspace_id = business_data.workspaceId
+            with span("generate_prompt") as prompt_span:
+                generator = SellerPromptGenerator(
+                    business=business_data,
+                    config=business_data.configurations,
+                    locations=business_data.locations,
+                    operating_hours=business_data.operatingHours,
+                    mode=self.chat_request.chat_mode,
+                )
+                compiled = generator.compile()
+                self.business_system_prompt = compiled.text
+                self.volatile_context = generator.volatile_context()
+                prompt_span.attributes.update(
+                    {f"prompt.tokens.{name}": tokens for name, tokens in compiled.tokens.items()}
+                )
             return self.business_system_prompt, business_data
 
     async def prepare_chat_context(
-        self, bot: Bot, conversation_history: List[Chat]
+        self, bot: Bot, conversation_history: List[HistoryEntry]
     ) -> List[Dict[str, str]]:
         """Prepare chat context with system message and conversation history"""
         system_content, _ = await self._get_prompt_generator(bot)
-
+        system_tokens = self.tokenizer.count(system_content, self.model_name) + MESSAGE_OVERHEAD
         messages = [{"role": MessageRole.SYSTEM.value, "content": system_content}]
-        messages.extend(
-            [
+        if self.summary:
+            # Older turns were compacted; the summary stands in for them
+            messages.append(
                 {
-                    "role": chat.role,
-                    "content": chat.content,
-                    **(
-                        {
-                            "tool_calls": chat.toolCalls,
-                        }
-                        if chat.toolCalls
-                        else {}
-                    ),
-                    **({"tool_call_id": chat.toolCallId} if chat.toolCallId else {}),
+                    "role": MessageRole.SYSTEM.value,
+                    "content": f"Summary of the earlier conversation with this customer:\n{self.summary['text']}",
                 }
-                for chat in conversation_history
-            ]
+            )
+            system_tokens += self.summary.get("tokens", 0) + MESSAGE_OVERHEAD
+        conversation_history = window_history(
+            conversation_history, get_config().CONTEXT_TOKEN_BUDGET - system_tokens
         )
+        self.prompt_tokens = system_tokens + sum(
+            (chat.tokens or 0) + MESSAGE_OVERHEAD for chat in conversation_history
+        )
+
+        messages.extend(wire_message(chat) for chat in conversation_history)
+        if self.volatile_context:
+            # Trails the history so everything before it stays cacheable by the endpoint
+            messages.append({"role": MessageRole.SYSTEM.value, "content": self.volatile_context})
+            self.prompt_tokens += self.tokenizer.estimate(self.volatile_context) + MESSAGE_OVERHEAD
         return messages
 
+    def chat_params(self, bot: Bot) -> Dict[str, Any]:
+        """Completion parameters for a bot: business tools and the prefix-cache hint"""
+        chat_params = {}
+        if bot.businessId:
+            self.business_functions = BusinessFunctions(bot.businessId)
+            chat_params.update(
+                {
+                    "tool_choice": "auto",
+                    "tools": get_all_business_functions(),
+                    "temperature": 0.0,
+                }
+            )
+            if get_config().PROMPT_CACHE_HINTS:
+                chat_params["cache_key"] = f"{bot.businessId}:{self.chat_request.chat_mode}"
+        return chat_params
+
     def _get_tool_function(self, function_name: str):
         """Get the corresponding tool function based on name"""
         function_mapping = {
@@ -80,47 +128,103 @@ class ChatService:
         }
         return function_mapping.get(function_name)
 
-    async def handle_tool_call(self, tool_call: ToolCall, conversation_id: str) -> str:
-        """Execute tool call and return results"""
-        try:
-            function = self._get_tool_function(tool_call.name)
-            if not function:
-                raise ToolExecutionError(f"Unknown function: {tool_call.name}")
-
-            result = await function(**tool_call.arguments)
+    async def execute_tool(self, tool_call: ToolCall) -> Any:
+        """Run a tool and return its result, reusing the result of an equivalent call this turn"""
+        function = self._get_tool_function(tool_call.name)
+        if not function:
+            raise ToolExecutionError(f"Unknown function: {tool_call.name}")
 
-            if result in ([], None, "", "[]"):
-                result = f"No results found."
+        previous = self.tool_loop.previous_result(tool_call)
+        if previous is not None:
+            logger().info("Repeated tool call answered from this turn: %s", tool_call, extra=SAMPLED)
+            return previous
 
-            logger().info(f"EXECUTED TOOL: {str(tool_call)}")
+        started = time.perf_counter()
+        with span("tool", tool=tool_call.name):
+            result = await function(**tool_call.arguments)
+        TOOL_SECONDS.observe(time.perf_counter() - started, tool=tool_call.name)
+        if self.reply_tags is not None and tool_call.name == "search_products":
+            self.reply_tags.add_products(result)
+
+        empty = result in EMPTY_RESULTS
+        if empty:
+            result = await self._no_results(tool_call)
+        self.tool_loop.remember(tool_call, result, empty)
+
+        logger().info("EXECUTED TOOL: %s", tool_call, extra=SAMPLED)
+        return result
+
+    async def _no_results(self, tool_call: ToolCall) -> Any:
+        """Tell the model what to do next instead of leaving it to retry blindly"""
+        query = (tool_call.arguments or {}).get("query")
+        if tool_call.name != "search_products" or not query or query == "*LATEST*":
+            return "No results found."
+        try:
+            suggestions = await self.business_functions.suggest_queries(query)
+        except Exception as e:
+            logger().warning("Query suggestions failed: %s", e)
+            suggestions = []
+        if suggestions:
+            return {
+                "results": [],
+                "message": f'No products match "{query}". Search once more with the closest suggested query.',
+                "suggested_queries": suggestions,
+            }
+        return {
+            "results": [],
+            "message": f'No products match "{query}" and nothing similar is in the catalog. '
+            "Do not search again; tell the customer and offer to show the latest products.",
+        }
 
-            tool_id = generate_cuid()
-            await self._save_message(
-                conversation_id,
-                Message(
-                    role=MessageRole.ASSISTANT.value,
-                    content="",
-                    toolCalls=[
-                        {
-                            "id": tool_id,
-                            "type": "function",
-                            "function": {
-                                "name": tool_call.name,
-                                "arguments": json.dumps(tool_call.arguments),
-                            },
-                        }
-                    ],
-                    toolCallId=tool_id,
-                ),
-            )
-            await self._save_message(
-                conversation_id,
-                Message(
-                    role=MessageRole.TOOL.value,
-                    content=result,
-                    toolCallId=tool_id,
-                ),
-            )
+    def tool_messages(self, tool_call: ToolCall, result: Any) -> List[Message]:
+        """
+        The assistant tool call and tool result pair stored in history.
+
+        The model gets the compact encoding of the result, which is what
+        every later turn resends; product lists are kept in full in the
+        tool message's extraMetadata.toolResult.
+        """
+        tool_id = generate_cuid()
+        content = encode_tool_result(result)
+        tokens = self.tokenizer.count(content, self.model_name)
+        full = str(result)
+        if full != content:
+            record_savings(tool_call.name, self.tokenizer.count(full, self.model_name), tokens)
+        return [
+            Message(
+                role=MessageRole.ASSISTANT.value,
+                content="",
+                toolCalls=[
+                    {
+                        "id": tool_id,
+                        "type": "function",
+                        "function": {
+                            "name": tool_call.name,
+                            "arguments": json.dumps(tool_call.arguments),
+                        },
+                    }
+                ],
+                toolCallId=tool_id,
+            ),
+            Message(
+                role=MessageRole.TOOL.value,
+                content=content,
+                toolCallId=tool_id,
+                tokens=tokens,
+                extraMetadata={"toolResult": result} if is_product_list(result) else None,
+            ),
+        ]
+
+    async def handle_tool_call(self, tool_call: ToolCall, conversation_id: str) -> Optional[List[HistoryEntry]]:
+        """Execute and save a tool call; returns the saved records, or None if any save failed"""
+        try:
+            result = await self.execute_tool(tool_call)
+            saved = []
+            for message in self.tool_messages(tool_call, result):
+                saved.append(await self._save_message(conversation_id, message))
+            if not all(saved):
+                return None
+            return [HistoryEntry.from_chat(chat) for chat in saved]
         except Exception as e:
             raise ToolExecutionError(f"Tool execution failed: {str(e)}")
 
@@ -129,12 +233,21 @@ class ChatService:
     ) -> Optional[Chat]:
         """Save chat message to repository with duplicate check for empty tool results"""
         try:
-            return await self.chat_repo.save_chat_message(
+            if message.tokens is None:
+                # Stored as str(content), so count that
+                content = str(message.content)
+                if message.toolCalls:
+                    content = f"{content}{json.dumps(message.toolCalls)}"
+                message.tokens = self.tokenizer.count(content, self.model_name)
+            chat = await self.chat_repo.save_chat_message(
                 {"conversationId": conversation_id, **message.to_dict()}
             )
+            if chat:
+                self.turn_chat_ids.append(chat.id)
+            return chat
 
         except Exception as e:
-            logger().error(f"Error saving message: {str(e)}", exc_info=True)
+            logger().error("Error saving message: %s", e, exc_info=True)
             return None
 
     async def _handle_tool_response(
@@ -142,40 +255,47 @@ class ChatService:
         bot: Bot,
         conversation_id: str,
         tool_call: Dict[str, Any],
+        history: List[HistoryEntry],
     ) -> AsyncGenerator[str, None]:
         """Handle tool execution and subsequent chat responses"""
-        try:
-            if self._recursion_count >= self.MAX_RECURSION_DEPTH:
-                yield self._stream_data(
-                    {"warning": "Maximum tool call recursion depth reached"}
-                )
-                return
+        if not self.tool_loop.can_descend():
+            yield self._stream_data(
+                {"warning": "Maximum tool call recursion depth reached"}
+            )
+            return
 
-            self._recursion_count += 1
-            await self.handle_tool_call(ToolCall.from_dict(tool_call), conversation_id)
+        self.tool_loop.depth += 1
+        try:
+            self.meter(bot, toolCalls=1)
+            turn = current_turn()
+            if turn:
+                turn.record_depth(self.tool_loop.depth)
+            saved = await self.handle_tool_call(ToolCall.from_dict(tool_call), conversation_id)
             async for response in self.handle_chat(
                 bot,
                 conversation_id,
                 prompt="",
                 chat_request=self.chat_request,
                 inside=True,
+                # The next round sees this history plus the tool messages; no re-read needed
+                history=[*history, *saved][-get_config().HISTORY_FETCH_LIMIT:] if saved else None,
             ):
                 yield response
 
         except ToolExecutionError as e:
             yield self._stream_data({"error": str(e)})
         finally:
-            self._recursion_count -= 1
+            self.tool_loop.depth -= 1
 
     def _stream_data(self, data: Dict[str, Any]) -> str:
         """Format data for streaming"""
         if "error" in data:
             try:
                 logger().error(
-                    f"Error formatting stream data: {str(data['error'])}", exc_info=True
+                    "Error formatting stream data: %s", data["error"], exc_info=True
                 )
             except:
-                logger().error(f"Error formatting stream data: {str(data)}", exc_info=True)
+                logger().error("Error formatting stream data: %s", data, exc_info=True)
                 pass
         return f"data: {json.dumps(data)}\n\n"
 
@@ -189,53 +309,66 @@ class ChatService:
         prompt: str,
         chat_request: ChatRequest = None,
         inside: bool = False,
+        conversation: Any = None,
+        history: Optional[List[HistoryEntry]] = None,
     ) -> AsyncGenerator[str, None]:
         """Main chat handling method"""
         user_message = None
         self.chat_request = chat_request
+        self.model_name = bot.model.name if bot.model else None
+        if not inside:
+            # Rows saved this turn and whether any reply text went out, for a rejected turn's cleanup
+            self.turn_chat_ids = []
+            self.answered = False
+            self.summary = conversation_summary(conversation) if self._is_whatsapp() else None
+            self.tool_loop = ToolLoop(max_tool_depth(bot, get_config().TOOL_MAX_DEPTH))
+            # WhatsApp replies carry <images>/<contacts> blocks, turned into events as they close
+            self.reply_tags = None
+            if self._is_whatsapp():
+                catalog = catalog_store.peek(bot.businessId)
+                self.reply_tags = ReplyTagParser(resolve=catalog.get if catalog else None)
+        turn = current_turn()
+        started = time.perf_counter()
+        failed = False
         try:
             if prompt:
-                user_message = await self._save_message(
-                    conversation_id,
-                    Message(
-                        role=MessageRole.USER.value,
-                        content=prompt,
-                    ),
-                )
-            history = await self.chat_repo.get_chats(conversation_id)
-            messages = await self.prepare_chat_context(bot, history)
-
-            chat_params = {}
-            if bot.businessId:
-                self.business_functions = BusinessFunctions(bot.businessId)
-                chat_params.update(
-                    {
-                        "tool_choice": "auto",
-                        "tools": get_all_business_functions(),
-                        "temperature": 0.0,
-                    }
-                )
+                with span("save_user_message"):
+                    user_message = await self._save_message(
+                        conversation_id,
+                        Message(
+                            role=MessageRole.USER.value,
+                            content=prompt,
+                        ),
+                    )
+            if history is None:
+                with span("get_chats"):
+                    history = await self.chat_repo.get_chats(
+                        conversation_id,
+                        limit=get_config().HISTORY_FETCH_LIMIT,
+                        after=summary_cutoff(self.summary),
+                    )
+            with span("prepare_chat_context"):
+                messages = await self.prepare_chat_context(bot, history)
 
-            chat_provider = None
-            self.client = OpenAI(
-                base_url=bot.model.aiProvider.endpointUrl,
-                api_key=bot.model.aiProvider.apiKey,
-            )
+            chat_params = self.chat_params(bot)
+            targets = self.provider_router.targets_for(bot.model)
             if not inside:
                 yield self.send_action("thinking")
-            if bot.model.aiProvider.provider == "cloudflare":
-                chat_provider = CloudflareProvider(self.client, bot.model.name)
-            elif bot.model.aiProvider.provider == "openai":
-                chat_provider = OpenAIProvider(self.client, bot.model.name)
-            else:
-                # :TODO Throw an error
-                pass
 
             assistant_message = ""
             is_collecting_tool_call = False
+            first_chunk_at = None
+            chunk_count = 0
+            usage: Dict[str, int] = {}
 
-            async for chunk in chat_provider.request(messages, **chat_params):
+            async for chunk in self.provider_router.request(targets, messages, **chat_params):
                 chunk_data = self._parse_chunk(chunk)
+                if "usage" in chunk_data:
+                    usage = chunk_data["usage"]
+                    continue
+                if first_chunk_at is None:
+                    first_chunk_at = time.perf_counter()
+                chunk_count += 1
 
                 if "error" in chunk_data:
                     yield self._stream_data({"error": chunk_data["error"]})
@@ -263,13 +396,36 @@ class ChatService:
                             is_collecting_tool_call = False
                             tool_call = self._accumulate_tool_call(assistant_message)
                             async for response in self._handle_tool_response(
-                                bot, conversation_id, tool_call
+                                bot, conversation_id, tool_call, history
                             ):
                                 yield response
                         continue
 
                     assistant_message += token
+                    self.answered = True
+                    if turn:
+                        turn.mark_first_token()
                     yield self._stream_data({"token": token})
+                    if self.reply_tags is not None:
+                        for event in self.reply_tags.feed(token):
+                            yield self._stream_data(event)
+
+            # Endpoint-reported usage is exact; our own counts are the fallback
+            prompt_tokens = usage.get("prompt_tokens") or self.prompt_tokens
+            completion_tokens = usage.get("completion_tokens") or self.tokenizer.count(assistant_message, self.model_name)
+            self.tokenizer.record_usage(bot.businessId, prompt_tokens, completion_tokens)
+            self.meter(
+                bot,
+                completions=1,
+                promptTokens=prompt_tokens,
+                completionTokens=completion_tokens,
+                cachedTokens=usage.get("cached_tokens", 0),
+            )
+
+            if first_chunk_at is not None and chunk_count > 1:
+                elapsed = time.perf_counter() - first_chunk_at
+                if elapsed > 0:
+                    TOKENS_PER_SECOND.observe((chunk_count - 1) / elapsed)
 
             if "<tool_call>" not in assistant_message:
                 assistant_chat = await self._save_message(
@@ -281,15 +437,42 @@ class ChatService:
                 )
                 if assistant_chat:
                     yield self._stream_data({"complete": True})
-                    suggestions = await self._generate_question_suggestions(
-                        bot, conversation_id
-                    )
+                    if not inside and self._is_whatsapp():
+                        self._schedule_compaction(conversation_id, history, assistant_chat)
+                    with span("suggestions"):
+                        suggestions = await self._generate_question_suggestions(
+                            bot, [*history, HistoryEntry.from_chat(assistant_chat)]
+                        )
                     yield self._stream_data({"suggestions": suggestions})
 
+        except AdmissionRejectedError:
+            # The controller turns this into its busy event and the client retries the prompt,
+            # so nothing of this turn may stay: the prompt, tool calls and tool results
+            failed = True
+            if not inside and not self.answered and self.turn_chat_ids:
+                await self.chat_repo.delete_chats(self.turn_chat_ids)
+            raise
         except Exception as e:
+            failed = True
             yield self._stream_data({"error": f"Error processing chat: {str(e)}"})
             if user_message:
                 await self.chat_repo.delete_chat(user_message.id)
+        finally:
+            if not inside:
+                self.meter(bot, turns=1, errors=int(failed), latencyMs=(time.perf_counter() - started) * 1000)
+
+    def meter(self, bot: Bot, **counts: int) -> None:
+        usage_aggregator.record(bot.businessId, self.workspace_id, self.model_name, **counts)
+
+    def _is_whatsapp(self) -> bool:
+        return bool(self.chat_request and self.chat_request.chat_mode == "whatsapp")
+
+    def _schedule_compaction(self, conversation_id: str, history: List[HistoryEntry], reply: Chat):
+        """Queue a background summary once unsummarized history outgrows the threshold"""
+        config = get_config()
+        unsummarized = sum(chat.tokens or 0 for chat in history) + (reply.tokens or 0)
+        if unsummarized >= config.COMPACTION_TRIGGER_TOKENS or len(history) >= config.HISTORY_FETCH_LIMIT:
+            compactor.schedule(conversation_id, self.model_name)
 
     def _accumulate_tool_call(self, content: str) -> Dict[str, Any]:
         """Parse accumulated tool call content"""
@@ -315,35 +498,23 @@ class ChatService:
             return {"token": chunk}
 
     async def _generate_question_suggestions(
-        self, bot: Bot, conversation_id: str
+        self, bot: Bot, history: List[HistoryEntry]
     ) -> List[str]:
-        """Generate question suggestions based on conversation history"""
+        """Generate question suggestions based on the turn's history, reusing its records"""
         try:
-            recent_chats = await self.chat_repo.get_recent_chats(conversation_id, 4)
-            if not recent_chats or len(recent_chats) <= 3:
+            if len(history) <= 3:
                 return []
+            messages = history[-4:]
 
-            messages = [
-                Message(
-                    role=chat.role,
-                    content=chat.content,
-                    toolCalls=chat.toolCalls,
-                    toolCallId=chat.toolCallId,
-                )
-                for chat in recent_chats
-            ]
-
+            config = get_config()
             cf_provider = CloudflareProvider(
-                OpenAI(
-                    base_url="https://generative.ai.cognova.io",
-                    api_key="sk-no-key-requireda",
-                ),
-                "@hf/nousresearch/hermes-2-pro-mistral-7b",
+                get_ai_client(config.SUGGESTIONS_BASE_URL, config.SUGGESTIONS_API_KEY),
+                config.SUGGESTIONS_MODEL,
             )
             suggestions = await cf_provider.generate_suggestions(messages, self.business_system_prompt)
 
             return suggestions
 
         except Exception as e:
-            logger().error(f"Error generating suggestions: {str(e)}")
+            logger().error("Error generating suggestions: %s", e)
             return []
@@ -0,0 +1,151 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, List, Optional, Set
+from app.core.metrics import registry
+from app.domain.interfaces import Message
+from app.services.tokenizer import window_history
+
+logger = logging.getLogger(__name__)
+
+COMPACTIONS = registry.counter(
+    "conversation_compactions_total",
+    "Summary compaction runs by result (compacted, skipped, conflict, failed, dropped)",
+    ["result"],
+)
+COMPACTION_SECONDS = registry.histogram(
+    "conversation_compaction_seconds", "Duration of one conversation compaction"
+)
+
+
+def conversation_summary(conversation: Any) -> Optional[dict]:
+    """The compacted summary stored in a conversation's extraMetadata, if any"""
+    metadata = getattr(conversation, "extraMetadata", None)
+    if isinstance(metadata, dict) and isinstance(metadata.get("summary"), dict):
+        return metadata["summary"]
+    return None
+
+
+def summary_cutoff(summary: Optional[dict]) -> Optional[datetime]:
+    """createdAt of the last message folded into `summary`"""
+    return datetime.fromisoformat(summary["upTo"]) if summary else None
+
+
+class ConversationCompactor:
+    """
+    Folds older turns of long conversations into a summary, off the request path.
+
+    The chat path calls `schedule()` once a conversation's unsummarized
+    history crosses COMPACTION_TRIGGER_TOKENS; a fixed pool of workers
+    drains a bounded queue. Compaction keeps the newest
+    COMPACTION_KEEP_TOKENS of history verbatim, summarizes everything
+    before it together with the previous summary, and stores the result
+    with a compare-and-set so each conversation is compacted once per
+    threshold crossing even across processes.
+    """
+
+    def __init__(self):
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._pending: Set[str] = set()
+        self.config = None
+
+    def start(self):
+        from app.api.dependencies import get_config
+
+        self.config = get_config()
+        if not self.config.COMPACTION_ENABLED or self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.config.COMPACTION_QUEUE_SIZE)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"compaction-{index}")
+            for index in range(self.config.COMPACTION_WORKERS)
+        ]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+        self._pending.clear()
+
+    def schedule(self, conversation_id: str, model_name: Optional[str] = None) -> bool:
+        """Queue a conversation for compaction; duplicates and overflow are dropped"""
+        if self._queue is None or conversation_id in self._pending:
+            return False
+        try:
+            self._queue.put_nowait((conversation_id, model_name))
+        except asyncio.QueueFull:
+            COMPACTIONS.inc(result="dropped")
+            return False
+        self._pending.add(conversation_id)
+        return True
+
+    async def _worker(self):
+        while True:
+            conversation_id, model_name = await self._queue.get()
+            started = time.perf_counter()
+            try:
+                result = await self.compact(conversation_id, model_name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                result = "failed"
+                logger.warning("Compaction of conversation %s failed: %s", conversation_id, e)
+            finally:
+                self._pending.discard(conversation_id)
+                self._queue.task_done()
+            COMPACTIONS.inc(result=result)
+            COMPACTION_SECONDS.observe(time.perf_counter() - started)
+
+    async def compact(self, conversation_id: str, model_name: Optional[str] = None) -> str:
+        """Compact one conversation; returns the result label"""
+        from app.api.dependencies import get_ai_client, get_chat_repository, get_config, get_tokenizer_service
+        from app.infrastructure.ai.providers.cloudflare import CloudflareProvider
+
+        config = self.config or get_config()
+        chat_repo = get_chat_repository()
+        tokenizer = get_tokenizer_service()
+
+        conversation = await chat_repo.get_conversation(conversation_id)
+        if conversation is None:
+            return "skipped"
+        previous = conversation_summary(conversation)
+        history = await chat_repo.get_chats(conversation_id, after=summary_cutoff(previous))
+        if sum(chat.tokens or 0 for chat in history) < config.COMPACTION_TRIGGER_TOKENS:
+            return "skipped"
+
+        recent = window_history(history, config.COMPACTION_KEEP_TOKENS)
+        older = history[: len(history) - len(recent)]
+        if not older:
+            return "skipped"
+
+        provider = CloudflareProvider(
+            get_ai_client(config.SUGGESTIONS_BASE_URL, config.SUGGESTIONS_API_KEY),
+            config.COMPACTION_MODEL,
+        )
+        text = await provider.summarize_conversation(
+            previous["text"] if previous else "",
+            [Message(role=chat.role, content=chat.content) for chat in older if chat.role != "system"],
+        )
+        if not text:
+            return "failed"
+
+        summary = {
+            "text": text,
+            "upTo": older[-1].createdAt.isoformat(),
+            "tokens": tokenizer.count(text, model_name),
+            "messages": (previous["messages"] if previous else 0) + len(older),
+            "updatedAt": datetime.now(timezone.utc).isoformat(),
+        }
+        saved = await chat_repo.save_conversation_summary(
+            conversation_id, summary, previous["upTo"] if previous else None
+        )
+        if saved:
+            logger.info("Compacted %s messages of conversation %s", len(older), conversation_id)
+        return "compacted" if saved else "conflict"
+
+
+compactor = ConversationCompactor()
@@ -0,0 +1,149 @@
+import re
+from typing import Any, Callable, Dict, List, Optional
+from app.core.metrics import registry
+
+REPLY_TAG_BLOCKS = registry.counter(
+    "reply_tag_blocks_total", "Tagged reply blocks turned into stream events by tag and outcome", ["tag", "outcome"]
+)
+
+TAGS = ("images", "contacts")
+OPEN_TAGS = {f"<{tag}>": tag for tag in TAGS}
+# Longest tail that can still be the start of a tag split across tokens
+OPEN_TAIL = max(len(tag) for tag in OPEN_TAGS) - 1
+MAX_BLOCK_CHARS = 8000
+
+URL = re.compile(r"https?://[^\s,\[\]\"'<>]+")
+# Items of an <images> block: image URLs, or product ids whose images are attached
+BLOCK_ITEMS = re.compile(r"[^\s,\[\]\"'<>]+")
+PHONE = re.compile(r"(?:tel:)?(\+?\d[\d\s().-]{6,}\d)")
+EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+
+class ReplyTagParser:
+    """
+    Incremental parser for the <images> and <contacts> blocks of a reply.
+
+    `feed()` takes each streamed token and returns the events of the
+    blocks it closed: `images` with the URLs, a `product` card for every
+    product listed by id or by one of its image URLs, and `contacts` with
+    the phones and emails found. Products come from this turn's
+    search_products results, then from `resolve` (e.g. the business's
+    catalog) for ids shown in earlier turns. Only the token and a few
+    carried-over characters are scanned, never the whole reply.
+    """
+
+    def __init__(self, resolve: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None):
+        self.resolve = resolve
+        self._tail = ""
+        self._tag: Optional[str] = None
+        self._block: List[str] = []
+        self._block_chars = 0
+        self._products: Dict[str, Dict[str, Any]] = {}
+        self._products_by_image: Dict[str, Dict[str, Any]] = {}
+
+    def add_products(self, products: Any) -> None:
+        """Index search_products results so ids and image URLs resolve to their products"""
+        if not isinstance(products, list):
+            return
+        for product in products:
+            if isinstance(product, dict) and product.get("id"):
+                self._products[product["id"]] = product
+                for image in product.get("images") or ():
+                    self._products_by_image.setdefault(image, product)
+
+    def feed(self, token: str) -> List[Dict[str, Any]]:
+        events = []
+        text = token
+        while text:
+            if self._tag is None:
+                text = self._find_open(text)
+            else:
+                text = self._find_close(text, events)
+        return events
+
+    def _find_open(self, text: str) -> str:
+        window = self._tail + text
+        start, tag = min(
+            ((window.find(open_tag), tag) for open_tag, tag in OPEN_TAGS.items() if open_tag in window),
+            default=(-1, None),
+        )
+        if tag is None:
+            self._tail = window[-OPEN_TAIL:]
+            return ""
+        self._tag, self._tail = tag, ""
+        self._block, self._block_chars = [], 0
+        return window[start + len(tag) + 2 :]
+
+    def _find_close(self, text: str, events: List[Dict[str, Any]]) -> str:
+        close = f"</{self._tag}>"
+        # The closing tag may start in the previous token
+        carried = self._tail
+        window = carried + text
+        end = window.find(close)
+        if end < 0:
+            keep = len(close) - 1
+            self._append(window[: max(0, len(window) - keep)])
+            self._tail = window[-keep:] if len(window) > keep else window
+            if self._block_chars > MAX_BLOCK_CHARS:
+                # Never closed; stop holding it
+                REPLY_TAG_BLOCKS.inc(tag=self._tag, outcome="unclosed")
+                self._tag, self._tail, self._block = None, "", []
+            return ""
+        self._append(window[:end])
+        tag, content = self._tag, "".join(self._block)
+        self._tag, self._tail, self._block = None, "", []
+        events.extend(self._events(tag, content))
+        return window[end + len(close) :]
+
+    def _append(self, text: str) -> None:
+        if text:
+            self._block.append(text)
+            self._block_chars += len(text)
+
+    def _events(self, tag: str, content: str) -> List[Dict[str, Any]]:
+        if tag == "images":
+            urls: Dict[str, None] = {}
+            products: Dict[str, Dict[str, Any]] = {}
+            for item in BLOCK_ITEMS.findall(content):
+                if URL.fullmatch(item):
+                    urls[item] = None
+                    product = self._products_by_image.get(item)
+                else:
+                    product = self._product(item)
+                    if product is not None:
+                        urls.update(dict.fromkeys(product.get("images") or ()))
+                if product is not None:
+                    products.setdefault(product["id"], product)
+            if not urls:
+                REPLY_TAG_BLOCKS.inc(tag=tag, outcome="empty")
+                return []
+            REPLY_TAG_BLOCKS.inc(tag=tag, outcome="resolved" if products else "images")
+            return [{"images": list(urls)}, *({"product": product_card(product)} for product in products.values())]
+
+        text = content.strip().strip("[]").strip()
+        if not text:
+            REPLY_TAG_BLOCKS.inc(tag=tag, outcome="empty")
+            return []
+        REPLY_TAG_BLOCKS.inc(tag=tag, outcome="parsed")
+        return [
+            {
+                "contacts": {
+                    "text": text,
+                    "phones": list(dict.fromkeys(re.sub(r"[\s().-]", "", phone) for phone in PHONE.findall(text))),
+                    "emails": list(dict.fromkeys(EMAIL.findall(text))),
+                }
+            }
+        ]
+
+    def _product(self, product_id: str) -> Optional[Dict[str, Any]]:
+        product = self._products.get(product_id)
+        if product is None and self.resolve is not None:
+            try:
+                product = self.resolve(product_id)
+            except Exception:
+                product = None
+        return product
+
+
+def product_card(product: Dict[str, Any]) -> Dict[str, Any]:
+    return {field: product.get(field) for field in ("id", "name", "price", "stock", "category", "images")}
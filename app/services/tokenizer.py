@@ -0,0 +1,159 @@
+import re
+import json
+import logging
+from pathlib import Path
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional
+from app.core.config import Config
+from app.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TOKENS_COUNTED = registry.counter(
+    "chat_tokens_total",
+    "Tokens sent to and received from the LLM per business",
+    ["business", "direction"],
+)
+
+# Scripts without spaces between words are roughly one token per character
+_CJK = r"぀-ヿ㐀-䶿一-鿿가-힯"
+_PIECES = re.compile(rf"[{_CJK}]|[^\W\d_{_CJK}]+|\d+|[^\w\s]+|_+")
+
+# Per-message framing overhead of chat templates (role markers, separators)
+MESSAGE_OVERHEAD = 4
+
+
+class ApproximateTokenizer:
+    """
+    Fast BPE-like estimate without any vocabulary.
+
+    Words cost about one token per four characters, digit runs one per
+    three digits, punctuation runs one per two characters and CJK/Hangul
+    one per character. Typically within 10-15% of real BPE counts.
+    """
+
+    name = "approximate"
+
+    def count(self, text: str) -> int:
+        total = 0
+        for piece in _PIECES.findall(text):
+            first = piece[0]
+            if first.isdigit():
+                total += (len(piece) + 2) // 3
+            elif first.isalpha() and len(piece) > 1:
+                total += (len(piece) + 3) // 4
+            elif first.isalpha():
+                total += 1
+            else:
+                total += (len(piece) + 1) // 2
+        return total
+
+
+class VocabularyTokenizer:
+    """Exact counts from a local HuggingFace tokenizer.json (requires `tokenizers`)"""
+
+    def __init__(self, name: str, path: Path):
+        from tokenizers import Tokenizer
+
+        self.name = name
+        self._tokenizer = Tokenizer.from_file(str(path))
+
+    def count(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+
+class TokenizerService:
+    """
+    Resolves a tokenizer per model name and memoizes counts.
+
+    TOKENIZER_MAP maps substrings of model names to tokenizer files in
+    TOKENIZER_DIR, e.g. {"hermes-2-pro-mistral": "mistral.json"}. Files
+    are read from disk only; models without a mapping, or without the
+    optional `tokenizers` package, use the approximate tokenizer.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        config = config or Config()
+        self.directory = Path(config.TOKENIZER_DIR)
+        self.mapping: Dict[str, str] = json.loads(config.TOKENIZER_MAP or "{}")
+        self.approximate = ApproximateTokenizer()
+        self._tokenizers: Dict[str, Any] = {}
+
+    def tokenizer_for(self, model_name: Optional[str]):
+        if not model_name:
+            return self.approximate
+        tokenizer = self._tokenizers.get(model_name)
+        if tokenizer is None:
+            tokenizer = self._load(model_name)
+            self._tokenizers[model_name] = tokenizer
+        return tokenizer
+
+    def _load(self, model_name: str):
+        for pattern, filename in self.mapping.items():
+            if pattern in model_name:
+                path = self.directory / filename
+                try:
+                    return VocabularyTokenizer(filename, path)
+                except ImportError:
+                    logger.warning("tokenizers is not installed; using approximate counts for %s", model_name)
+                except Exception as e:
+                    logger.warning("Could not load tokenizer %s for %s: %s", path, model_name, e)
+                break
+        return self.approximate
+
+    def count(self, text: Any, model_name: Optional[str] = None) -> int:
+        """Tokens of `text`; anything else (e.g. a raw tool result) is counted as its str()"""
+        if not text:
+            return 0
+        return _cached_count(self.tokenizer_for(model_name), text if isinstance(text, str) else str(text))
+
+    def estimate(self, text: Any) -> int:
+        """Approximate count for hot paths where exactness does not matter"""
+        if not text:
+            return 0
+        return _cached_count(self.approximate, text if isinstance(text, str) else str(text))
+
+    def count_messages(self, messages: Iterable[Dict[str, Any]], model_name: Optional[str] = None) -> int:
+        total = 0
+        for message in messages:
+            total += MESSAGE_OVERHEAD + self.count(message.get("content"), model_name)
+            if message.get("tool_calls"):
+                tool_calls = message["tool_calls"]
+                total += self.count(tool_calls if isinstance(tool_calls, str) else json.dumps(tool_calls), model_name)
+        return total
+
+    def record_usage(self, business_id: str, prompt_tokens: int, completion_tokens: int) -> None:
+        TOKENS_COUNTED.inc(prompt_tokens, business=business_id, direction="prompt")
+        TOKENS_COUNTED.inc(completion_tokens, business=business_id, direction="completion")
+
+
+@lru_cache(maxsize=4096)
+def _cached_count(tokenizer, text: str) -> int:
+    # System prompts and tool results repeat verbatim across turns; str caches
+    # its own hash, so repeated lookups of the same object are O(1)
+    return tokenizer.count(text)
+
+
+def window_history(history: List[Any], budget: int) -> List[Any]:
+    """
+    Keep the newest messages whose stored `tokens` fit in `budget`.
+
+    The window never starts with a tool result whose assistant tool call
+    was cut off, since providers reject orphaned tool messages. With no
+    budget left only the current exchange, from the last user message
+    on, is kept.
+    """
+    if budget <= 0:
+        start = next((i for i in range(len(history) - 1, -1, -1) if history[i].role == "user"), len(history))
+        return history[start:]
+    used = 0
+    start = len(history)
+    for index in range(len(history) - 1, -1, -1):
+        cost = (history[index].tokens or 0) + MESSAGE_OVERHEAD
+        if used + cost > budget and start < len(history):
+            break
+        used += cost
+        start = index
+    while start < len(history) and history[start].role == "tool":
+        start += 1
+    return history[start:]
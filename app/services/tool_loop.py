@@ -0,0 +1,63 @@
+import json
+from typing import Any, Dict, Optional
+from app.core.metrics import registry
+from app.domain.interfaces import ToolCall
+from app.infrastructure.ai.tools.functions.business import SEARCH_WORDS
+
+TOOL_WASTED_ROUND_TRIPS = registry.counter(
+    "tool_wasted_round_trips_total",
+    "LLM round trips spent on tool calls that repeated an earlier call or found nothing",
+    ["tool", "reason"],
+)
+TOOL_DEPTH_LIMITED = registry.counter(
+    "tool_depth_limited_total", "Turns that hit the bot's tool call depth limit"
+)
+
+EMPTY_RESULTS = ([], None, "", "[]")
+
+
+def max_tool_depth(bot: Any, default: int) -> int:
+    """Per-bot tool depth (Bot.maxToolDepth), falling back to TOOL_MAX_DEPTH"""
+    depth = getattr(bot, "maxToolDepth", None)
+    return default if depth is None else max(0, depth)
+
+
+def call_signature(tool_call: ToolCall) -> str:
+    """Equivalence key: string arguments compare as sets of lowercase words"""
+    arguments = {
+        name: " ".join(sorted(set(SEARCH_WORDS.findall(value.lower())))) if isinstance(value, str) else value
+        for name, value in (tool_call.arguments or {}).items()
+    }
+    return f"{tool_call.name}:{json.dumps(arguments, sort_keys=True, default=str)}"
+
+
+class ToolLoop:
+    """
+    Tool call bookkeeping for one turn.
+
+    Enforces the depth limit, answers a call equivalent to one already
+    made this turn from its result instead of running it again, and
+    counts the round trips such repeats and empty results cost.
+    """
+
+    def __init__(self, max_depth: int):
+        self.max_depth = max_depth
+        self.depth = 0
+        self._results: Dict[str, Any] = {}
+
+    def can_descend(self) -> bool:
+        if self.depth >= self.max_depth:
+            TOOL_DEPTH_LIMITED.inc()
+            return False
+        return True
+
+    def previous_result(self, tool_call: ToolCall) -> Optional[Any]:
+        result = self._results.get(call_signature(tool_call))
+        if result is not None:
+            TOOL_WASTED_ROUND_TRIPS.inc(tool=tool_call.name, reason="duplicate")
+        return result
+
+    def remember(self, tool_call: ToolCall, result: Any, empty: bool) -> None:
+        self._results[call_signature(tool_call)] = result
+        if empty:
+            TOOL_WASTED_ROUND_TRIPS.inc(tool=tool_call.name, reason="empty")
@@ -0,0 +1,84 @@
+import re
+import json
+from typing import Any, Dict, List
+from app.core.metrics import registry
+
+TOOL_RESULT_TOKENS = registry.counter(
+    "tool_result_tokens_total",
+    "Tool result tokens by encoding: full (the former str() payload) and compact (what the model gets)",
+    ["tool", "encoding"],
+)
+TOOL_RESULT_TOKENS_SAVED = registry.histogram(
+    "tool_result_tokens_saved",
+    "Tokens saved per tool call by the compact encoding",
+    ["tool"],
+    buckets=(0, 25, 50, 100, 250, 500, 1000, 2000, 4000),
+)
+
+# Column order of the product table; images is a count, description is shortened and
+# image is the first URL, which replies quote so their text stays usable without the payload
+PRODUCT_COLUMNS = ("id", "name", "price", "stock", "category", "images", "description", "image")
+DESCRIPTION_CHARS = 100
+WHITESPACE = re.compile(r"\s+")
+
+
+def shorten(text: str, limit: int = DESCRIPTION_CHARS) -> str:
+    """Collapse whitespace and cut at a word boundary before `limit` characters"""
+    text = WHITESPACE.sub(" ", text).strip()
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[: cut if cut > limit // 2 else limit].rstrip(" ,.;:") + "…"
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    # The table is pipe- and line-delimited
+    return str(value).replace("|", "/").replace("\n", " ")
+
+
+def is_product_list(result: Any) -> bool:
+    return isinstance(result, list) and bool(result) and all(
+        isinstance(item, dict) and "id" in item for item in result
+    )
+
+
+def encode_products(products: List[Dict[str, Any]]) -> str:
+    """
+    One header line and one pipe-separated row per product: field names
+    are written once instead of per product, image URLs become a count
+    plus the first URL and descriptions are shortened.
+    """
+    lines = ["|".join(PRODUCT_COLUMNS)]
+    for product in products:
+        images = product.get("images") or []
+        cells = [
+            _cell(product.get("id")),
+            _cell(product.get("name")),
+            _cell(product.get("price")),
+            _cell(product.get("stock")),
+            _cell(product.get("category")),
+            str(len(images)),
+            _cell(shorten(product.get("description") or "")),
+            _cell(images[0] if images else None),
+        ]
+        lines.append("|".join(cells))
+    return "\n".join(lines)
+
+
+def encode_tool_result(result: Any) -> str:
+    """The tool message content the model sees for `result`"""
+    if is_product_list(result):
+        return encode_products(result)
+    if isinstance(result, (dict, list)):
+        return json.dumps(result, ensure_ascii=False, separators=(",", ":"), default=str)
+    return str(result)
+
+
+def record_savings(tool: str, full_tokens: int, compact_tokens: int) -> None:
+    TOOL_RESULT_TOKENS.inc(full_tokens, tool=tool, encoding="full")
+    TOOL_RESULT_TOKENS.inc(compact_tokens, tool=tool, encoding="compact")
+    TOOL_RESULT_TOKENS_SAVED.observe(max(0, full_tokens - compact_tokens), tool=tool)
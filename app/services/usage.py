@@ -0,0 +1,121 @@
+import time
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from app.core.metrics import registry
+from app.repositories.usage import COUNTERS
+from app.utils import generate_cuid
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSHES = registry.counter(
+    "usage_rollup_flushes_total", "Usage rollup flushes by result (ok, failed)", ["result"]
+)
+USAGE_DROPPED = registry.counter(
+    "usage_records_dropped_total", "Usage records dropped because the aggregator was full"
+)
+USAGE_PENDING_KEYS = registry.gauge(
+    "usage_pending_keys", "Rollup rows waiting for the next flush"
+)
+
+# (bucket start epoch, businessId, workspaceId, modelName)
+RollupKey = Tuple[int, str, str, str]
+
+
+class UsageAggregator:
+    """
+    Sums usage per (bucket, business, workspace, model) in memory.
+
+    `record()` is a few dict additions per completion round, never per
+    token. A background task writes the accumulated rows every
+    USAGE_FLUSH_INTERVAL with one upsert that adds them to
+    usage_rollups; rows that fail to flush are merged back for the next
+    attempt, up to USAGE_MAX_KEYS pending rows.
+    """
+
+    def __init__(self):
+        self._rollups: Dict[RollupKey, List[int]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.config = None
+
+    def start(self):
+        from app.api.dependencies import get_config
+
+        self.config = get_config()
+        if not self.config.USAGE_METERING_ENABLED or self._task:
+            return
+        self._task = asyncio.create_task(self._run(), name="usage-aggregator")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self.flush()
+
+    def record(
+        self,
+        business_id: Optional[str],
+        workspace_id: Optional[str],
+        model_name: Optional[str],
+        **counts: int,
+    ) -> None:
+        """Add counts (turns, completions, toolCalls, errors, promptTokens, ...) to the current bucket"""
+        if self._task is None:
+            return
+        bucket = int(time.time()) // self.config.USAGE_ROLLUP_SECONDS * self.config.USAGE_ROLLUP_SECONDS
+        key = (bucket, business_id or "", workspace_id or "", model_name or "")
+        row = self._rollups.get(key)
+        if row is None:
+            if len(self._rollups) >= self.config.USAGE_MAX_KEYS:
+                USAGE_DROPPED.inc()
+                return
+            row = self._rollups[key] = [0] * len(COUNTERS)
+            USAGE_PENDING_KEYS.set(len(self._rollups))
+        for index, name in enumerate(COUNTERS):
+            value = counts.get(name)
+            if value:
+                row[index] += int(value)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.config.USAGE_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self) -> int:
+        """Write pending rollups; returns the number of rows written"""
+        from app.api.dependencies import get_usage_repository
+
+        if not self._rollups:
+            return 0
+        pending, self._rollups = self._rollups, {}
+        rows = [
+            {
+                "id": generate_cuid(),
+                "bucket": datetime.fromtimestamp(bucket, timezone.utc).replace(tzinfo=None).isoformat(),
+                "businessId": business_id,
+                "workspaceId": workspace_id,
+                "modelName": model_name,
+                **dict(zip(COUNTERS, values)),
+            }
+            for (bucket, business_id, workspace_id, model_name), values in pending.items()
+        ]
+        try:
+            await get_usage_repository().upsert_rollups(rows)
+        except Exception as e:
+            USAGE_FLUSHES.inc(result="failed")
+            logger.warning("Usage flush of %s rows failed, keeping them: %s", len(rows), e)
+            for key, values in pending.items():
+                row = self._rollups.setdefault(key, [0] * len(COUNTERS))
+                for index, value in enumerate(values):
+                    row[index] += value
+            return 0
+        finally:
+            USAGE_PENDING_KEYS.set(len(self._rollups))
+        USAGE_FLUSHES.inc(result="ok")
+        return len(rows)
+
+
+usage_aggregator = UsageAggregator()
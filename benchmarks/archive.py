@@ -0,0 +1,105 @@
+"""
+Report chats table size and history latency before and after archival.
+
+Backdates a fraction of the conversations bulk-loaded by benchmarks.explain
+so they count as cold, measures table/index size and ChatRepository.get_chats
+latency on the remaining hot conversations, runs the archival job, then
+measures again together with the cost of restoring one archived
+conversation.
+
+    DATABASE_URL=postgresql://.../cognova_bench python -m benchmarks.archive --cold-fraction 0.8
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+from app.core.database import db
+from app.api.dependencies import get_chat_repository
+from app.jobs.archive_chats import ChatArchiver
+from benchmarks.load import percentile
+
+SIZES_SQL = (
+    "SELECT pg_total_relation_size('chats')::bigint AS chats_total, "
+    "pg_indexes_size('chats')::bigint AS chats_indexes, "
+    "coalesce(pg_total_relation_size(to_regclass('chat_archives')), 0)::bigint AS archives_total, "
+    '(SELECT count(*) FROM "chats")::bigint AS chat_rows'
+)
+
+
+async def snapshot(conversation_ids, repeat: int) -> dict:
+    sizes = (await db.prisma.query_raw(SIZES_SQL))[0]
+    repo = get_chat_repository()
+    timings = []
+    for _ in range(repeat):
+        conversation_id = random.choice(conversation_ids)
+        started = time.perf_counter()
+        await repo.get_chats(conversation_id, limit=100)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        **{key: int(value) for key, value in sizes.items()},
+        "get_chats_p50_ms": percentile(timings, 50),
+        "get_chats_p95_ms": percentile(timings, 95),
+    }
+
+
+async def run(args) -> dict:
+    await db.connect()
+    try:
+        conversations = await db.prisma.query_raw(
+            'SELECT "id" FROM "conversations" WHERE "id" LIKE \'bx%\' AND "archivedAt" IS NULL'
+        )
+        ids = [row["id"] for row in conversations]
+        if not ids:
+            sys.exit("No bulk-loaded conversations; run benchmarks.explain first")
+        random.shuffle(ids)
+        cold = ids[: int(len(ids) * args.cold_fraction)]
+        hot = ids[len(cold):] or ids
+        await db.prisma.execute_raw(
+            'UPDATE "chats" SET "createdAt" = "createdAt" - interval \'400 days\' '
+            'WHERE "conversationId" = ANY(string_to_array($1, \',\'))',
+            ",".join(cold),
+        )
+        await db.prisma.execute_raw('VACUUM ANALYZE "chats"')
+
+        before = await snapshot(hot, args.repeat)
+
+        started = time.perf_counter()
+        totals = await ChatArchiver(older_than_days=365, batch_size=args.batch_size).run()
+        archive_seconds = time.perf_counter() - started
+        await db.prisma.execute_raw(f'VACUUM {"FULL " if args.vacuum_full else ""}ANALYZE "chats"')
+
+        after = await snapshot(hot, args.repeat)
+
+        restore_ms = None
+        if cold:
+            started = time.perf_counter()
+            await get_chat_repository().restore_conversation(cold[0])
+            restore_ms = (time.perf_counter() - started) * 1000
+
+        return {
+            "before": before,
+            "after": after,
+            "archived": totals,
+            "archive_seconds": round(archive_seconds, 3),
+            "restore_one_ms": restore_ms,
+        }
+    finally:
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cold-fraction", type=float, default=0.8)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument(
+        "--vacuum-full", action="store_true", help="rewrite chats after archival so the file size shrinks too"
+    )
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Measure catalog snapshot export, warm-start mapping and lookups.
+
+Writes a synthetic catalog in the snapshot format, then reports the time
+to map it (what a restarted worker pays instead of re-reading Postgres),
+id lookups, a full scan building the suggestion vocabulary and the
+Python heap held per worker, against keeping the same rows as dicts.
+No database is needed:
+
+    python -m benchmarks.catalog --products 10000 100000
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+import tracemalloc
+from app.core.catalog import Catalog, CatalogSnapshot, write_snapshot
+from app.infrastructure.ai.tools.functions.business import SEARCH_WORDS
+
+WORDS = "red blue black leather cotton shirt jacket shoe boot bag phone case charger cable lamp desk chair".split()
+
+
+def products(count: int):
+    rng = random.Random(count)
+    return [
+        {
+            "id": f"cl{index:022d}",
+            "name": " ".join(rng.choices(WORDS, k=3)).title(),
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "price": round(rng.uniform(1, 500), 2),
+            "stock": rng.choice(["IN_STOCK", "OUT_OF_STOCK", str(rng.randint(0, 50))]),
+            "category": rng.choice(WORDS).title(),
+            "images": [f"https://cdn.example.com/p/{index}/{n}.jpg" for n in range(2)],
+            "updatedMs": 1_700_000_000_000 + index,
+        }
+        for index in range(count)
+    ]
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def vocabulary(catalog):
+    # As BusinessFunctions._load_vocabulary
+    words = set()
+    for text in [*catalog.values("name"), *catalog.values("category")]:
+        if text:
+            words.update(SEARCH_WORDS.findall(text.lower()))
+    return words
+
+
+def measure(count: int, lookups: int) -> dict:
+    rows = products(count)
+    ids = [row["id"] for row in random.Random(0).choices(rows, k=lookups)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "business.snap")
+        _, export_ms = timed(write_snapshot, path, "business", rows, rows[-1]["updatedMs"])
+
+        tracemalloc.start()
+        snapshot, open_ms = timed(CatalogSnapshot, path)
+        catalog = Catalog("business", snapshot)
+        mapped_kib = tracemalloc.get_traced_memory()[0] / 1024
+        tracemalloc.stop()
+
+        _, lookup_ms = timed(lambda: [catalog.get(product_id) for product_id in ids])
+        _, scan_ms = timed(vocabulary, catalog)
+        result = {
+            "file_mib": os.path.getsize(path) / 2**20,
+            "export_ms": export_ms,
+            "open_ms": open_ms,
+            "lookup_us": lookup_ms * 1000 / lookups,
+            "scan_ms": scan_ms,
+            "heap_kib": mapped_kib,
+        }
+        snapshot.close()
+
+    del rows
+    tracemalloc.start()
+    as_dicts = products(count)
+    result["dicts_heap_kib"] = tracemalloc.get_traced_memory()[0] / 1024
+    tracemalloc.stop()
+    del as_dicts
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--lookups", type=int, default=10000)
+    args = parser.parse_args()
+    columns = ("file_mib", "export_ms", "open_ms", "lookup_us", "scan_ms", "heap_kib", "dicts_heap_kib")
+    print(f"{'products':>9} " + " ".join(f"{name:>14}" for name in columns))
+    for count in args.products:
+        result = measure(count, args.lookups)
+        print(f"{count:>9} " + " ".join(f"{result[name]:>14.2f}" for name in columns))
+
+
+if __name__ == "__main__":
+    main()
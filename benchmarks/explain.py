@@ -0,0 +1,125 @@
+"""
+Assert that the chat hot-path queries use their composite indexes.
+
+Bulk-loads a large synthetic history (generate_series, so millions of
+rows take seconds) under a bot from the benchmark fixture, runs ANALYZE,
+then EXPLAINs the queries issued by ChatRepository. Exits non-zero when a
+query falls back to a sequential scan or misses its expected index, and
+prints execution times.
+
+    DATABASE_URL=postgresql://.../cognova_bench python -m benchmarks.explain \\
+        --fixture benchmarks/fixture.json --conversations 5000 --chats 200
+"""
+import sys
+import json
+import asyncio
+import argparse
+from prisma import Prisma
+
+# (label, sql, params builder, index the plan must use)
+QUERIES = [
+    (
+        "get_chats (recent window)",
+        'SELECT * FROM "chats" WHERE "conversationId" = $1 ORDER BY "createdAt" DESC LIMIT 100',
+        lambda ids: [ids["conversation"]],
+        "chats_conversation_created_idx",
+    ),
+    (
+        "get_chats (keyset after)",
+        'SELECT * FROM "chats" WHERE "conversationId" = $1 AND "createdAt" > now() - interval \'1 day\' '
+        'ORDER BY "createdAt" ASC',
+        lambda ids: [ids["conversation"]],
+        "chats_conversation_created_idx",
+    ),
+    (
+        "delete_latest_message (lookup)",
+        'SELECT "id" FROM "chats" WHERE "conversationId" = $1 AND "role" = $2 ORDER BY "createdAt" DESC LIMIT 1',
+        lambda ids: [ids["conversation"], "user"],
+        "chats_conversation_role_created_idx",
+    ),
+    (
+        "get_latest_session_conversation",
+        'SELECT * FROM "conversations" WHERE "botId" = $1 AND "sessionId" = $2 ORDER BY "createdAt" DESC LIMIT 1',
+        lambda ids: [ids["bot"], ids["session"]],
+        "conversations_bot_session_created_idx",
+    ),
+]
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+async def load(db: Prisma, bot_id: str, conversations: int, chats: int) -> None:
+    await db.execute_raw(
+        'INSERT INTO "conversations" ("id", "botId", "sessionId", "createdAt", "updatedAt") '
+        "SELECT 'bx' || md5(random()::text || g), $1, 'bs' || (g % ($2 / 2 + 1)), "
+        "now() - (g || ' minutes')::interval, now() FROM generate_series(1, $2) g",
+        bot_id,
+        conversations,
+    )
+    await db.execute_raw(
+        'INSERT INTO "chats" ("id", "conversationId", "role", "content", "tokens", "createdAt", "updatedAt") '
+        "SELECT 'bc' || md5(random()::text || c.id || g), c.id, "
+        "CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END, 'benchmark message ' || g, 3, "
+        "c.\"createdAt\" + (g || ' seconds')::interval, now() "
+        'FROM "conversations" c, generate_series(1, $2) g WHERE c."botId" = $1 AND c."id" LIKE \'bx%\'',
+        bot_id,
+        chats,
+    )
+    await db.execute_raw('ANALYZE "chats"')
+    await db.execute_raw('ANALYZE "conversations"')
+
+
+async def check(args) -> int:
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+    bot_id = fixture["bots"][0]
+
+    db = Prisma()
+    await db.connect()
+    try:
+        if not args.skip_load:
+            await load(db, bot_id, args.conversations, args.chats)
+        sample = await db.query_raw(
+            'SELECT "id", "sessionId" FROM "conversations" WHERE "botId" = $1 AND "id" LIKE \'bx%\' LIMIT 1',
+            bot_id,
+        )
+        ids = {"bot": bot_id, "conversation": sample[0]["id"], "session": sample[0]["sessionId"]}
+        rows = await db.query_raw('SELECT count(*)::int AS n FROM "chats"')
+        print(f"chats rows: {rows[0]['n']}")
+
+        failures = 0
+        for label, sql, params, index in QUERIES:
+            result = await db.query_raw(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", *params(ids))
+            explained = result[0]["QUERY PLAN"]
+            explained = json.loads(explained) if isinstance(explained, str) else explained
+            root = explained[0]
+            nodes = list(plan_nodes(root["Plan"]))
+            indexes = {node.get("Index Name") for node in nodes if node.get("Index Name")}
+            seq_scans = [node.get("Relation Name") for node in nodes if node["Node Type"] == "Seq Scan"]
+            ok = index in indexes and not seq_scans
+            failures += 0 if ok else 1
+            print(
+                f"{'OK  ' if ok else 'FAIL'} {label:<36} {root['Execution Time']:>9.3f} ms  "
+                f"indexes={sorted(indexes)} seq_scans={seq_scans}"
+            )
+        return failures
+    finally:
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default="benchmarks/fixture.json")
+    parser.add_argument("--conversations", type=int, default=5000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--skip-load", action="store_true", help="reuse data from a previous run")
+    args = parser.parse_args()
+    sys.exit(1 if asyncio.run(check(args)) else 0)
+
+
+if __name__ == "__main__":
+    main()
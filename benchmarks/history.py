@@ -0,0 +1,104 @@
+"""
+Measure CPU time and allocations of building the completion context per turn.
+
+Compares the previous conversion (history re-read and a fresh dict built
+with ** spreads per message at every tool recursion level, plus Message
+objects rebuilt for suggestions) with HistoryEntry records read once per
+turn and the per-id wire cache. Rows stand in for the Prisma models
+get_chats returns, so no database is needed; the saved re-reads are not
+counted.
+
+    python -m benchmarks.history --messages 100 500 --rounds 3 --turns 200
+"""
+import time
+import argparse
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from app.domain.history import HistoryEntry, wire_message
+from app.domain.interfaces import Message
+
+
+class Row:
+    """Attribute bag shaped like prisma.models.Chat"""
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+def history_rows(conversation: int, count: int):
+    started = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = []
+    for index in range(count):
+        tool = index % 10 == 9
+        rows.append(
+            Row(
+                id=f"c{conversation}m{index}",
+                role="tool" if tool else ("user", "assistant")[index % 2],
+                content=("Product results " if tool else "Some reply text ") * 12,
+                tokens=40,
+                createdAt=started + timedelta(seconds=index),
+                toolCalls=None,
+                toolCallId=f"call_{index}" if tool else None,
+                feedback="NONE",
+                extraMetadata={},
+            )
+        )
+    return rows
+
+
+def legacy_turn(fetches, rounds: int):
+    for round_rows in fetches[:rounds]:
+        [
+            {
+                "role": chat.role,
+                "content": chat.content,
+                **({"tool_calls": chat.toolCalls} if chat.toolCalls else {}),
+                **({"tool_call_id": chat.toolCallId} if chat.toolCallId else {}),
+            }
+            for chat in round_rows
+        ]
+    [
+        Message(role=chat.role, content=chat.content, toolCalls=chat.toolCalls, toolCallId=chat.toolCallId)
+        for chat in fetches[-1][-4:]
+    ]
+
+
+def compact_turn(fetches, rounds: int):
+    # History is read once per turn and handed down the tool recursion
+    history = [HistoryEntry.from_chat(chat) for chat in fetches[0]]
+    for _ in range(rounds):
+        [wire_message(entry) for entry in history]
+    history[-4:]
+
+
+def measure(turn, messages: int, rounds: int, turns: int) -> dict:
+    # One fetch per round: the legacy path re-read history at every recursion level
+    conversations = [[history_rows(c, messages) for _ in range(rounds)] for c in range(8)]
+    for fetches in conversations:
+        # Steady state: earlier turns of these conversations already ran
+        turn(fetches, rounds)
+    tracemalloc.start()
+    started = time.process_time()
+    for index in range(turns):
+        turn(conversations[index % len(conversations)], rounds)
+    cpu = time.process_time() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"cpu_ms_per_turn": cpu * 1000 / turns, "peak_kib": peak / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--rounds", type=int, default=3, help="context builds per turn (tool recursion)")
+    parser.add_argument("--turns", type=int, default=200)
+    args = parser.parse_args()
+    print(f"{'messages':>8} {'path':>8} {'cpu ms/turn':>12} {'peak KiB':>10}")
+    for messages in args.messages:
+        for name, turn in (("legacy", legacy_turn), ("compact", compact_turn)):
+            result = measure(turn, messages, args.rounds, args.turns)
+            print(f"{messages:>8} {name:>8} {result['cpu_ms_per_turn']:>12.3f} {result['peak_kib']:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Import-time regression check for worker startup.
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter,
+prints the slowest modules and fails when the total exceeds the budget
+or when a module that must stay lazy is imported at startup.
+
+    python -m benchmarks.importtime --budget benchmarks/import_budget.json
+"""
+import sys
+import json
+import argparse
+import subprocess
+from typing import Dict, List, Tuple
+
+
+def measure(target: str, repeat: int) -> Tuple[float, Dict[str, int]]:
+    """Return the best total import time in ms and per-module cumulative microseconds"""
+    best_total = None
+    best_modules: Dict[str, int] = {}
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise SystemExit(f"Importing {target} failed:\n{result.stderr[-2000:]}")
+        modules: Dict[str, int] = {}
+        total = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line or "cumulative" in line:
+                continue
+            _, cumulative, name = line.split("|")
+            raw_name = name.rstrip()
+            module = raw_name.strip()
+            modules[module] = int(cumulative)
+            # Top-level entries (one leading space) add up to the full import cost
+            if len(raw_name) - len(raw_name.lstrip()) == 1:
+                total += int(cumulative)
+        total_ms = total / 1000
+        if best_total is None or total_ms < best_total:
+            best_total, best_modules = total_ms, modules
+    return best_total, best_modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app.main")
+    parser.add_argument("--budget", default="benchmarks/import_budget.json")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    with open(args.budget) as f:
+        budget = json.load(f)
+
+    total_ms, modules = measure(args.target, args.repeat)
+    print(f"import {args.target}: {total_ms:.1f} ms (budget {budget['budget_ms']} ms)")
+    for name, cumulative in sorted(modules.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {cumulative / 1000:>9.1f} ms  {name}")
+
+    failures: List[str] = []
+    if total_ms > budget["budget_ms"]:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget {budget['budget_ms']} ms")
+    for lazy in budget.get("lazy_modules", []):
+        imported = [name for name in modules if name == lazy or name.startswith(lazy + ".")]
+        if imported:
+            failures.append(f"{lazy} must be imported lazily but is loaded at startup")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""
+Replay recorded chat sessions against a running API and report latency.
+
+Each virtual user takes a session from the sessions file and sends its
+prompts in order to /api/v1/bots/{bot_id}/chat/{conversation_id}, either
+in a fresh conversation or resuming one of the long seeded conversations.
+
+    python -m benchmarks.load --base-url http://127.0.0.1:8090 --fixture benchmarks/fixture.json \\
+        --concurrency 16 --sessions-limit 200 --workers 4 --baseline benchmarks/baseline.json
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from typing import Dict, List, Optional
+import httpx
+from app.utils import generate_cuid
+
+# Metrics compared against the baseline, and whether a higher value is better
+COMPARED = {
+    "ttft_p50": False,
+    "ttft_p95": False,
+    "ttft_p99": False,
+    "reply_p50": False,
+    "reply_p95": False,
+    "reply_p99": False,
+    "db_queries_per_turn": False,
+    "prompt_cache_hit_ratio": True,
+    "throughput_per_worker": True,
+}
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def scrape(text: str, name: str) -> float:
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith(name + " ") or line.startswith(name + "{"):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+def scrape_labeled(text: str, name: str, label: str) -> float:
+    total = 0.0
+    for line in text.splitlines():
+        if line.startswith(name + "{") and label in line:
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+class Results:
+    def __init__(self):
+        self.ttft: List[float] = []
+        self.reply: List[float] = []
+        self.errors = 0
+        self.busy = 0
+        self.turns = 0
+
+
+async def run_turn(client: httpx.AsyncClient, bot_id: str, conversation_id: str, prompt: str, mode: str, results: Results):
+    started = time.perf_counter()
+    first_token = None
+    failed = False
+    async with client.stream(
+        "POST",
+        f"/api/v1/bots/{bot_id}/chat/{conversation_id}",
+        json={"prompt": prompt, "chat_mode": mode},
+    ) as response:
+        if response.status_code != 200:
+            results.errors += 1
+            return
+        async for line in response.aiter_lines():
+            if not line.startswith("data: "):
+                continue
+            try:
+                event = json.loads(line[6:])
+            except json.JSONDecodeError:
+                continue
+            if "token" in event and first_token is None:
+                first_token = time.perf_counter() - started
+            if event.get("error") == "busy":
+                results.busy += 1
+                failed = True
+            elif "error" in event:
+                failed = True
+    if failed:
+        results.errors += 1
+        return
+    results.turns += 1
+    results.reply.append(time.perf_counter() - started)
+    if first_token is not None:
+        results.ttft.append(first_token)
+
+
+async def run_session(client, session: Dict, target: Dict, mode: str, results: Results):
+    conversation_id = target.get("conversationId") or generate_cuid()
+    for prompt in session["prompts"]:
+        try:
+            await run_turn(client, target["botId"], conversation_id, prompt, mode, results)
+        except httpx.HTTPError:
+            results.errors += 1
+
+
+async def drive(args) -> Dict:
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+    with open(args.sessions) as f:
+        sessions = json.load(f)
+
+    rng = random.Random(args.seed)
+    jobs = []
+    for index in range(args.sessions_limit):
+        session = sessions[index % len(sessions)]
+        if args.resume and fixture["conversations"]:
+            target = rng.choice(fixture["conversations"])
+        else:
+            target = {"botId": rng.choice(fixture["bots"])}
+        jobs.append((session, target))
+
+    results = Results()
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    metrics_headers = {"Authorization": f"Bearer {args.metrics_token}"} if args.metrics_token else {}
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        before = (await client.get("/metrics", headers=metrics_headers)).text
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def bounded(session, target):
+            async with semaphore:
+                await run_session(client, session, target, args.mode, results)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(bounded(session, target) for session, target in jobs))
+        elapsed = time.perf_counter() - started
+        after = (await client.get("/metrics", headers=metrics_headers)).text
+
+    # /metrics is per worker, so this delta covers whichever worker answered the scrape
+    queries = scrape(after, "chat_db_queries_per_turn_sum") - scrape(before, "chat_db_queries_per_turn_sum")
+    counted = scrape(after, "chat_db_queries_per_turn_count") - scrape(before, "chat_db_queries_per_turn_count")
+    prompt_total = scrape_labeled(after, "provider_prompt_tokens_total", 'kind="total"') - scrape_labeled(
+        before, "provider_prompt_tokens_total", 'kind="total"'
+    )
+    prompt_cached = scrape_labeled(after, "provider_prompt_tokens_total", 'kind="cached"') - scrape_labeled(
+        before, "provider_prompt_tokens_total", 'kind="cached"'
+    )
+    throughput = results.turns / elapsed if elapsed else 0.0
+    return {
+        "turns": results.turns,
+        "errors": results.errors,
+        "busy": results.busy,
+        "elapsed_seconds": round(elapsed, 3),
+        "ttft_p50": percentile(results.ttft, 50),
+        "ttft_p95": percentile(results.ttft, 95),
+        "ttft_p99": percentile(results.ttft, 99),
+        "reply_p50": percentile(results.reply, 50),
+        "reply_p95": percentile(results.reply, 95),
+        "reply_p99": percentile(results.reply, 99),
+        "reply_mean": statistics.fmean(results.reply) if results.reply else None,
+        "db_queries_per_turn": queries / counted if counted else None,
+        "prompt_cache_hit_ratio": prompt_cached / prompt_total if prompt_total else None,
+        "throughput": throughput,
+        "throughput_per_worker": throughput / args.workers,
+    }
+
+
+def diff(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Return the metrics that regressed by more than `tolerance` (a fraction)"""
+    regressions = []
+    print(f"\n{'metric':<24}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, higher_is_better in COMPARED.items():
+        old, new = baseline.get(name), report.get(name)
+        if old is None or new is None or old == 0:
+            continue
+        change = (new - old) / old
+        worse = change < -tolerance if higher_is_better else change > tolerance
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:<24}{old:>12.4f}{new:>12.4f}{change:>+10.1%}{flag}")
+        if worse:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://127.0.0.1:8090")
+    parser.add_argument("--metrics-token", default=os.environ.get("METRICS_TOKEN"), help="when the server sets METRICS_TOKEN")
+    parser.add_argument("--fixture", default="benchmarks/fixture.json")
+    parser.add_argument("--sessions", default="benchmarks/sessions.json")
+    parser.add_argument("--sessions-limit", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4, help="uvicorn workers behind --base-url")
+    parser.add_argument("--mode", default="web", choices=["web", "whatsapp"])
+    parser.add_argument("--resume", action="store_true", help="replay into the seeded long conversations")
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="write the report as JSON")
+    parser.add_argument("--baseline", help="baseline report to diff against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args()
+
+    report = asyncio.run(drive(args))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = diff(report, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+OpenAI-compatible mock streaming endpoint for benchmarks.
+
+Serves POST /v1/chat/completions with a configurable time-to-first-token,
+token rate and probability of answering a user turn with a
+`<tool_call>` block, so the whole chat pipeline (tool recursion and
+suggestions included) can be exercised without a real model. Usage
+chunks report a leading system message seen before as cached prompt
+tokens, like an endpoint with prefix caching.
+
+    python -m benchmarks.mock_llm --port 8099 --ttft 0.4 --tokens-per-second 40 --tool-call-rate 0.5
+"""
+import json
+import time
+import random
+import asyncio
+import argparse
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="Mock LLM")
+settings = {
+    "ttft": 0.4,
+    "tokens_per_second": 40.0,
+    "reply_tokens": 60,
+    "tool_call_rate": 0.5,
+    "seed": 7,
+}
+_random = random.Random(settings["seed"])
+# Leading system prompts already "in the KV cache"
+_prefix_cache: set = set()
+
+WORDS = (
+    "We have several great options available right now including the latest "
+    "models in stock with fast delivery and warranty coverage at our main store"
+).split()
+QUESTIONS = [
+    "What colors are available?",
+    "Do you offer delivery to my city?",
+    "Is there a warranty on this product?",
+]
+
+
+def _chunk(model: str, content: str = None, finish_reason: str = None, usage: dict = None) -> str:
+    payload = {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [] if usage else [
+            {"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish_reason}
+        ],
+        # Cloudflare-style providers read the token from a top-level `response` field
+        "response": content or "",
+    }
+    if usage:
+        payload["usage"] = usage
+    return f"data: {json.dumps(payload)}\n\n"
+
+
+def _plan_reply(body: dict) -> list[str]:
+    messages = body.get("messages", [])
+    last = messages[-1] if messages else {}
+    if body.get("tools") and last.get("role") == "user" and _random.random() < settings["tool_call_rate"]:
+        query = " ".join(str(last.get("content", "")).split()[:2]) or "*LATEST*"
+        call = json.dumps({"name": "search_products", "arguments": {"query": query}})
+        return [f"<tool_call>{call}</tool_call>"]
+    if not body.get("tools") and "follow-up questions" in str(messages[0].get("content", "")):
+        return [question + "\n" for question in QUESTIONS]
+    return [_random.choice(WORDS) + " " for _ in range(settings["reply_tokens"])]
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "mock")
+    tokens = _plan_reply(body)
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+    messages = body.get("messages", [])
+    prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in messages)
+    cached_tokens = 0
+    if messages and messages[0].get("role") == "system":
+        prefix = str(messages[0].get("content", ""))
+        if prefix in _prefix_cache:
+            cached_tokens = len(prefix.split())
+        _prefix_cache.add(prefix)
+
+    async def stream():
+        await asyncio.sleep(settings["ttft"])
+        delay = 1.0 / settings["tokens_per_second"] if settings["tokens_per_second"] > 0 else 0
+        for index, token in enumerate(tokens):
+            if index:
+                await asyncio.sleep(delay)
+            yield _chunk(model, content=token)
+        yield _chunk(model, finish_reason="stop")
+        if include_usage:
+            yield _chunk(
+                model,
+                usage={
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens),
+                    "prompt_tokens_details": {"cached_tokens": cached_tokens},
+                },
+            )
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--ttft", type=float, default=settings["ttft"])
+    parser.add_argument("--tokens-per-second", type=float, default=settings["tokens_per_second"])
+    parser.add_argument("--reply-tokens", type=int, default=settings["reply_tokens"])
+    parser.add_argument("--tool-call-rate", type=float, default=settings["tool_call_rate"])
+    parser.add_argument("--seed", type=int, default=settings["seed"])
+    args = parser.parse_args()
+
+    settings.update(
+        ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second,
+        reply_tokens=args.reply_tokens,
+        tool_call_rate=args.tool_call_rate,
+        seed=args.seed,
+    )
+    _random.seed(args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
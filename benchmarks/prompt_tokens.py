@@ -0,0 +1,59 @@
+"""
+Report system prompt tokens per fragment and chat mode.
+
+Builds the seller prompt for the business of each seeded bot in both
+modes and prints the (approximate) token count of every fragment, so
+prompt changes can be sized before they ship.
+
+    DATABASE_URL=postgresql://.../cognova_bench python -m benchmarks.prompt_tokens
+"""
+import json
+import asyncio
+import argparse
+from app.core.database import db
+from app.api.dependencies import get_business_repository
+from app.infrastructure.ai.prompts.seller import SellerPromptGenerator
+
+MODES = ("web", "whatsapp")
+
+
+async def run(args):
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+    await db.connect()
+    try:
+        bots = await db.prisma.query_raw(
+            'SELECT DISTINCT "businessId" FROM "bots" WHERE "id" = ANY(string_to_array($1, \',\'))',
+            ",".join(fixture["bots"]),
+        )
+        for row in bots[: args.limit]:
+            business = await get_business_repository().get_business_data(row["businessId"])
+            compiled = {
+                mode: SellerPromptGenerator(
+                    business=business,
+                    config=business.configurations,
+                    locations=business.locations,
+                    operating_hours=business.operatingHours,
+                    mode=mode,
+                ).compile()
+                for mode in MODES
+            }
+            names = list(dict.fromkeys(name for prompt in compiled.values() for name in prompt.tokens))
+            print(f"\n{business.name}")
+            print(f"  {'fragment':<24}" + "".join(f"{mode:>10}" for mode in MODES))
+            for name in names:
+                print(f"  {name:<24}" + "".join(f"{compiled[mode].tokens.get(name, 0):>10}" for mode in MODES))
+            print(f"  {'total':<24}" + "".join(f"{compiled[mode].total_tokens:>10}" for mode in MODES))
+    finally:
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default="benchmarks/fixture.json")
+    parser.add_argument("--limit", type=int, default=3, help="businesses to report")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
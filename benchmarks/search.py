@@ -0,0 +1,125 @@
+"""
+Benchmark product search against a large catalog.
+
+Bulk-loads products (100k by default) into the business of a seeded bot,
+then times BusinessFunctions.search_products, which queries the
+trigger-maintained tsvector column, against the previous on-the-fly
+`to_tsvector` OR query that Prisma's `search` filter generated. Exits
+non-zero when the new query does not use the GIN index.
+
+Apply prisma/sql/002_business_product_search.sql first.
+
+    DATABASE_URL=postgresql://.../cognova_bench python -m benchmarks.search --products 100000
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import List
+from app.core.database import db
+from app.infrastructure.ai.tools.functions.business import BusinessFunctions
+from benchmarks.seed import BRANDS, KINDS
+from benchmarks.load import percentile
+from benchmarks.explain import plan_nodes
+
+BRAND_ARRAY = "ARRAY[" + ", ".join(f"'{brand}'" for brand in BRANDS) + "]"
+KIND_ARRAY = "ARRAY[" + ", ".join(f"'{kind}'" for kind in KINDS) + "]"
+
+QUERIES = ["adidas", "samsung phone", "wireless headphones", "canon cam", "lenovo laptop 12", "watch", "*LATEST*"]
+
+# Shape of the SQL Prisma emitted for {"OR": [name, description, category.name search]} + _relevance
+LEGACY_SQL = (
+    'SELECT p.*, c."name" AS category FROM "business_products" p '
+    'LEFT JOIN "product_categories" c ON c."id" = p."categoryId" '
+    'WHERE p."businessId" = $1 AND p."isActive" AND ('
+    "to_tsvector(concat_ws(' ', p.\"name\")) @@ to_tsquery($2) "
+    "OR to_tsvector(concat_ws(' ', p.\"description\")) @@ to_tsquery($2) "
+    "OR to_tsvector(concat_ws(' ', c.\"name\")) @@ to_tsquery($2)) "
+    "ORDER BY ts_rank(to_tsvector(concat_ws(' ', p.\"name\")), to_tsquery($2)) DESC LIMIT 15"
+)
+
+
+async def load(business_id: str, products: int) -> None:
+    await db.prisma.execute_raw(
+        'INSERT INTO "business_products" ("id", "businessId", "categoryId", "name", "description", "price", '
+        '"stock", "images", "updatedAt") '
+        "SELECT 'bp' || md5(random()::text || g), $1, "
+        '(SELECT "id" FROM "product_categories" ORDER BY random() + g LIMIT 1), '
+        f"({BRAND_ARRAY})[1 + g % {len(BRANDS)}] || ' ' || ({KIND_ARRAY})[1 + (g / 7) % {len(KINDS)}] || ' ' || g, "
+        "'Bulk benchmark product with ' || (1 + g % 5) || ' year warranty', "
+        "round((random() * 2000)::numeric, 2), 'IN_STOCK', ARRAY[]::text[], now() "
+        "FROM generate_series(1, $2) g",
+        business_id,
+        products,
+    )
+    await db.prisma.execute_raw('ANALYZE "business_products"')
+
+
+async def timed(fn, repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+async def run(args) -> int:
+    with open(args.fixture) as f:
+        fixture = json.load(f)
+    await db.connect()
+    try:
+        bots = await db.prisma.query_raw('SELECT "businessId" FROM "bots" WHERE "id" = $1', fixture["bots"][0])
+        business_id = bots[0]["businessId"]
+        if not args.skip_load:
+            await load(business_id, args.products)
+        count = await db.prisma.query_raw(
+            'SELECT count(*)::int AS n FROM "business_products" WHERE "businessId" = $1', business_id
+        )
+        print(f"products in business: {count[0]['n']}")
+
+        functions = BusinessFunctions(business_id)
+        print(f"\n{'query':<24}{'new p50':>10}{'new p95':>10}{'old p50':>10}{'old p95':>10}  results")
+        for query in QUERIES:
+            new = await timed(lambda: functions.search_products(query), args.repeat)
+            results = await functions.search_products(query)
+            if query == "*LATEST*":
+                old = new
+            else:
+                formatted = " | ".join(f"{word}:*" for word in query.lower().split())
+                old = await timed(lambda: db.prisma.query_raw(LEGACY_SQL, business_id, formatted), args.repeat)
+            print(
+                f"{query:<24}{percentile(new, 50):>10.2f}{percentile(new, 95):>10.2f}"
+                f"{percentile(old, 50):>10.2f}{percentile(old, 95):>10.2f}  {len(results)}"
+            )
+
+        plan = await db.prisma.query_raw(
+            "EXPLAIN (FORMAT JSON) SELECT p.\"id\" FROM \"business_products\" p "
+            "CROSS JOIN to_tsquery('simple', $2) q "
+            'WHERE p."businessId" = $1 AND p."isActive" AND p."searchVector" @@ q',
+            business_id,
+            "samsung:* | phone:*",
+        )
+        explained = plan[0]["QUERY PLAN"]
+        explained = json.loads(explained) if isinstance(explained, str) else explained
+        indexes = {node.get("Index Name") for node in plan_nodes(explained[0]["Plan"]) if node.get("Index Name")}
+        ok = "business_products_search_idx" in indexes
+        print(f"\n{'OK  ' if ok else 'FAIL'} search plan indexes={sorted(indexes)}")
+        return 0 if ok else 1
+    finally:
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default="benchmarks/fixture.json")
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--skip-load", action="store_true", help="reuse products from a previous run")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
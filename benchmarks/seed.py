@@ -0,0 +1,189 @@
+"""
+Seed a benchmark database with businesses, products and long conversations.
+
+Every business gets a bot whose model points at the mock LLM endpoint.
+The ids the load driver needs are written to a fixture file.
+
+    DATABASE_URL=postgresql://.../cognova_bench python -m benchmarks.seed \\
+        --businesses 5 --products 2000 --conversations 50 --turns 40 \\
+        --llm-url http://127.0.0.1:8099/v1 --out benchmarks/fixture.json
+"""
+import json
+import random
+import asyncio
+import argparse
+from datetime import datetime, timedelta, timezone
+from prisma import Prisma
+from app.utils import generate_cuid
+
+BRANDS = ["Adidas", "Nike", "Puma", "Samsung", "Apple", "Sony", "Lenovo", "HP", "Canon", "Tecno"]
+KINDS = ["Sneakers", "Phone", "Laptop", "Headphones", "Camera", "Watch", "Tablet", "Speaker", "Jacket", "Monitor"]
+CATEGORIES = ["Shoes", "Phones", "Computers", "Audio", "Cameras", "Accessories", "Clothing"]
+DAYS = ["MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY"]
+PROMPTS = [
+    "Do you have {brand} {kind}?",
+    "How much is the {brand} {kind}?",
+    "Show me your latest products",
+    "Is the {kind} in stock?",
+    "Where is your main store?",
+    "Do you deliver?",
+]
+
+
+async def seed(args) -> dict:
+    rng = random.Random(args.seed)
+    db = Prisma()
+    await db.connect()
+    try:
+        suffix = generate_cuid()[:8]
+        user = await db.user.create(
+            data={"email": f"bench-{suffix}@example.com", "password": "-", "name": "Benchmark"}
+        )
+        workspace = await db.workspace.create(
+            data={"displayName": "Benchmark", "name": f"bench-{suffix}", "ownerId": user.id}
+        )
+        provider = await db.aiprovider.create(
+            data={
+                "name": f"mock-{suffix}",
+                "displayName": "Mock LLM",
+                "endpointUrl": args.llm_url,
+                "provider": args.provider,
+            }
+        )
+        model = await db.model.create(
+            data={"name": f"mock-model-{suffix}", "displayName": "Mock", "aiProviderId": provider.id}
+        )
+        categories = []
+        for name in CATEGORIES:
+            categories.append(await db.productcategory.create(data={"name": name}))
+
+        fixture = {"bots": [], "conversations": [], "seed": args.seed}
+        for b in range(args.businesses):
+            business = await db.business.create(
+                data={
+                    "workspaceId": workspace.id,
+                    "name": f"Bench Store {b}",
+                    "type": "electronics and fashion retailer",
+                    "description": "Benchmark business seeded for load tests.",
+                }
+            )
+            await db.businessconfig.create(
+                data={
+                    "businessId": business.id,
+                    "hasDelivery": True,
+                    "deliveryFee": 5.0,
+                    "minDeliveryOrderAmount": 20.0,
+                    "acceptsReturns": True,
+                    "returnPeriod": "14 days",
+                }
+            )
+            for l in range(3):
+                location = await db.businesslocation.create(
+                    data={
+                        "businessId": business.id,
+                        "name": f"Branch {l}",
+                        "address": f"{l + 1} Market Street",
+                        "city": "Kigali",
+                        "country": "RW",
+                        "phone": f"+25078800{b:02d}{l}",
+                        "isMain": l == 0,
+                    }
+                )
+                await db.businessoperatinghours.create_many(
+                    data=[
+                        {
+                            "businessId": business.id,
+                            "locationId": location.id,
+                            "dayOfWeek": day,
+                            "openTime": "08:00",
+                            "closeTime": "20:00",
+                            "isClosed": day == "SUNDAY",
+                        }
+                        for day in DAYS
+                    ]
+                )
+
+            products = []
+            for p in range(args.products):
+                brand, kind = rng.choice(BRANDS), rng.choice(KINDS)
+                products.append(
+                    {
+                        "businessId": business.id,
+                        "categoryId": rng.choice(categories).id,
+                        "name": f"{brand} {kind} {p}",
+                        "description": f"{brand} {kind} with {rng.randint(1, 5)} year warranty and free setup.",
+                        "price": round(rng.uniform(10, 2000), 2),
+                        "stock": rng.choice(["IN_STOCK", "OUT_OF_STOCK", str(rng.randint(0, 50))]),
+                        "images": [f"https://img.example.com/{business.id}/{p}-{i}.jpg" for i in range(3)],
+                    }
+                )
+            for start in range(0, len(products), 1000):
+                await db.businessproduct.create_many(data=products[start:start + 1000])
+
+            bot = await db.bot.create(
+                data={
+                    "workspaceId": workspace.id,
+                    "businessId": business.id,
+                    "name": f"Bench Bot {b}",
+                    "modelId": model.id,
+                }
+            )
+            fixture["bots"].append(bot.id)
+
+            base = datetime.now(timezone.utc) - timedelta(days=30)
+            for c in range(args.conversations):
+                conversation = await db.conversation.create(
+                    data={"botId": bot.id, "sessionId": generate_cuid()}
+                )
+                chats = []
+                for t in range(args.turns):
+                    brand, kind = rng.choice(BRANDS), rng.choice(KINDS)
+                    prompt = rng.choice(PROMPTS).format(brand=brand, kind=kind)
+                    created = base + timedelta(minutes=c * args.turns + t)
+                    chats.append(
+                        {
+                            "conversationId": conversation.id,
+                            "role": "user",
+                            "content": prompt,
+                            "tokens": len(prompt.split()),
+                            "createdAt": created,
+                        }
+                    )
+                    reply = f"Yes, we have {brand} {kind} available at our main store."
+                    chats.append(
+                        {
+                            "conversationId": conversation.id,
+                            "role": "assistant",
+                            "content": reply,
+                            "tokens": len(reply.split()),
+                            "createdAt": created + timedelta(seconds=5),
+                        }
+                    )
+                await db.chat.create_many(data=chats)
+                fixture["conversations"].append({"botId": bot.id, "conversationId": conversation.id})
+
+        return fixture
+    finally:
+        await db.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--businesses", type=int, default=5)
+    parser.add_argument("--products", type=int, default=2000)
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--llm-url", default="http://127.0.0.1:8099/v1")
+    parser.add_argument("--provider", default="openai", choices=["openai", "cloudflare"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", default="benchmarks/fixture.json")
+    args = parser.parse_args()
+
+    fixture = asyncio.run(seed(args))
+    with open(args.out, "w") as f:
+        json.dump(fixture, f, indent=2)
+    print(f"Seeded {len(fixture['bots'])} bots and {len(fixture['conversations'])} conversations -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
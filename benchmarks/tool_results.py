@@ -0,0 +1,97 @@
+"""
+Compare full and compact search_products tool results.
+
+For every case in benchmarks/tool_results.json prints the tokens of the
+former str() payload and of the compact table, and how
+many answers (or their evidence) can still be found in each encoding. With --llm-url
+each question is also asked with the tool result as context and the
+replies are scored against the expected answers, so a change to the
+encoding can be checked for answer quality, not only size:
+
+    python -m benchmarks.tool_results
+    python -m benchmarks.tool_results --llm-url http://127.0.0.1:8099/v1 --model gpt-4o-mini
+"""
+import json
+import asyncio
+import argparse
+from typing import Dict, List
+from app.api.dependencies import get_tokenizer_service
+from app.services.tool_results import encode_tool_result
+
+ENCODINGS = {
+    "full": str,
+    "compact": encode_tool_result,
+}
+SYSTEM = "Answer the customer's question using only the search_products result. Be brief."
+
+
+def answered(reply: str, expected: List[str]) -> bool:
+    reply = reply.lower()
+    return any(answer.lower() in reply for answer in expected)
+
+
+async def ask(client, model: str, content: str, question: str) -> str:
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": SYSTEM},
+            {"role": "user", "content": f"search_products result:\n{content}\n\nQuestion: {question}"},
+        ],
+        temperature=0,
+    )
+    return response.choices[0].message.content or ""
+
+
+async def run(args):
+    with open(args.fixture) as f:
+        cases = json.load(f)
+    tokenizer = get_tokenizer_service()
+    client = None
+    if args.llm_url:
+        from openai import AsyncOpenAI
+
+        client = AsyncOpenAI(base_url=args.llm_url, api_key=args.api_key)
+
+    totals: Dict[str, List[int]] = {name: [0, 0, 0] for name in ENCODINGS}  # tokens, present, correct
+    questions = 0
+    print(f"{'case':<24} {'encoding':>9} {'tokens':>7} {'saved':>7} {'present':>8}" + (f" {'correct':>8}" if client else ""))
+    for case in cases:
+        full_tokens = None
+        for name, encode in ENCODINGS.items():
+            content = encode(case["results"])
+            tokens = tokenizer.count(content, args.model)
+            full_tokens = full_tokens if full_tokens is not None else tokens
+            # The answer (or the evidence for it) is still in what the model sees
+            present = sum(
+                answered(content, item["expected"] + item.get("evidence", [])) for item in case["questions"]
+            )
+            correct = 0
+            if client:
+                replies = await asyncio.gather(
+                    *(ask(client, args.model, content, item["question"]) for item in case["questions"])
+                )
+                correct = sum(answered(reply, item["expected"]) for reply, item in zip(replies, case["questions"]))
+            totals[name][0] += tokens
+            totals[name][1] += present
+            totals[name][2] += correct
+            line = f"{case['name']:<24} {name:>9} {tokens:>7} {1 - tokens / full_tokens:>7.0%} {present:>4}/{len(case['questions']):<3}"
+            print(line + (f" {correct:>4}/{len(case['questions']):<3}" if client else ""))
+        questions += len(case["questions"])
+
+    print()
+    for name, (tokens, present, correct) in totals.items():
+        summary = f"{'total':<24} {name:>9} {tokens:>7} {1 - tokens / totals['full'][0]:>7.0%} {present:>4}/{questions:<3}"
+        print(summary + (f" {correct:>4}/{questions:<3}" if client else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default="benchmarks/tool_results.json")
+    parser.add_argument("--model", default="gpt-4o-mini", help="tokenizer mapping and --llm-url model")
+    parser.add_argument("--llm-url", help="OpenAI-compatible endpoint to score answers with")
+    parser.add_argument("--api-key", default="sk-no-key-required")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
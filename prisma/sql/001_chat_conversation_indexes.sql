@@ -0,0 +1,15 @@
+-- Composite indexes for the chat read/write paths (see schema.prisma).
+-- CONCURRENTLY avoids locking the hot chats table while building; run
+-- outside a transaction, e.g. `psql "$DATABASE_URL" -f <file>`.
+
+-- get_chats, get_recent_chats: WHERE "conversationId" = $1 ORDER BY "createdAt"
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "chats_conversation_created_idx"
+    ON "chats" ("conversationId", "createdAt");
+
+-- delete_latest_message: WHERE "conversationId" = $1 AND role = $2 ORDER BY "createdAt" DESC LIMIT 1
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "chats_conversation_role_created_idx"
+    ON "chats" ("conversationId", "role", "createdAt");
+
+-- get_latest_session_conversation: WHERE "botId" = $1 AND "sessionId" = $2 ORDER BY "createdAt" DESC LIMIT 1
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "conversations_bot_session_created_idx"
+    ON "conversations" ("botId", "sessionId", "createdAt");
@@ -0,0 +1,58 @@
+-- Precomputed full-text search vector for business_products (see schema.prisma).
+-- The vector mixes in the category name, which lives in another table, so it
+-- cannot be a GENERATED column; triggers keep it current instead. Run outside
+-- a transaction, e.g. `psql "$DATABASE_URL" -f <file>`, after `prisma db push`.
+--
+-- Weights: name A, category B, description C. The 'simple' configuration does
+-- no stemming, which suits mixed-language catalogs and prefix (word:*) queries.
+
+ALTER TABLE "business_products" ADD COLUMN IF NOT EXISTS "searchVector" tsvector;
+
+CREATE OR REPLACE FUNCTION business_product_search_vector(name text, description text, category_id text)
+RETURNS tsvector LANGUAGE sql STABLE AS $$
+    SELECT setweight(to_tsvector('simple', coalesce(name, '')), 'A')
+        || setweight(to_tsvector('simple', coalesce(
+               (SELECT c."name" FROM "product_categories" c WHERE c."id" = category_id), '')), 'B')
+        || setweight(to_tsvector('simple', coalesce(description, '')), 'C')
+$$;
+
+CREATE OR REPLACE FUNCTION business_products_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    NEW."searchVector" := business_product_search_vector(NEW."name", NEW."description", NEW."categoryId");
+    RETURN NEW;
+END
+$$;
+
+DROP TRIGGER IF EXISTS business_products_search_vector ON "business_products";
+CREATE TRIGGER business_products_search_vector
+    BEFORE INSERT OR UPDATE OF "name", "description", "categoryId" ON "business_products"
+    FOR EACH ROW EXECUTE FUNCTION business_products_search_vector_update();
+
+-- Renaming a category re-indexes its products
+CREATE OR REPLACE FUNCTION product_categories_search_vector_update() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE "business_products" p
+       SET "searchVector" = business_product_search_vector(p."name", p."description", p."categoryId")
+     WHERE p."categoryId" = NEW."id";
+    RETURN NULL;
+END
+$$;
+
+DROP TRIGGER IF EXISTS product_categories_search_vector ON "product_categories";
+CREATE TRIGGER product_categories_search_vector
+    AFTER UPDATE OF "name" ON "product_categories"
+    FOR EACH ROW WHEN (OLD."name" IS DISTINCT FROM NEW."name")
+    EXECUTE FUNCTION product_categories_search_vector_update();
+
+-- Backfill rows written before the trigger existed
+UPDATE "business_products"
+   SET "searchVector" = business_product_search_vector("name", "description", "categoryId")
+ WHERE "searchVector" IS NULL;
+
+-- search_products: WHERE "businessId" = $1 AND "isActive" AND "searchVector" @@ query
+-- The planner combines both indexes with a BitmapAnd, so matches stay scoped per business
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "business_products_search_idx"
+    ON "business_products" USING GIN ("searchVector");
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "business_products_business_active_idx"
+    ON "business_products" ("businessId", "isActive");
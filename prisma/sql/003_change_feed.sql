@@ -0,0 +1,95 @@
+-- Change feed for cached business data (see schema.prisma, app/core/change_feed.py).
+-- Statement-level triggers bump one row per (entity, key) in change_versions
+-- and NOTIFY 'cognova_changes' once per statement, so a bulk product import
+-- costs one version and one notification per business, not per row. Workers
+-- read change_versions after each notification (or by polling) and evict
+-- the matching cache entries. Run after `prisma db push`, e.g.
+-- `psql "$DATABASE_URL" -f <file>`.
+--
+-- Entities and keys: 'business' and 'catalog' by business id, 'bot' by bot id.
+
+CREATE TABLE IF NOT EXISTS "change_versions" (
+    "entity" text NOT NULL,
+    "key" text NOT NULL,
+    "version" bigint NOT NULL,
+    "changedAt" timestamp(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT "change_versions_pkey" PRIMARY KEY ("entity", "key")
+);
+-- Serves the tail's (version, entity, key) keyset paging
+DROP INDEX IF EXISTS "change_versions_version_idx";
+CREATE INDEX IF NOT EXISTS "change_versions_version_entity_key_idx" ON "change_versions" ("version", "entity", "key");
+
+CREATE SEQUENCE IF NOT EXISTS "change_versions_seq";
+
+CREATE OR REPLACE FUNCTION record_changes(changed_entity text, changed_keys text[]) RETURNS void LANGUAGE plpgsql AS $$
+DECLARE
+    next_version bigint := nextval('change_versions_seq');
+BEGIN
+    INSERT INTO "change_versions" ("entity", "key", "version", "changedAt")
+    SELECT changed_entity, k, next_version, now() AT TIME ZONE 'UTC' FROM unnest(changed_keys) AS k
+    ON CONFLICT ("entity", "key") DO UPDATE
+        SET "version" = EXCLUDED."version", "changedAt" = EXCLUDED."changedAt";
+    -- Only a wake-up; the table is the source of truth, so a missed notification loses nothing
+    PERFORM pg_notify('cognova_changes', next_version::text);
+END
+$$;
+
+-- TG_ARGV: entity, key column. Transition tables need one trigger per event.
+CREATE OR REPLACE FUNCTION change_feed_trigger() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+    changed_keys text[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('SELECT array_agg(DISTINCT %I) FROM new_rows', TG_ARGV[1]) INTO changed_keys;
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE format('SELECT array_agg(DISTINCT %I) FROM old_rows', TG_ARGV[1]) INTO changed_keys;
+    ELSE
+        -- An update can move a row to another business
+        EXECUTE format(
+            'SELECT array_agg(k) FROM (SELECT %1$I AS k FROM new_rows UNION SELECT %1$I FROM old_rows) s',
+            TG_ARGV[1]
+        ) INTO changed_keys;
+    END IF;
+    IF changed_keys IS NOT NULL THEN
+        PERFORM record_changes(TG_ARGV[0], changed_keys);
+    END IF;
+    RETURN NULL;
+END
+$$;
+
+DO $$
+DECLARE
+    feed record;
+BEGIN
+    FOR feed IN
+        SELECT * FROM (VALUES
+            ('businesses', 'business', 'id'),
+            ('business_configs', 'business', 'businessId'),
+            ('business_locations', 'business', 'businessId'),
+            ('business_operating_hours', 'business', 'businessId'),
+            -- Category renames reach products through the searchVector trigger (002)
+            ('business_products', 'catalog', 'businessId'),
+            ('bots', 'bot', 'id')
+        ) AS t(table_name, entity, key_column)
+    LOOP
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', feed.table_name || '_feed_insert', feed.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', feed.table_name || '_feed_update', feed.table_name);
+        EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', feed.table_name || '_feed_delete', feed.table_name);
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION change_feed_trigger(%L, %L)',
+            feed.table_name || '_feed_insert', feed.table_name, feed.entity, feed.key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION change_feed_trigger(%L, %L)',
+            feed.table_name || '_feed_update', feed.table_name, feed.entity, feed.key_column
+        );
+        EXECUTE format(
+            'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS old_rows '
+            'FOR EACH STATEMENT EXECUTE FUNCTION change_feed_trigger(%L, %L)',
+            feed.table_name || '_feed_delete', feed.table_name, feed.entity, feed.key_column
+        );
+    END LOOP;
+END
+$$;